@@ -0,0 +1,653 @@
+from b_tree import *
+from itertools import chain, repeat
+
+
+class B_Plus_Node(Node):
+    """
+    B+-Tree node data structure.
+
+    Leaves hold every key of the tree and are linked to their
+    neighbouring leaves through next and prev. Internal nodes only
+    hold routing keys: every key of the i-th child is at most the
+    i-th key and every key of the (i+1)-th child is at least the
+    i-th key. Routing keys are copies, so they do not count towards
+    the size of a sub-tree.
+    """
+
+    __slots__ = ("next", "prev")
+
+    def __init__(self, keys, children, values=None):
+        """
+        Generates a b+-tree node containing the given keys and
+        children. Links are left for the caller to set.
+        """
+        super().__init__(keys, children, values)
+        self.next = None
+        self.prev = None
+        if children:
+            self.size -= len(keys)
+
+
+    def compute_size(self):
+        """
+        Recomputes the number of keys in self's sub-tree,
+        counting only the keys held by leaves.
+        """
+        if self.is_leaf():
+            self.size = self.num_keys()
+        else:
+            self.size = sum(child.size for child in self.children)
+
+
+    def new_node(self, keys, children, values=None):
+        """
+        Returns a new b+-tree node containing the given keys,
+        children and values.
+        """
+        return B_Plus_Node(keys, children, values)
+
+
+    def link(self, prev, next):
+        """
+        Places self between the leaves prev and next, either of
+        which may be None.
+        """
+        self.prev = prev
+        self.next = next
+        if prev:
+            prev.next = self
+        if next:
+            next.prev = self
+
+
+    def split_child(self, index):
+        """
+        Splits self's index-th child. Internal children are split as
+        in a b-tree. Leaves are divided into two linked leaves and a
+        copy of the first key of the right one is inserted into self.
+        """
+        child = self.children[index]
+        if not child.is_leaf():
+            return super().split_child(index)
+
+        median = child.num_keys()//2
+        left = child.new_node(child.keys[:median], [])
+        right = child.new_node(child.keys[median:], [])
+        left.link(child.prev, right)
+        right.link(left, child.next)
+
+        self.keys.insert(index, right.keys[0])
+        self.children[index:index+1] = [left, right]
+        child.discard()
+
+
+    def merge_children(self, index):
+        """
+        Merges self's index-th child with its right sibling, dropping
+        the index-th key of self. The routing key is pulled down into
+        the merged node only if the children are internal. If self is
+        left without keys, then it takes the place of the merged node.
+        """
+        left, right = self.children[index : index+2]
+        if left.is_leaf():
+            left.keys.extend(right.keys)
+            left.link(left.prev, right.next)
+        else:
+            left.keys.append(self.keys[index])
+            left.keys.extend(right.keys)
+            left.children.extend(right.children)
+        left.size += right.size
+
+        del self.keys[index]
+        del self.children[index+1]
+
+        merged = left
+
+        if self.num_keys() == 0:
+            self.keys = left.keys
+            self.children = left.children
+            self.size = left.size
+            if left.is_leaf():
+                self.link(left.prev, left.next)
+            merged = self
+            left.discard()
+
+        right.discard()
+        return merged
+
+
+    def transfer_key_clockwise(self, index):
+        """
+        Moves the largest key of self's index-th child, or its
+        rightmost child if it is internal, to the next child,
+        updating the index-th key of self accordingly.
+        """
+        left, right = self.children[index : index+2]
+        if left.is_leaf():
+            right.keys.insert(0, left.keys[-1])
+            del left.keys[-1]
+            self.keys[index] = right.keys[0]
+            moved = 1
+
+        else:
+            right.keys.insert(0, self.keys[index])
+            right.children.insert(0, left.children[-1])
+            self.keys[index] = left.keys[-1]
+            del left.keys[-1]
+            del left.children[-1]
+            moved = right.children[0].size
+
+        left.size -= moved
+        right.size += moved
+
+
+    def transfer_key_counter_clockwise(self, index):
+        """
+        Moves the smallest key of self's (index+1)-th child, or its
+        leftmost child if it is internal, to the previous child,
+        updating the index-th key of self accordingly.
+        """
+        left, right = self.children[index : index+2]
+        if right.is_leaf():
+            left.keys.append(right.keys[0])
+            del right.keys[0]
+            self.keys[index] = right.keys[0]
+            moved = 1
+
+        else:
+            left.keys.append(self.keys[index])
+            left.children.append(right.children[0])
+            self.keys[index] = right.keys[0]
+            del right.keys[0]
+            del right.children[0]
+            moved = left.children[-1].size
+
+        left.size += moved
+        right.size -= moved
+
+
+
+class B_Plus_Tree(B_Tree):
+    """
+    B+-Tree data structure.
+
+    Every key lives in a leaf and leaves are linked in key order, so
+    full iteration and range scans walk along the leaf chain once
+    the first leaf is found, without going back to internal nodes.
+    Search, predecessor and successor behave as in B_Tree, except
+    that search always returns a location within a leaf.
+    """
+
+    def __init__(self, degree, typecode=None):
+        """
+        Returns an empty b+-tree with the given degree. Every node
+        holds between degree-1 and 2*degree-1 keys, as in B_Tree.
+        Note: Assumes degree > 1.
+        """
+        super().__init__(degree, typecode)
+        self.root = B_Plus_Node(self.new_keys(), [])
+
+
+    def snapshot(self):
+        """
+        Returns a b+-tree holding the keys the b+-tree holds now,
+        with its settings. Nodes cannot be shared, as B_Tree.snapshot
+        shares them: copying a leaf would require copying its
+        neighbours too, since they link to it, and so on along the
+        whole leaf chain. The snapshot is bulk-loaded from the leaf
+        chain instead, in O(n) time, as join is.
+        """
+        tree = self.new_tree()
+        tree.load_sorted(zip(self.inorder(), repeat(None)))
+        return tree
+
+
+    @classmethod
+    def join(cls, left, pivot, right, value=None):
+        """
+        Returns a b+-tree holding the keys of left, pivot and the keys
+        of right, which must be in order, as B_Tree.join does, and
+        leaves left and right empty.
+
+        Stitching the shorter b+-tree onto the taller one would need
+        pivot copied into a leaf and both leaf chains relinked, so the
+        new b+-tree is bulk-loaded from the leaf chains instead, which
+        takes O(n) time rather than O(log n).
+        """
+        tree = left.new_tree()
+        keys = chain(left.inorder(), (pivot,), right.inorder())
+        tree.load_sorted(zip(keys, repeat(None)))
+        left.clear()
+        right.clear()
+        return tree
+
+
+    def split(self, key, inclusive=False):
+        """
+        Splits the b+-tree into a pair of b+-trees as B_Tree.split
+        does, and leaves it empty. Both halves are bulk-loaded from
+        ranges of the leaf chain, in O(n) time, as join is.
+        """
+        trees = []
+        for bounds in ((None, key, (True, inclusive)), (key, None, (not inclusive, True))):
+            tree = self.new_tree()
+            tree.load_sorted(zip(self.range(*bounds), repeat(None)))
+            trees.append(tree)
+        self.clear()
+        return tuple(trees)
+
+
+    def load_sorted(self, items, fill_factor=1.0):
+        """
+        Fills the b+-tree, which must be empty, with the keys of the
+        (key, value) pairs generated by items, whose keys must be in
+        non-decreasing order.
+
+        The tree is built bottom-up in a single pass, as in B_Tree:
+        every level keeps its rightmost node open and, once a node
+        holds fill_factor*(2*degree - 1) keys, a new node is opened.
+        The key opening a new leaf stays in it, linked after the full
+        one, and a copy of it is pushed up as a routing key. Only the
+        right spine may end up underfull, and it is repaired once the
+        input is exhausted.
+        """
+        self.version += 1
+        num_keys = int(fill_factor*self.max_num_keys)
+        num_keys = max(self.min_num_keys, min(num_keys, self.max_num_keys))
+        new_node = self.root.new_node
+
+        spine = [self.own_root()]
+        previous = None
+        for (key, value) in items:
+            if previous is not None and key < previous:
+                raise ValueError("keys are not sorted in non-decreasing order")
+            previous = key
+
+            leaf = spine[0]
+            if leaf.num_keys() < num_keys:
+                leaf.keys.append(key)
+                continue
+
+            node = new_node(self.new_keys((key,)), [])
+            node.link(leaf, None)
+            level = 0
+            while True:
+                finished, spine[level] = spine[level], node
+                finished.owner = self.owner
+                finished.compute_size()
+                finished.release()
+                level += 1
+
+                if level == len(spine):
+                    spine.append(new_node(self.new_keys((key,)), [finished, node]))
+                    break
+
+                parent = spine[level]
+                if parent.num_keys() < num_keys:
+                    parent.keys.append(key)
+                    parent.children.append(node)
+                    break
+
+                node = new_node(self.new_keys(), [node])
+
+        for node in spine:
+            node.owner = self.owner
+            node.compute_size()
+        self.root = spine[-1]
+        self.forget_edge_leaves()
+        self.repair_right_spine()
+
+
+    @classmethod
+    def load(cls, fileobj):
+        """
+        Returns the b+-tree written into fileobj by dump, linking its
+        leaves once they are read. See B_Tree.load.
+        """
+        tree = super().load(fileobj)
+        previous = None
+        for leaf in tree.generate_leaves():
+            leaf.link(previous, None)
+            previous = leaf
+        return tree
+
+
+    def generate_leaves(self):
+        """
+        Generates the leaves of the b+-tree from left to right,
+        following their parents rather than their links.
+        """
+        *_, leaves = self.generate_levels()
+        yield from leaves
+
+
+    def locate_leaf(self, key, after=False):
+        """
+        Returns the leaf where a search for key ends: the one holding
+        the first key not smaller than key or, if after is set, the
+        first key larger than key, unless that key begins the next leaf.
+        """
+        node = self.root
+        while not node.is_leaf():
+            index = node.locate_successor(key) if after else node.search(key)
+            node = node.children[index]
+        return node
+
+
+    def locate_child(self, node, key):
+        """
+        Returns the index of the child of node holding the first
+        occurrence of key, if any, or the child key belongs to
+        otherwise. Routing keys equal to key may leave key on
+        either side of them, so the largest key of the child on
+        their left decides.
+        """
+        index = node.search(key)
+        while index < node.num_keys() and node.keys[index] == key \
+                and node.children[index].deep_max() != key:
+            index += 1
+        return index
+
+
+    def search(self, key):
+        """
+        Searches for the given key in the b+-tree. Returns a location
+        pair (leaf, index), if the given key is found, and None
+        otherwise.
+        """
+        leaf = self.locate_leaf(key)
+        index = leaf.search(key)
+        if index == leaf.num_keys() and leaf.next:
+            (leaf, index) = (leaf.next, 0)
+
+        return (leaf, index) if leaf.contains_key_at(key, index) else None
+
+
+    def search_many(self, keys):
+        """
+        Searches for every key in keys. Returns a list holding, for
+        each key in the given order, the location pair that search
+        would return or None if the key is not found.
+        """
+        return [self.search(key) for key in keys]
+
+
+    def predecessor(self, key):
+        """
+        Returns the predecessor of key in the b+-tree if
+        a predecessor exists and None otherwise.
+        """
+        leaf = self.locate_leaf(key)
+        index = leaf.locate_predecessor(key)
+        if index < 0:
+            leaf = leaf.prev
+            index = -1
+        return leaf.keys[index] if leaf else None
+
+
+    def successor(self, key):
+        """
+        Returns the successor of key in the b+-tree if
+        a successor exists and None otherwise.
+        """
+        leaf = self.locate_leaf(key, after=True)
+        index = leaf.locate_successor(key)
+        if index == leaf.num_keys():
+            leaf = leaf.next
+            index = 0
+        return leaf.keys[index] if leaf else None
+
+
+    def count_below(self, key, inclusive):
+        """
+        Returns the number of keys in the b+-tree that are smaller
+        than key or, if inclusive is set, not larger than key.
+        """
+        count = 0
+        node = self.root
+        while True:
+            index = node.count_below(key, inclusive)
+            if node.is_leaf():
+                return count + index
+
+            for child in node.children[:index]:
+                count += child.size
+            node = node.children[index]
+
+
+    def select(self, index):
+        """
+        Returns the index-th smallest key in the b+-tree, counting
+        from 0. Negative indices count from the largest key, as
+        for lists. Raises IndexError if index is out of range.
+        """
+        if index < 0:
+            index += self.root.size
+        if not 0 <= index < self.root.size:
+            raise IndexError("b-tree index out of range")
+
+        node = self.root
+        while not node.is_leaf():
+            for child in node.children:
+                if index < child.size:
+                    node = child
+                    break
+                index -= child.size
+
+        return node.keys[index]
+
+
+    def insert(self, key):
+        """
+        Inserts key in the b+-tree.
+        """
+        self.version += 1
+        if self.root.num_keys() == self.max_num_keys:
+            self.grow_root()
+
+        node = self.root
+        while not node.is_leaf():
+            index = node.search(key)
+
+            child = node.children[index]
+            if child.num_keys() == self.max_num_keys:
+                node.split_child(index)
+
+                if node.keys[index] < key:
+                    index += 1
+
+            node.size += 1
+            node = node.children[index]
+
+        node.insert(key)
+
+
+    def delete(self, key):
+        """
+        Deletes key from the b+-tree.
+        """
+        self.version += 1
+        node = self.root
+        path = []
+        while not node.is_leaf():
+            index = self.locate_child(node, key)
+            child = node.children[index]
+            if child.num_keys() <= self.min_num_keys:
+                child = node.grow_child(index, self.min_num_keys)
+
+            if child is not node:
+                node.size -= 1
+                path.append(node)
+            node = child
+
+        if not node.delete(key):
+            for node in path:
+                node.size += 1
+
+
+    def insert_many(self, keys):
+        """
+        Inserts every key in keys in the b+-tree, in sorted order
+        so that consecutive insertions reach neighbouring leaves.
+        """
+        for key in sorted(keys):
+            self.insert(key)
+
+
+    def delete_many(self, keys):
+        """
+        Deletes every key in keys from the b+-tree, one occurrence
+        per occurrence in keys.
+        """
+        for key in sorted(keys):
+            self.delete(key)
+
+
+    def delete_range(self, lo=None, hi=None, inclusive=(True, False)):
+        """
+        Deletes the keys that range(lo, hi, inclusive) generates, one
+        at a time, and returns how many were deleted. Sub-trees cannot
+        be dropped whole, as split and join rebuild the whole b+-tree.
+        """
+        keys = list(self.range(lo, hi, inclusive))
+        self.delete_many(keys)
+        return len(keys)
+
+
+    def first_leaf(self):
+        """
+        Returns the leftmost leaf of the b+-tree.
+        """
+        node = self.root
+        while not node.is_leaf():
+            node = node.children[0]
+        return node
+
+
+    def last_leaf(self):
+        """
+        Returns the rightmost leaf of the b+-tree.
+        """
+        node = self.root
+        while not node.is_leaf():
+            node = node.children[-1]
+        return node
+
+
+    def inorder(self):
+        """
+        Generates the keys of the b+-tree in non-decreasing order,
+        walking along the leaf chain.
+        """
+        leaf = self.first_leaf()
+        while leaf:
+            yield from leaf.keys
+            leaf = leaf.next
+
+
+    def generate_range_forward(self, lo, hi, inclusive):
+        """
+        Generates the keys of range(lo, hi, inclusive) in
+        non-decreasing order.
+        """
+        (lo_inclusive, hi_inclusive) = inclusive
+        if lo is None:
+            (leaf, index) = (self.first_leaf(), 0)
+        elif lo_inclusive:
+            leaf = self.locate_leaf(lo)
+            index = leaf.search(lo)
+        else:
+            leaf = self.locate_leaf(lo, after=True)
+            index = leaf.locate_successor(lo)
+
+        while leaf:
+            keys = leaf.keys
+            stop = len(keys) if hi is None else leaf.count_below(hi, hi_inclusive)
+            yield from keys[index:stop]
+            if stop < len(keys):
+                return
+
+            (leaf, index) = (leaf.next, 0)
+
+
+    def generate_range_backward(self, lo, hi, inclusive):
+        """
+        Generates the keys of range(lo, hi, inclusive) in
+        non-increasing order.
+        """
+        (lo_inclusive, hi_inclusive) = inclusive
+        if hi is None:
+            leaf = self.last_leaf()
+            index = leaf.num_keys() - 1
+        elif hi_inclusive:
+            leaf = self.locate_leaf(hi, after=True)
+            index = leaf.locate_successor(hi) - 1
+        else:
+            leaf = self.locate_leaf(hi)
+            index = leaf.search(hi) - 1
+
+        while leaf:
+            keys = leaf.keys
+            start = 0 if lo is None else leaf.count_below(lo, not lo_inclusive)
+            yield from reversed(keys[start:index+1])
+            if start > 0:
+                return
+
+            leaf = leaf.prev
+            index = leaf.num_keys() - 1 if leaf else -1
+
+
+    def cursor(self):
+        """
+        Returns a cursor over the b+-tree. See B_Plus_Cursor.
+        """
+        return B_Plus_Cursor(self)
+
+
+
+class B_Plus_Cursor(Cursor):
+    """
+    Cursor over a b+-tree. Its path holds a single leaf, together
+    with the index of the key, and moves along the leaf chain.
+    """
+
+    def locate(self, key):
+        """
+        Sets the path to the first key not smaller than key, or to
+        the smallest key if key is None.
+        """
+        if key is None:
+            (leaf, index) = (self.tree.first_leaf(), 0)
+        else:
+            leaf = self.tree.locate_leaf(key)
+            index = leaf.search(key)
+
+        if index == leaf.num_keys():
+            (leaf, index) = (leaf.next, 0)
+        self.path = [(leaf, index)] if leaf else []
+
+
+    def step_forward(self):
+        """
+        Sets the path to the key following the current one.
+        """
+        (leaf, index) = self.path[-1]
+        if index + 1 < leaf.num_keys():
+            self.path[-1] = (leaf, index + 1)
+        elif leaf.next:
+            self.path[-1] = (leaf.next, 0)
+        else:
+            self.path = []
+
+
+    def step_backward(self):
+        """
+        Sets the path to the key preceding the current one.
+        """
+        (leaf, index) = self.path[-1]
+        if index > 0:
+            self.path[-1] = (leaf, index - 1)
+        elif leaf.prev:
+            self.path[-1] = (leaf.prev, leaf.prev.num_keys() - 1)
+        else:
+            self.path = []
@@ -0,0 +1,100 @@
+from b_plus_tree import *
+from b_tree_tester import B_Tree_Tester
+from random import randint, sample
+
+
+class B_Plus_Tree_Tester(B_Tree_Tester):
+
+    tree_class = B_Plus_Tree
+
+    def perform_tests(self):
+        key_range = 10*self.num_ops
+        universe = set(range(-key_range, key_range + 1))
+        keys = [randint(-key_range, key_range + 1) for _ in range(self.num_ops)]
+        existent = set(keys)
+        nonexistent = sample(sorted(universe.difference(existent)), self.num_ops)
+        sorted_keys = sorted(existent)
+
+        if not self.test_insert(keys):
+            return False
+
+        if not self.test_search(existent, nonexistent):
+            return False
+
+        if not self.test_search_many(existent, nonexistent):
+            return False
+
+        if not self.test_predecessor(sorted_keys):
+            return False
+
+        if not self.test_successor(sorted_keys):
+            return False
+
+        if not self.test_range(sorted(keys)):
+            return False
+
+        if not self.test_order_statistics(sorted(keys)):
+            return False
+
+        if not self.test_cursor(keys, nonexistent):
+            return False
+
+        if not self.test_delete(keys, nonexistent):
+            return False
+
+        if not self.test_from_sorted(sorted(keys)):
+            return False
+
+        if not self.test_batched_updates(keys, nonexistent):
+            return False
+
+        if not self.test_snapshot(keys, nonexistent):
+            return False
+
+        if not self.test_dump(keys):
+            return False
+
+        if not self.test_set_operations(keys, nonexistent):
+            return False
+
+        if not self.test_join_split(keys):
+            return False
+
+        if not self.test_pops(keys):
+            return False
+
+        if not self.test_delete_range(keys):
+            return False
+
+
+    def check(self):
+        is_valid = super().check()
+
+        if not self.valid_leaf_chain():
+            print("The leaf chain does not match the leaves")
+            is_valid = False
+
+        return is_valid
+
+
+    def valid_size(self, node):
+        if node.is_leaf():
+            return node.size == node.num_keys()
+        return node.size == sum(child.size for child in node.children)
+
+
+    def valid_key_children_ordering(self, node):
+        return all(key >= child.deep_max() for (key, child) in zip(node.keys, node.children)) \
+               and all(key <= child.deep_min() for (key, child) in zip(node.keys, node.children[1:]))
+
+
+    def valid_leaf_chain(self):
+        leaves = [node for node in self.T.depth_first_search() if node.is_leaf()]
+        chain = []
+        leaf = self.T.first_leaf()
+        while leaf:
+            chain.append(leaf)
+            leaf = leaf.next
+
+        return chain == leaves and leaves[0].prev is None \
+               and all(leaf.prev is previous for (previous, leaf) in zip(leaves, leaves[1:]))
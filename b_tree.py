@@ -1,20 +1,46 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from copy import copy
+from inspect import isgenerator
+from itertools import groupby, repeat
+from operator import itemgetter
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from struct import Struct
+from sys import byteorder
+from time import perf_counter
+
 
 class Node:
     """
     B-Tree node data structure.
+
+    Nodes only hold what the b-tree needs to operate, in slots,
+    and keys may be kept in any mutable sequence supporting the
+    list interface, such as an array of machine integers.
     """
 
-    def __init__(self, keys, children):
+    __slots__ = ("keys", "children", "values", "size", "owner")
+
+    DISCARDED = object()
+
+    def __init__(self, keys, children, values=None):
         """
         Generates a b-tree node containing the given keys
-        and children.
+        and children. If values is provided, then the i-th
+        value is attached to the i-th key and travels with
+        it through every structural operation. The node
+        also keeps the number of keys in its sub-tree, and
+        the owner of the b-tree allowed to update it in
+        place, if it was created after a snapshot.
 
         Note: This procedure assumes that, if provided,
-        keys and children have the proper structure.
+        keys, children and values have the proper structure.
         """
         self.keys = keys 
         self.children = children 
-        self.str_pos = None
+        self.values = values
+        self.size = len(keys) + sum(child.size for child in children)
+        self.owner = None
 
 
     def num_keys(self):
@@ -31,6 +57,62 @@ class Node:
         return len(self.children)
 
 
+    def compute_size(self):
+        """
+        Recomputes the number of keys in self's sub-tree
+        from the sizes of self's children.
+        """
+        self.size = self.num_keys() + sum(child.size for child in self.children)
+
+
+    def new_node(self, keys, children, values=None):
+        """
+        Returns a new node of the same kind as self, containing
+        the given keys, children and values.
+        """
+        return Node(keys, children, values)
+
+
+    def clone(self, owner):
+        """
+        Returns a copy of self owned by owner. The copy has its
+        own keys, children and values, but shares self's children.
+        """
+        values = None if self.values is None else self.values[:]
+        node = self.new_node(self.keys[:], self.children[:], values)
+        node.owner = owner
+        return node
+
+
+    def own_child(self, index, owner):
+        """
+        Returns self's index-th child, replacing it first by a clone
+        owned by owner if it belongs to a different owner, which means
+        that it may be shared with a snapshot.
+        """
+        child = self.children[index]
+        if child.owner is not owner:
+            child = self.children[index] = child.clone(owner)
+        return child
+
+
+    def release(self):
+        """
+        Called once a bulk load is done with self, which is still
+        part of its b-tree. Plain nodes have nothing to release.
+        """
+
+
+    def discard(self):
+        """
+        Called once self has been removed from its b-tree by a
+        structural operation. Plain nodes have nothing to release,
+        but are disowned, so that no b-tree takes them for one of
+        its nodes, such as a cached edge leaf, anymore.
+        """
+        self.owner = self.DISCARDED
+
+
     def is_leaf(self):
         """
         Checks whether self is a leaf.
@@ -43,28 +125,18 @@ class Node:
         Returns the index of the key preceding key in self.
         If all keys in self are smaller than key, then the
         returned index equals the number of keys in self.
+        In-node lookups go through bisect, which is written
+        in C and works on lists and arrays alike.
         """
-        left = 0 
-        right = self.num_keys()
-        while right > left:
-            mid = (left + right)//2
-            if self.keys[mid] >= key:
-                right = mid
-            else:
-                left = mid + 1
-        return left
+        return bisect_left(self.keys, key)
 
 
     def linear_search(self, key):
         """
-        Returns the index of the key preceding key in self.
-        If all keys in self are smaller than key, then the
-        returned index equals the number of keys in self.
+        Alias of search, kept for code written when nodes
+        scanned their keys. It now runs the same lookup.
         """
-        index = 0
-        while index < self.num_keys() and self.keys[index] < key:
-            index += 1
-        return index
+        return self.search(key)
 
 
     def contains_key_at(self, key, index):
@@ -104,6 +176,14 @@ class Node:
         return index-1
 
 
+    def count_below(self, key, inclusive):
+        """
+        Returns the number of keys in self that are smaller
+        than key or, if inclusive is set, not larger than key.
+        """
+        return bisect_right(self.keys, key) if inclusive else bisect_left(self.keys, key)
+
+
     def predecessor(self, key):
         """
         Returns the key preceding key in self.
@@ -124,6 +204,24 @@ class Node:
         return self.children[index].deep_max()
 
 
+    def replace_with_deep_predecessor(self, index):
+        """
+        Replaces self's index-th key, together with its value,
+        by the key that precedes it in self's sub-tree, and
+        returns that key.
+
+        Note: Assumes that self is not a leaf.
+        """
+        node = self.children[index]
+        while not node.is_leaf():
+            node = node.children[-1]
+
+        self.keys[index] = node.keys[-1]
+        if self.values is not None:
+            self.values[index] = node.values[-1]
+        return self.keys[index]
+
+
     def locate_successor(self, key):
         """
         Returns the index of the key potentially
@@ -131,10 +229,7 @@ class Node:
         exists, then the number of keys in self is
         returned.
         """
-        index = 0
-        while index < self.num_keys() and self.keys[index] <= key:
-            index += 1
-        return index
+        return bisect_right(self.keys, key)
 
 
     def successor(self, key):
@@ -144,7 +239,7 @@ class Node:
         returned.
         """
         index = self.locate_successor(key)
-        self.keys[index] if index < self.num_keys() else None
+        return self.keys[index] if index < self.num_keys() else None
 
 
     def deep_successor(self, index):
@@ -155,23 +250,51 @@ class Node:
         Note: Assumes that self is not a leaf.
         """
         return self.children[index+1].deep_min()
+
+
+    def replace_with_deep_successor(self, index):
+        """
+        Replaces self's index-th key, together with its value,
+        by the key that succeeds it in self's sub-tree, and
+        returns that key.
+
+        Note: Assumes that self is not a leaf.
+        """
+        node = self.children[index+1]
+        while not node.is_leaf():
+            node = node.children[0]
+
+        self.keys[index] = node.keys[0]
+        if self.values is not None:
+            self.values[index] = node.values[0]
+        return self.keys[index]
         
 
-    def insert(self, key):
+    def insert(self, key, value=None):
         """
-        Inserts key in self.
+        Inserts key in self, attaching value to it if self
+        stores values.
         """
         index = self.search(key)
         self.keys.insert(index, key)
+        if self.values is not None:
+            self.values.insert(index, value)
+        self.size += 1
 
 
     def delete(self, key):
         """
-        Deletes key from self.
+        Deletes key from self. Returns whether key was found.
         """
         index = self.search(key)
-        if self.contains_key_at(key, index):
-            del self.keys[index]
+        if not self.contains_key_at(key, index):
+            return False
+
+        del self.keys[index]
+        if self.values is not None:
+            del self.values[index]
+        self.size -= 1
+        return True
 
 
     def split_child(self, index):
@@ -192,17 +315,26 @@ class Node:
                       right children of the rest of those keys
 
         Then makes those nodes the left and right children of the median key
-        and inserts the median key into self.
+        and inserts the median key into self. Values, if any, are divided
+        along with their keys.
         """
         child = self.children[index]
         median = (child.num_keys())//2
         median_key = child.keys[median]
 
-        left  = Node(child.keys[:median], child.children[:median + 1])
-        right = Node(child.keys[median + 1:], child.children[median + 1:])
+        left_values = right_values = None
+        if child.values is not None:
+            self.values.insert(index, child.values[median])
+            left_values = child.values[:median]
+            right_values = child.values[median + 1:]
+
+        left  = child.new_node(child.keys[:median], child.children[:median + 1], left_values)
+        right = child.new_node(child.keys[median + 1:], child.children[median + 1:], right_values)
+        left.owner = right.owner = self.owner
 
         self.keys.insert(index, median_key)
         self.children[index:index+1] = [left, right]
+        child.discard()
 
 
     def merge_children(self, index):
@@ -216,8 +348,14 @@ class Node:
         left.keys.append(median_key)
         left.keys.extend(right.keys)
 
+        if left.values is not None:
+            left.values.append(self.values[index])
+            left.values.extend(right.values)
+            del self.values[index]
+
         if not right.is_leaf():
             left.children.extend(right.children)
+        left.size += 1 + right.size
 
         del self.keys[index]
         del self.children[index+1]
@@ -227,12 +365,16 @@ class Node:
         if self.num_keys() == 0:
             self.keys = left.keys
             self.children = left.children
+            self.values = left.values
+            self.size = left.size
             merged = self
+            left.discard()
 
+        right.discard()
         return merged 
 
 
-    def grow_child(self, index, min_num_keys):
+    def grow_child(self, index, min_num_keys, owner=None):
         """
         Returns self's index-th child after increasing its number of
         keys by either:
@@ -242,19 +384,25 @@ class Node:
 
             - Merging with a sibling that contains at most min_num_keys
             keys.
+
+        The nodes updated in place are made to belong to owner first.
         """
-        child = self.children[index]
         left_sibling = (index > 0) and self.children[index-1]
         right_sibling = (index < self.num_keys()) and self.children[index+1]
 
         if left_sibling and left_sibling.num_keys() > min_num_keys:
+            self.own_child(index-1, owner)
+            child = self.own_child(index, owner)
             self.transfer_key_clockwise(index-1)
 
         elif right_sibling and right_sibling.num_keys() > min_num_keys:
+            self.own_child(index+1, owner)
+            child = self.own_child(index, owner)
             self.transfer_key_counter_clockwise(index)
 
         else:
             shared_key_index = (index - 1) if left_sibling else index
+            self.own_child(shared_key_index, owner)
             child = self.merge_children(shared_key_index)
 
         return child 
@@ -270,13 +418,23 @@ class Node:
         left, right = self.children[index : index+2]
         right.keys.insert(0, self.keys[index])
 
+        moved = 1
         if left.children:
+            moved += left.children[-1].size
             right.children.insert(0, left.children[-1])
             del left.children[-1]
 
+        left.size -= moved
+        right.size += moved
+
         self.keys[index] = left.keys[-1]
         del left.keys[-1]
 
+        if self.values is not None:
+            right.values.insert(0, self.values[index])
+            self.values[index] = left.values[-1]
+            del left.values[-1]
+
 
     def transfer_key_counter_clockwise(self, index):
         """
@@ -288,19 +446,36 @@ class Node:
         left, right = self.children[index : index+2]
         left.keys.append(self.keys[index])
 
+        moved = 1
         if not right.is_leaf():
+            moved += right.children[0].size
             left.children.append(right.children[0])
             del right.children[0]
 
+        left.size += moved
+        right.size -= moved
+
         self.keys[index] = right.keys[0]
         del right.keys[0]
 
+        if self.values is not None:
+            left.values.append(self.values[index])
+            self.values[index] = right.values[0]
+            del right.values[0]
+
+
+    def label(self):
+        """
+        Returns the string representation of self's keys.
+        """
+        return str(list(self.keys))
+
 
     def __str__(self):
         """
         Returns a string representing self.
         """
-        T = Btree(2)
+        T = B_Tree(2)
         T.root = Node(self.keys, [Node(child.keys, []) for child in self.children])
         return str(T)
 
@@ -318,16 +493,204 @@ class B_Tree:
     B-Tree data structure.
     """
 
-    def __init__(self, degree):
-        """
-        Returns an empty b-tree with the given degree.
+    TUNING_DEGREES = (2, 4, 8, 16, 32, 64, 128, 256)
+    DUMP_MAGIC = b"BTREEDMP"
+    DUMP_HEADER = Struct("<8sII8sc?")
+    DUMP_BLOCK = Struct("<I")
+
+    def __init__(self, degree, typecode=None, redistribute=False):
+        """
+        Returns an empty b-tree with the given degree. If a
+        typecode is given, such as 'q' or 'd', keys are stored
+        unboxed in arrays of that type instead of in lists.
+        If redistribute is set, insertions shift keys into the
+        siblings of full nodes before splitting them, as in a
+        b*-tree. See make_room. The spine caches the path from
+        the root to the rightmost leaf, for appends to reuse.
+        The version counts the updates made to the b-tree, so
+        that cursors can tell when their path went stale. The
+        owner tells the nodes the b-tree may update in place
+        from those it shares with its snapshots. The edge leaves
+        cache the leftmost and rightmost leaves, together with the
+        version they were found at. See edge_leaf.
         Note: Assumes degree > 1.
         """
-        self.root = Node([], [])
+        self.typecode = typecode
+        self.root = Node(self.new_keys(), [])
         self.min_num_keys = degree - 1 
         self.max_num_keys = 2*degree - 1
+        self.version = 0
+        self.owner = None
+        self.forget_edge_leaves()
+        self.redistribute = redistribute
+        self.spine = (None, None)
+
+
+    @classmethod
+    def from_sorted(cls, keys, degree, fill_factor=1.0, typecode=None):
+        """
+        Returns a b-tree with the given degree containing the
+        keys generated by the given iterable, which must be in
+        non-decreasing order. See load_sorted.
+
+        Note: Assumes degree > 1 and 0 < fill_factor <= 1.
+        """
+        tree = cls(degree, typecode)
+        tree.load_sorted(zip(keys, repeat(None)), fill_factor)
+        return tree
+
+
+    @classmethod
+    def tuned(cls, sample_workload, degrees=TUNING_DEGREES, typecode=None, repeat=3):
+        """
+        Returns an empty b-tree whose degree, out of the given ones,
+        runs sample_workload the fastest. See time_workload.
+
+        The best degree depends on the keys and on the mix of
+        operations: larger nodes mean shallower descents but
+        costlier insertions into their key lists, so the sample
+        should look like the workload the b-tree will serve.
+        """
+        workload = list(sample_workload)
+        degree = min(degrees, key=lambda degree: cls.time_workload(workload, degree, typecode, repeat))
+        return cls(degree, typecode)
+
+
+    @classmethod
+    def time_workload(cls, workload, degree, typecode=None, repeat=3):
+        """
+        Returns the shortest time, in seconds, taken by an empty
+        b-tree with the given degree to run workload, out of repeat
+        runs. See run_workload.
+        """
+        best = float("inf")
+        for _ in range(repeat):
+            tree = cls(degree, typecode)
+            start = perf_counter()
+            tree.run_workload(workload)
+            best = min(best, perf_counter() - start)
+        return best
+
+
+    def run_workload(self, workload):
+        """
+        Runs every operation in workload on the b-tree, in order.
+        Operations are tuples holding the name of a b-tree method
+        followed by its arguments, such as ("insert", 42) or
+        ("range", 0, 100). Generators returned, such as those of
+        inorder and range, are exhausted.
+        """
+        for (name, *args) in workload:
+            result = getattr(self, name)(*args)
+            if isgenerator(result):
+                for _ in result:
+                    pass
+
+
+    def new_keys(self, keys=()):
+        """
+        Returns a new key container holding the given keys.
+        """
+        return array(self.typecode, keys) if self.typecode else list(keys)
+
+
+    def load_sorted(self, items, fill_factor=1.0):
+        """
+        Fills the b-tree, which must be empty, with the (key, value)
+        pairs generated by items, whose keys must be in non-decreasing
+        order, or in increasing order in maps, whose keys are unique.
+        Raises ValueError otherwise. Values are discarded if the
+        b-tree does not store them.
+
+        The tree is built bottom-up in a single pass: every level
+        keeps a single open node (its rightmost one) and, once a node
+        holds fill_factor*(2*degree - 1) keys, the next key is pushed
+        up as a separator and a new node is opened. Only the right
+        spine may end up underfull, and it is repaired once the input
+        is exhausted. Sub-tree sizes are computed as nodes are closed,
+        and closed nodes are released, as the load no longer needs them.
+        """
+        self.version += 1
+        num_keys = int(fill_factor*self.max_num_keys)
+        num_keys = max(self.min_num_keys, min(num_keys, self.max_num_keys))
+        mapping = self.root.values is not None
+        new_node = self.root.new_node
+
+        spine = [self.own_root()]
+        previous = None
+        for (key, value) in items:
+            if previous is not None and key < previous:
+                raise ValueError("keys are not sorted in non-decreasing order")
+            if previous is not None and mapping and not previous < key:
+                raise ValueError("map keys are not sorted in increasing order")
+            previous = key
+
+            leaf = spine[0]
+            if leaf.num_keys() < num_keys:
+                leaf.keys.append(key)
+                if mapping:
+                    leaf.values.append(value)
+                continue
+
+            node = new_node(self.new_keys(), [], [] if mapping else None)
+            level = 0
+            while True:
+                finished, spine[level] = spine[level], node
+                finished.owner = self.owner
+                finished.compute_size()
+                finished.release()
+                level += 1
+
+                if level == len(spine):
+                    spine.append(new_node(self.new_keys((key,)), [finished, node], [value] if mapping else None))
+                    break
+
+                parent = spine[level]
+                if parent.num_keys() < num_keys:
+                    parent.keys.append(key)
+                    parent.children.append(node)
+                    if mapping:
+                        parent.values.append(value)
+                    break
+
+                node = new_node(self.new_keys(), [node], [] if mapping else None)
+
+        for node in spine:
+            node.owner = self.owner
+            node.compute_size()
+        self.root = spine[-1]
+        self.forget_edge_leaves()
+        self.repair_right_spine()
+
+
+    def repair_right_spine(self):
+        """
+        Restores the minimum number of keys along the right spine
+        of the b-tree, assuming that every node outside of it is
+        valid. Descending from the root, every spine child is left
+        with more than the minimum number of keys, either by
+        transferring keys from its left sibling or by merging with
+        it, so that a merge below never leaves its parent underfull.
+        """
+        while not self.root.is_leaf() and self.root.num_keys() == 0:
+            self.root = self.root.children[0]
+
+        node = self.root
+        while not node.is_leaf():
+            index = node.num_keys()
+            child = node.children[index]
+
+            if child.num_keys() <= self.min_num_keys:
+                left = node.children[index-1]
+                if left.num_keys() + child.num_keys() > 2*self.min_num_keys:
+                    while child.num_keys() <= self.min_num_keys:
+                        node.transfer_key_clockwise(index-1)
+                else:
+                    child = node.merge_children(index-1)
+
+            node = child
+
 
-    
     def search(self, key):
         """
         Searches for the given key in the b-tree. Returns
@@ -342,6 +705,52 @@ class B_Tree:
         return (node, index) if node.contains_key_at(key, index) else None
 
 
+    def search_many(self, keys):
+        """
+        Searches for every key in keys. Returns a list holding, for
+        each key in the given order, the location pair (node, index)
+        that search would return or None if the key is not found.
+
+        The keys are sorted once and the batch descends the tree in
+        a single pass: each node splits its slice of the sorted batch
+        among its children, so a node shared by several root-to-leaf
+        paths is visited once per batch.
+        """
+        keys = list(keys)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        locations = [None]*len(keys)
+
+        queue = [(self.root, 0, len(order))]
+        while queue:
+            (node, start, end) = queue.pop()
+            child_index, child_start = -1, start
+            for position in range(start, end):
+                key = keys[order[position]]
+                index = node.search(key)
+
+                if node.contains_key_at(key, index):
+                    locations[order[position]] = (node, index)
+                    index = -1
+
+                if index != child_index:
+                    if child_index >= 0 and not node.is_leaf():
+                        queue.append((node.children[child_index], child_start, position))
+                    child_index, child_start = index, position
+
+            if child_index >= 0 and not node.is_leaf():
+                queue.append((node.children[child_index], child_start, end))
+
+        return locations
+
+
+    def contains_many(self, keys):
+        """
+        Returns a list telling, for each key in keys in the given
+        order, whether it is stored in the b-tree. See search_many.
+        """
+        return [location is not None for location in self.search_many(keys)]
+
+
     def predecessor(self, key):
         """
         Returns the predecessor of key in the b-tree if
@@ -372,198 +781,1337 @@ class B_Tree:
         return successor
 
 
-    def insert(self, key):
+    def rank(self, key):
         """
-        Inserts key in the b-tree.
+        Returns the number of keys in the b-tree that are
+        smaller than key.
         """
-        if self.root.num_keys() == self.max_num_keys:
-            self.root = Node([], [self.root])
-            self.root.split_child(0)
+        return self.count_below(key, False)
 
-        node = self.root 
-        while not node.is_leaf():
-            index = node.search(key)
-
-            child = node.children[index]
-            if child.num_keys() == self.max_num_keys:
-                node.split_child(index)
 
-                if node.keys[index] < key:
-                    index += 1
+    def count_below(self, key, inclusive):
+        """
+        Returns the number of keys in the b-tree that are smaller
+        than key or, if inclusive is set, not larger than key.
 
-            node = node.children[index] 
+        Every level adds the keys preceding the descent position
+        and the sizes of the children on their left.
+        """
+        count = 0
+        node = self.root
+        while True:
+            index = node.count_below(key, inclusive)
+            count += index
+            if node.is_leaf():
+                return count
 
-        node.insert(key)
+            for child in node.children[:index]:
+                count += child.size
+            node = node.children[index]
 
 
-    def delete(self, key):
+    def select(self, index):
         """
-        Deletes key from the b-tree.
+        Returns the index-th smallest key in the b-tree, counting
+        from 0. Negative indices count from the largest key, as
+        for lists. Raises IndexError if index is out of range.
         """
+        if index < 0:
+            index += self.root.size
+        if not 0 <= index < self.root.size:
+            raise IndexError("b-tree index out of range")
+
         node = self.root
         while not node.is_leaf():
-            index = node.search(key)
+            for (position, child) in enumerate(node.children):
+                if index < child.size:
+                    node = child
+                    break
 
-            if node.contains_key_at(key, index):
-                left, right = node.children[index : index+2]
+                index -= child.size
+                if index == 0:
+                    return node.keys[position]
+                index -= 1
 
-                if left.num_keys() > self.min_num_keys:
-                    node.keys[index] = node.deep_predecessor(index)
-                    (node, key) = (left, node.keys[index])
+        return node.keys[index]
 
-                elif right.num_keys() > self.min_num_keys:
-                    node.keys[index] = node.deep_successor(index) 
-                    (node, key) = (right, node.keys[index])
 
-                else:
-                    node = node.merge_children(index)
+    def count_range(self, lo=None, hi=None, inclusive=(True, False)):
+        """
+        Returns the number of keys generated by range(lo, hi,
+        inclusive), without generating them.
+        """
+        (lo_inclusive, hi_inclusive) = inclusive
+        count = self.root.size if hi is None else self.count_below(hi, hi_inclusive)
+        if lo is not None:
+            count -= self.count_below(lo, not lo_inclusive)
+        return max(count, 0)
 
-            else:
-                child = node.children[index]
-                if child.num_keys() <= self.min_num_keys:
-                   child = node.grow_child(index, self.min_num_keys)
-                node = child
-                    
-        node.delete(key)
 
+    def min(self):
+        """
+        Returns the smallest key in the b-tree, or None if the
+        b-tree is empty, in O(1) time unless the leftmost leaf was
+        replaced since it was last found. See edge_leaf.
+        """
+        leaf = self.edge_leaf(0)
+        return leaf.keys[0] if leaf.keys else None
 
-    def inorder(self):
+
+    def max(self):
         """
-        Generates the keys of the b-tree in non-decreasing order.
+        Returns the largest key in the b-tree, or None if the
+        b-tree is empty. See min.
         """
-        queue = []
-        node = self.root
-        index = 0
-        while node:
+        leaf = self.edge_leaf(-1)
+        return leaf.keys[-1] if leaf.keys else None
 
-            if node.is_leaf():
-                yield from node.keys
 
-                if not queue:
-                    node = None
+    def edge_leaf(self, side):
+        """
+        Returns the leftmost leaf of the b-tree, if side is 0, or
+        the rightmost one, if side is -1.
 
-                else:
-                    node, index = queue.pop()
-                    yield node.keys[index]
-                    index = index + 1
+        The leaf found is cached and stays valid through updates as
+        long as the b-tree owns it: the splits and merges replacing
+        an edge leaf discard it, which disowns it, copies replace the
+        leaves the b-tree does not own, and operations replacing the
+        root forget the cached leaves. Appends and pops cache the
+        leaf they end at, so updates and lookups at either edge only
+        descend the tree once the edge leaf is replaced.
+        """
+        (version, leaf) = self.edge_leaves[side]
+        if version != self.version and (leaf is None or leaf.owner is not self.owner):
+            leaf = self.root
+            while not leaf.is_leaf():
+                leaf = leaf.children[side]
+        self.edge_leaves[side] = (self.version, leaf)
+        return leaf
 
-            else:
-                if index < node.num_keys():
-                    queue.append((node, index))
 
-                node = node.children[index]
-                index = 0
+    def forget_edge_leaves(self):
+        """
+        Drops the cached edge leaves, for operations replacing the
+        root of the b-tree, whose leaves are then found again.
+        """
+        self.edge_leaves = {0: (None, None), -1: (None, None)}
 
 
-    def breadth_first_search(self):
+    def snapshot(self):
         """
-        Generates the nodes of the b-tree in breath-first order.
+        Returns a snapshot of the b-tree in O(1) time: a b-tree
+        holding the keys the b-tree holds now, which later updates
+        to the b-tree leave untouched.
+
+        Both b-trees share every node until one of them updates it.
+        From then on, each b-tree copies the nodes it updates that
+        it does not own yet, together with the path leading to them,
+        so the memory taken by a snapshot grows with the number of
+        nodes updated since it was taken. Updates to the snapshot
+        are copied in the same way and are not seen by the b-tree.
         """
-        queue = [self.root]
-        while queue:
-            node = queue.pop()
-            yield node
-            queue.extend(node.children)
-    
+        snapshot = copy(self)
+        snapshot.owner = object()
+        snapshot.edge_leaves = dict(self.edge_leaves)
+        self.owner = object()
+        return snapshot
 
-    def depth_first_search(self):
+
+    def own_root(self):
         """
-        Generates the nodes of the b-tree in depth-first order.
+        Returns the root of the b-tree, replacing it first by
+        a clone if the b-tree may share it with a snapshot.
         """
-        queue = [self.root]
-        ordered = []
-        while queue:
-            node = queue.pop()
-            ordered.append(node)
-            queue.extend(node.children)
-        
-        while ordered:
-            yield ordered.pop()
+        if self.root.owner is not self.owner:
+            self.root = self.root.clone(self.owner)
+        return self.root
 
 
-    def __str__(self):
+    def search_for_update(self, key):
         """
-        Returns a string representing the b-tree.
+        Searches for key as search does, but makes the nodes on the
+        way belong to the b-tree, so that the node returned, if any,
+        may be updated in place.
         """
-        levels = tuple(self.generate_levels())
-        self.compute_representation_positions()
-        levels_to_strings = self.represent_tree_levels(levels)
-        branches = self.represent_tree_branches(levels)
+        node = self.own_root()
+        index = node.search(key)
+        while not node.contains_key_at(key, index) and not node.is_leaf():
+            node = node.own_child(index, self.owner)
+            index = node.search(key)
 
-        return "".join("".join((level, "\n\n", branch))
-                        for (level, branch) in zip(levels_to_strings, branches))
+        return (node, index) if node.contains_key_at(key, index) else None
 
 
-    def generate_levels(self):
+    def grow_root(self):
         """
-        Generates the levels of the tree. Here, a level is a list containing 
-        the nodes of the corresponding level in the tree.
+        Makes the current root the only child of a new root
+        and splits it, increasing the height of the b-tree.
         """
-        level = (self.root,)
-        while level:
-            yield level
-            level = tuple(child for node in level for child in node.children)
+        values = None if self.root.values is None else []
+        self.root = self.root.new_node(self.new_keys(), [self.root], values)
+        self.root.owner = self.owner
+        self.root.split_child(0)
 
 
-    def compute_representation_positions(self):
+    def insert(self, key, value=None):
         """
-        Consider a node in the tree and define the label of a node
-        be the string representation of its list of keys. This
-        method computes the start position of the label of every
-        node in the tree and stores the result in an attribute
-        node.repr_pos
+        Inserts key in the b-tree, attaching value to it
+        if the b-tree stores values. Keys not smaller than
+        any other are appended without a descent if the
+        rightmost leaf has room. See append.
         """
-        offset = 3
-        for node in self.depth_first_search():
+        if self.append(key, value):
+            return
 
-            if node.is_leaf():
-                node.str_pos = offset
-                offset += len(str(node.keys)) + 2
+        self.version += 1
+        if self.root.num_keys() == self.max_num_keys:
+            self.grow_root()
 
-            else:
-                first_child_mid = node.children[ 0].str_pos + len(str(node.children[ 0].keys))//2
-                last_child_mid  = node.children[-1].str_pos + len(str(node.children[-1].keys))//2
-                node.str_pos = (first_child_mid + last_child_mid)//2 - len(str(node.keys))//2
+        node = self.own_root()
+        spine = [node]
+        while not node.is_leaf():
+            index = node.search(key)
+            if node.children[index].num_keys() == self.max_num_keys:
+                index = self.make_room(node, index, key)
+
+            if spine and index < node.num_keys():
+                spine = None
+            node.size += 1
+            node = node.own_child(index, self.owner)
+            if spine:
+                spine.append(node)
+
+        node.insert(key, value)
+        if spine:
+            self.spine = (self.version, spine)
+
+
+    def append(self, key, value=None):
+        """
+        Appends key, with value, to the rightmost leaf and returns
+        True if key is not smaller than any key in the b-tree and
+        the leaf is not full. Returns False, changing nothing,
+        otherwise.
+
+        Insertions descending along the right spine of the b-tree
+        cache it until the next update, and appends keep it valid,
+        so a stream of increasing keys, such as timestamps, only
+        compares each key with the largest one and increments the
+        sizes along the spine, descending once per leaf filled.
+        """
+        (version, spine) = self.spine
+        if version != self.version:
+            return False
+
+        leaf = spine[-1]
+        if leaf.num_keys() == self.max_num_keys or (leaf.keys and key < leaf.keys[-1]) \
+                or any(node.owner is not self.owner for node in spine):
+            return False
+
+        self.version += 1
+        leaf.keys.append(key)
+        if leaf.values is not None:
+            leaf.values.append(value)
+        for node in spine:
+            node.size += 1
+
+        self.spine = (self.version, spine)
+        self.edge_leaves[-1] = (self.version, leaf)
+        return True
+
+
+    def make_room(self, node, index, key):
+        """
+        Makes sure that node's index-th child, the one key belongs
+        to, is not full, and returns the index of the child key
+        belongs to afterwards.
+
+        A full child is split, unless the b-tree redistributes keys.
+        Then, a key is shifted from the child into a direct sibling
+        that is not full, and only if neither sibling has room is the
+        child split together with one of them into three nodes. Nodes
+        are thus left about two thirds full rather than half full, at
+        the cost of updating a sibling. A sibling left full by the
+        shift must not be where key goes afterwards, so a sibling
+        with a single free slot only takes a key if key stays in the
+        child: if key is larger than the first key of the child, for
+        the left sibling, or not larger than its last key, for the
+        right one. The index returned is then found among the nodes
+        that took part, since a key equal to a separator further left
+        would be sent back to a full child by a search of the node.
+
+        Either way, if the child is the last one and key goes after
+        its keys, as when appending, its left sibling is first filled
+        up with its smallest keys, and the child is split otherwise.
+        A median split leaves the left half at the minimum number of
+        keys, and increasing keys never reach it again, so filling it
+        once its right sibling fills up leaves every node but the last
+        two of each level full. A key equal to the last key of node
+        may go into either child around it, so it is sent to the last
+        child rather than to a full one, and duplicates append too.
+        """
+        child = node.children[index]
+        if child.num_keys() < self.max_num_keys:
+            return index
+
+        if index < node.num_keys() and not key < node.keys[-1]:
+            index = node.num_keys()
+            child = node.children[index]
+            if child.num_keys() < self.max_num_keys:
+                return index
+
+        appending = index == node.num_keys() and not key < child.keys[-1]
+        if appending and index > 0 and node.children[index-1].num_keys() < self.max_num_keys:
+            left = node.own_child(index-1, self.owner)
+            node.own_child(index, self.owner)
+            while left.num_keys() < self.max_num_keys:
+                node.transfer_key_counter_clockwise(index-1)
+            return index
+
+        if appending or not self.redistribute:
+            node.split_child(index)
+            return index + 1 if node.keys[index] < key else index
+
+        left = index > 0 and node.children[index-1]
+        right = index < node.num_keys() and node.children[index+1]
+        if left and left.num_keys() < self.max_num_keys - (not child.keys[0] < key):
+            node.own_child(index-1, self.owner)
+            node.own_child(index, self.owner)
+            node.transfer_key_counter_clockwise(index-1)
+            return index if node.keys[index-1] < key else index-1
+
+        if right and right.num_keys() < self.max_num_keys - (child.keys[-1] < key):
+            node.own_child(index, self.owner)
+            node.own_child(index+1, self.owner)
+            node.transfer_key_clockwise(index)
+            return index+1 if node.keys[index] < key else index
+
+        sibling = index+1 if right else index-1
+        self.split_two_to_three(node, index, sibling)
+        first = index = min(index, sibling)
+        while index < first + 2 and node.keys[index] < key:
+            index += 1
+        return index
 
 
-    def represent_tree_levels(self, levels):
+    def split_two_to_three(self, node, index, sibling):
         """
-        Generates the string representation of every level in the tree.
+        Splits node's index-th child, which is full, and then evens
+        out the keys of both halves and of its sibling-th child, a
+        direct sibling, by transferring keys between them, so that
+        the three nodes hold about two thirds of the maximum number
+        of keys each.
         """
-        prev_node_end = 0 
-        level_string = []
-        for level in levels:
-            prev_node_end = 0 
-            level_string = []
-            for node in level: 
-                node_to_str = str(node.keys)
-                space_between_nodes = node.str_pos - prev_node_end 
-                level_string.extend((" "*space_between_nodes, node_to_str))
-                prev_node_end = node.str_pos + len(node_to_str)
-
-            yield "".join(level_string)
+        node.own_child(sibling, self.owner)
+        node.split_child(index)
+        first = min(index, sibling)
+        total = sum(child.num_keys() for child in node.children[first : first+3])
+        for offset in (0, 1):
+            position = first + offset
+            target = total//3 + (offset < total % 3)
+            while node.children[position].num_keys() < target:
+                node.transfer_key_counter_clockwise(position)
+            while node.children[position].num_keys() > target:
+                node.transfer_key_clockwise(position)
 
 
-    def represent_tree_branches(self, levels):
+    def delete(self, key):
         """
-        Generates the string representation of the branches of every
-        level in the tree.
+        Deletes key from the b-tree.
         """
-        for level in levels[:-1]:
-            branch = []
-            prev_child_mid = 0 
-            for node in level:
-                curr_child_mid = node.children[0].str_pos + len(str(node.children[0].keys))//2
-                space_between_children = curr_child_mid - prev_child_mid 
-                branch.extend((" "*space_between_children, "|"))
-                prev_child_mid = curr_child_mid + 1
-                for child in node.children[1:]:
-                    curr_child_mid = child.str_pos + len(str(child.keys))//2
-                    space_between_children = curr_child_mid - prev_child_mid 
-                    branch.extend(("-"*space_between_children, "|"))
-                    prev_child_mid = curr_child_mid + 1
-            
-            branch = "".join(branch)
+        self.version += 1
+        node = self.own_root()
+        path = []
+        while not node.is_leaf():
+            index = node.search(key)
+
+            if node.contains_key_at(key, index):
+                left, right = node.children[index : index+2]
+
+                if left.num_keys() > self.min_num_keys:
+                    key = node.replace_with_deep_predecessor(index)
+                    child = node.own_child(index, self.owner)
+
+                elif right.num_keys() > self.min_num_keys:
+                    key = node.replace_with_deep_successor(index)
+                    child = node.own_child(index+1, self.owner)
+
+                else:
+                    node.own_child(index, self.owner)
+                    child = node.merge_children(index)
+
+            else:
+                child = node.own_child(index, self.owner)
+                if child.num_keys() <= self.min_num_keys:
+                   child = node.grow_child(index, self.min_num_keys, self.owner)
+
+            if child is not node:
+                node.size -= 1
+                path.append(node)
+            node = child
+                    
+        if not node.delete(key):
+            for node in path:
+                node.size += 1
+
+
+    def insert_many(self, keys):
+        """
+        Inserts every key in keys in the b-tree.
+
+        The keys are sorted and inserted in order while remembering
+        the current root-to-leaf path, together with the separator
+        bounding each node from above. Every key resumes the descent
+        from the deepest node on that path which still covers it and
+        can absorb a split, so consecutive keys headed for the same
+        leaf are inserted there directly, and each full node on the
+        way is split once per visit instead of once per key.
+
+        Sub-tree sizes along the path are updated when a node leaves
+        the path, by the number of keys inserted while it was on it.
+        B-trees redistributing keys insert them one at a time, since
+        redistribution updates siblings off the path.
+        """
+        self.insert_sorted(zip(sorted(keys), repeat(None)))
+
+
+    def insert_sorted(self, items):
+        """
+        Inserts the (key, value) pairs generated by items, whose keys
+        must be in non-decreasing order, as insert_many describes.
+
+        In maps, keys are unique: a key found on the way down, either
+        in a node of the path or in one a split moved it into, gets
+        its value updated in place instead, so the last value given
+        for a key wins. Nodes are then only resumed for keys strictly
+        below their upper bound, since a key equal to it lives above.
+        """
+        if self.redistribute:
+            for (key, value) in items:
+                self.insert(key, value)
+            return
+
+        self.version += 1
+        mapping = self.root.values is not None
+        path = []
+        num_inserted = 0
+        for (key, value) in items:
+            while path:
+                (node, high, count) = path[-1]
+                if (high is None or key < high or (key == high and not mapping)) \
+                        and node.num_keys() < self.max_num_keys:
+                    break
+                path.pop()
+                if not node.is_leaf():
+                    node.size += num_inserted - count
+
+            if not path:
+                if self.root.num_keys() == self.max_num_keys:
+                    self.grow_root()
+                path.append((self.own_root(), None, num_inserted))
+
+            (node, high, count) = path[-1]
+            index = node.search(key)
+            while not node.is_leaf() and not (mapping and node.contains_key_at(key, index)):
+                if node.children[index].num_keys() == self.max_num_keys:
+                    index = self.make_room(node, index, key)
+                    if mapping and node.contains_key_at(key, index):
+                        break
+
+                if index < node.num_keys():
+                    high = node.keys[index]
+                node = node.own_child(index, self.owner)
+                path.append((node, high, num_inserted))
+                index = node.search(key)
+
+            if mapping and node.contains_key_at(key, index):
+                node.values[index] = value
+            else:
+                node.insert(key, value)
+                num_inserted += 1
+
+        for (node, high, count) in path:
+            if not node.is_leaf():
+                node.size += num_inserted - count
+
+
+    def delete_many(self, keys):
+        """
+        Deletes every key in keys from the b-tree, one occurrence
+        per occurrence in keys.
+
+        As in insert_many, the keys are processed in sorted order
+        along a remembered root-to-leaf path. Every key resumes the
+        descent from the deepest node on that path whose bounds
+        strictly contain it and that can afford losing a key, so
+        consecutive keys living in the same leaf are removed in a
+        single visit and nodes are only grown when they run out of
+        spare keys. Sub-tree sizes are updated as in insert_many.
+        """
+        self.version += 1
+        path = []
+        num_deleted = 0
+        for key in sorted(keys):
+            while path:
+                (node, low, high, count) = path[-1]
+                if (low is None or key > low) and (high is None or key < high) \
+                        and (len(path) == 1 or node.num_keys() > self.min_num_keys):
+                    break
+                path.pop()
+                if not node.is_leaf():
+                    node.size -= num_deleted - count
+
+            if not path:
+                path.append((self.own_root(), None, None, num_deleted))
+
+            (node, low, high, count) = path[-1]
+            while not node.is_leaf():
+                index = node.search(key)
+
+                if node.contains_key_at(key, index):
+                    left, right = node.children[index : index+2]
+
+                    if left.num_keys() > self.min_num_keys:
+                        key = node.replace_with_deep_predecessor(index)
+                        child = node.own_child(index, self.owner)
+
+                    elif right.num_keys() > self.min_num_keys:
+                        key = node.replace_with_deep_successor(index)
+                        child = node.own_child(index+1, self.owner)
+                        index += 1
+
+                    else:
+                        node.own_child(index, self.owner)
+                        child = node.merge_children(index)
+
+                else:
+                    child = node.own_child(index, self.owner)
+                    if child.num_keys() <= self.min_num_keys:
+                        child = node.grow_child(index, self.min_num_keys, self.owner)
+                        index = node.search(key)
+
+                if child is node:
+                    path[-1] = (node, low, high, num_deleted)
+                    continue
+
+                if index > 0:
+                    low = node.keys[index-1]
+                if index < node.num_keys():
+                    high = node.keys[index]
+                node = child
+                path.append((node, low, high, num_deleted))
+
+            if node.delete(key):
+                num_deleted += 1
+
+        for (node, low, high, count) in path:
+            if not node.is_leaf():
+                node.size -= num_deleted - count
+
+
+    def delete_range(self, lo=None, hi=None, inclusive=(True, False)):
+        """
+        Deletes the keys that range(lo, hi, inclusive) generates and
+        returns how many were deleted.
+
+        The b-tree is cut along the paths of lo and hi, as split does,
+        and the trees holding the keys below lo and above hi are joined
+        back, taking the smallest key above hi as the pivot. The
+        sub-trees lying between both paths are dropped whole, without
+        being visited, so deleting a range takes O(log n) time however
+        many keys it holds.
+        """
+        (lo_inclusive, hi_inclusive) = inclusive
+        num_keys = self.root.size
+        lower = upper = None
+        if lo is not None:
+            (lower, (self.root, _)) = self.split_root(lo, not lo_inclusive)
+        if hi is not None:
+            (_, upper) = self.split_root(hi, hi_inclusive)
+
+        self.clear()
+        parts = [part for part in (lower, upper) if part is not None and part[0].size]
+        if len(parts) == 1:
+            self.root = parts[0][0]
+
+        elif parts:
+            ((lower, lower_height), (self.root, _)) = parts
+            item = self.pop_edge(1, 0)[0]
+            (pivot, value) = item if lower.values is not None else (item, None)
+            (self.root, _) = self.join_roots(lower, lower_height, pivot, value, self.root, self.height())
+            self.version += 1
+            self.forget_edge_leaves()
+
+        return num_keys - self.root.size
+
+
+    def pop_min(self):
+        """
+        Removes the smallest key from the b-tree and returns it,
+        or its (key, value) pair in maps. Raises IndexError if the
+        b-tree is empty. See pop_edge.
+        """
+        if not self.root.size:
+            raise IndexError("pop from an empty b-tree")
+        return self.pop_edge(1, 0)[0]
+
+
+    def pop_max(self):
+        """
+        Removes the largest key from the b-tree and returns it,
+        or its (key, value) pair in maps. Raises IndexError if the
+        b-tree is empty. See pop_edge.
+        """
+        if not self.root.size:
+            raise IndexError("pop from an empty b-tree")
+        return self.pop_edge(1, -1)[0]
+
+
+    def pop_min_n(self, count):
+        """
+        Removes the count smallest keys from the b-tree, or all of
+        them if it holds fewer, and returns them in increasing order.
+        See pop_edge.
+        """
+        return self.pop_edge(count, 0)
+
+
+    def pop_max_n(self, count):
+        """
+        Removes the count largest keys from the b-tree, or all of
+        them if it holds fewer, and returns them in decreasing order.
+        See pop_edge.
+        """
+        return self.pop_edge(count, -1)
+
+
+    def pop_edge(self, count, side):
+        """
+        Removes up to count keys from the left edge of the b-tree, if
+        side is 0, or from its right edge, if side is -1, and returns
+        them in the order they were removed, paired with their values
+        in maps. See pop_edge_pass.
+        """
+        popped = []
+        while len(popped) < count and self.root.size:
+            popped.extend(self.pop_edge_pass(count - len(popped), side))
+        return popped
+
+
+    def pop_edge_pass(self, count, side):
+        """
+        Removes up to count keys from the given edge of the b-tree,
+        which must not be empty, in a single descent, and returns
+        them as pop_edge does.
+
+        The descent follows the spine of that edge without comparing
+        keys, growing every child that has only the minimum number of
+        keys, as delete does, so the edge leaf can give away every key
+        above the minimum at once. Sub-tree sizes are then lowered
+        along the spine, which is the only path rebalanced.
+        """
+        self.version += 1
+        mapping = self.root.values is not None
+        path = []
+        node = self.own_root()
+        while not node.is_leaf():
+            index = 0 if side == 0 else node.num_keys()
+            child = node.own_child(index, self.owner)
+            if child.num_keys() <= self.min_num_keys:
+                child = node.grow_child(index, self.min_num_keys, self.owner)
+            if child is not node:
+                path.append(node)
+                node = child
+
+        num_keys = node.num_keys()
+        num_popped = min(count, num_keys - (self.min_num_keys if path else 0))
+        taken = slice(0, num_popped) if side == 0 else slice(num_keys - num_popped, num_keys)
+        keys = node.keys[taken]
+        values = node.values[taken] if mapping else None
+        del node.keys[taken]
+        if mapping:
+            del node.values[taken]
+        for ancestor in path + [node]:
+            ancestor.size -= num_popped
+
+        self.edge_leaves[side] = (self.version, node)
+        items = zip(keys, values) if mapping else keys
+        return list(items if side == 0 else reversed(list(items)))
+
+
+    def union(self, other):
+        """
+        Returns a new b-tree, of the same kind and degree as self,
+        holding the keys of both b-trees. Keys held by both are kept
+        as many times as they occur in each, except in maps, whose
+        keys are unique and take the values of other. See merge.
+        """
+        if self.root.values is None:
+            return self.merge(other, lambda mine, theirs: mine + theirs)
+        return self.merge(other, lambda mine, theirs: theirs or mine)
+
+
+    def intersection(self, other):
+        """
+        Returns a new b-tree holding the keys of self that other
+        holds too, each as many times as it occurs in both, with
+        the values of self in maps. See merge.
+        """
+        return self.merge(other, lambda mine, theirs: mine[:len(theirs)])
+
+
+    def difference(self, other):
+        """
+        Returns a new b-tree holding the keys of self that other
+        does not hold, each occurrence in other cancelling one in
+        self, with the values of self in maps. See merge.
+        """
+        return self.merge(other, lambda mine, theirs: mine[len(theirs):])
+
+
+    def new_tree(self):
+        """
+        Returns an empty b-tree of the same kind as the b-tree and
+        with its settings: degree, typecode and redistribution.
+        """
+        tree = type(self)(self.min_num_keys + 1, self.typecode)
+        tree.redistribute = self.redistribute
+        return tree
+
+
+    def merge(self, other, combine):
+        """
+        Returns a new b-tree, of the same kind and settings as self,
+        built from the (key, value) pairs of both b-trees in O(m + n)
+        time: their sorted streams are merged a run of equal keys at
+        a time, combine(mine, theirs) is called with the lists of pairs
+        each b-tree holds for the key, and the pairs it returns are
+        bulk-loaded bottom-up by load_sorted.
+        """
+        tree = self.new_tree()
+        tree.load_sorted(self.merge_runs(self.generate_items(), other.generate_items(), combine))
+        return tree
+
+
+    @staticmethod
+    def merge_runs(mine, theirs, combine):
+        """
+        Generates the (key, value) pairs that combine keeps out of
+        the sorted pair streams mine and theirs. See merge.
+        """
+        mine = groupby(mine, itemgetter(0))
+        theirs = groupby(theirs, itemgetter(0))
+        (left, right) = (next(mine, None), next(theirs, None))
+        while left or right:
+            if right is None or (left is not None and left[0] < right[0]):
+                yield from combine(list(left[1]), [])
+                left = next(mine, None)
+
+            elif left is None or right[0] < left[0]:
+                yield from combine([], list(right[1]))
+                right = next(theirs, None)
+
+            else:
+                yield from combine(list(left[1]), list(right[1]))
+                (left, right) = (next(mine, None), next(theirs, None))
+
+
+    def generate_items(self):
+        """
+        Generates the (key, value) pairs of the b-tree in
+        non-decreasing key order, with None values if the
+        b-tree does not store them.
+        """
+        return zip(self.inorder(), repeat(None))
+
+
+    @classmethod
+    def join(cls, left, pivot, right, value=None):
+        """
+        Returns a b-tree holding the keys of left, pivot, attached
+        to value in maps, and the keys of right, where left and right
+        are b-trees of the same kind and degree, no key of left is
+        larger than pivot and no key of right is smaller than it. The
+        new b-tree takes the settings of left. See new_tree.
+
+        The shorter b-tree is stitched, as a whole, to the spine of
+        the taller one facing it, at the level where their heights
+        match, so joining takes O(log n) time. The nodes of left and
+        right move to the new b-tree and both are left empty.
+        """
+        tree = left.new_tree()
+        if left.owner is not None or right.owner is not None:
+            tree.owner = object()
+        (tree.root, _) = tree.join_roots(left.root, left.height(), pivot, value,
+                                         right.root, right.height())
+        left.clear()
+        right.clear()
+        return tree
+
+
+    def split(self, key, inclusive=False):
+        """
+        Splits the b-tree into a pair of b-trees of its kind: the
+        first holds the keys smaller than key, or not larger than key
+        if inclusive is set, and the second holds the rest. The nodes
+        of the b-tree move to the new b-trees and it is left empty.
+        See split_root.
+        """
+        trees = []
+        for (root, _) in self.split_root(key, inclusive):
+            tree = self.new_tree()
+            (tree.root, tree.owner) = (root, self.owner)
+            trees.append(tree)
+        self.clear()
+        return tuple(trees)
+
+
+    def split_root(self, key, inclusive):
+        """
+        Returns the root and height pairs of the two trees split
+        divides the b-tree into, without changing the b-tree.
+
+        Cutting the search path of key leaves, at every level, the
+        children to the left of the path, with the keys between them,
+        and those to its right. Both sides are joined back bottom-up,
+        each join costing the difference in height of the trees it
+        stitches, so splitting takes O(log n) time. Nodes on the path
+        are copied rather than updated in place.
+        """
+        mapping = self.root.values is not None
+        (left_parts, right_parts) = ([], [])
+
+        node = self.root
+        height = self.height()
+        while not node.is_leaf():
+            index = node.count_below(key, inclusive)
+            if index > 0:
+                pivot = (node.keys[index-1], node.values[index-1] if mapping else None)
+                left_parts.append(self.cut(node, 0, index-1, height) + pivot)
+            if index < node.num_keys():
+                pivot = (node.keys[index], node.values[index] if mapping else None)
+                right_parts.append(self.cut(node, index+1, node.num_keys(), height) + pivot)
+            node = node.children[index]
+            height -= 1
+
+        index = node.count_below(key, inclusive)
+        (lower, lower_height) = self.cut(node, 0, index, height)
+        (upper, upper_height) = self.cut(node, index, node.num_keys(), height)
+
+        for (part, part_height, pivot, value) in reversed(left_parts):
+            (lower, lower_height) = self.join_roots(part, part_height, pivot, value, lower, lower_height)
+
+        for (part, part_height, pivot, value) in reversed(right_parts):
+            (upper, upper_height) = self.join_roots(upper, upper_height, pivot, value, part, part_height)
+
+        return ((lower, lower_height), (upper, upper_height))
+
+
+    def cut(self, node, start, stop, height):
+        """
+        Returns the root and the height of a tree holding the keys
+        of node, of the given height, from index start up to stop,
+        together with the children around them. A single child is
+        returned as is, while a new node is made otherwise.
+        """
+        if start == stop and not node.is_leaf():
+            return (node.children[start], height - 1)
+
+        values = None if node.values is None else node.values[start:stop]
+        part = node.new_node(node.keys[start:stop], node.children[start:stop+1], values)
+        part.owner = self.owner
+        return (part, height)
+
+
+    def join_roots(self, left, left_height, pivot, value, right, right_height):
+        """
+        Returns the root and the height of a tree holding the keys
+        of the trees rooted at left and right, of the given heights,
+        with pivot, attached to value, in between. See join.
+        """
+        mapping = left.values is not None
+        if left_height == right_height:
+            root = left.new_node(self.new_keys((pivot,)), [left, right], [value] if mapping else None)
+            root.owner = self.owner
+            if self.fix_child(root, 0) or self.fix_child(root, 1):
+                return (root, left_height)
+            return (root, left_height + 1)
+
+        taller = left_height > right_height
+        (root, height) = (left, left_height) if taller else (right, right_height)
+        shorter = right if taller else left
+        if root.owner is not self.owner:
+            root = root.clone(self.owner)
+
+        if root.num_keys() == self.max_num_keys:
+            root = root.new_node(self.new_keys(), [root], [] if mapping else None)
+            root.owner = self.owner
+            root.split_child(0)
+            height += 1
+
+        node = root
+        for _ in range(height - min(left_height, right_height) - 1):
+            index = node.num_keys() if taller else 0
+            if node.children[index].num_keys() == self.max_num_keys:
+                node.split_child(index)
+                index = node.num_keys() if taller else 0
+            node.size += 1 + shorter.size
+            node = node.own_child(index, self.owner)
+
+        node.size += 1 + shorter.size
+        index = node.num_keys() if taller else 0
+        node.keys.insert(index, pivot)
+        node.children.insert(index + taller, shorter)
+        if mapping:
+            node.values.insert(index, value)
+        self.fix_child(node, index + taller)
+        return (root, height)
+
+
+    def fix_child(self, node, index):
+        """
+        Brings node's first or last child, its index-th one, back
+        to the minimum number of keys, either by transferring keys
+        from its only direct sibling or by merging with it. Returns
+        whether they were merged.
+        """
+        child = node.own_child(index, self.owner)
+        if child.num_keys() >= self.min_num_keys:
+            return False
+
+        shared = index - 1 if index else 0
+        sibling = node.own_child(index - 1 if index else 1, self.owner)
+        if sibling.num_keys() + child.num_keys() <= 2*self.min_num_keys:
+            node.merge_children(shared)
+            return True
+
+        while child.num_keys() < self.min_num_keys:
+            if index:
+                node.transfer_key_clockwise(shared)
+            else:
+                node.transfer_key_counter_clockwise(shared)
+        return False
+
+
+    def height(self):
+        """
+        Returns the number of edges on the paths leading
+        from the root of the b-tree to its leaves.
+        """
+        (node, height) = (self.root, 0)
+        while not node.is_leaf():
+            node = node.children[0]
+            height += 1
+        return height
+
+
+    def clear(self):
+        """
+        Removes every key from the b-tree.
+        """
+        self.version += 1
+        values = None if self.root.values is None else []
+        self.root = self.root.new_node(self.new_keys(), [], values)
+        self.root.owner = self.owner
+        self.forget_edge_leaves()
+
+
+    def inorder(self):
+        """
+        Generates the keys of the b-tree in non-decreasing order.
+        """
+        queue = []
+        node = self.root
+        index = 0
+        while node:
+
+            if node.is_leaf():
+                yield from node.keys
+
+                if not queue:
+                    node = None
+
+                else:
+                    node, index = queue.pop()
+                    yield node.keys[index]
+                    index = index + 1
+
+            else:
+                if index < node.num_keys():
+                    queue.append((node, index))
+
+                node = node.children[index]
+                index = 0
+
+
+    def range(self, lo=None, hi=None, inclusive=(True, False), reverse=False):
+        """
+        Generates the keys of the b-tree lying between lo and hi in
+        non-decreasing order, or in non-increasing order if reverse
+        is set. A missing bound leaves that side of the range open,
+        and inclusive tells whether each bound belongs to the range.
+
+        The generator seeks its first key with a single descent and
+        then walks the tree lazily with an explicit stack, as inorder
+        does, so it costs O(log n + k) for k generated keys.
+        """
+        if reverse:
+            return self.generate_range_backward(lo, hi, inclusive)
+        return self.generate_range_forward(lo, hi, inclusive)
+
+
+    def generate_range_forward(self, lo, hi, inclusive):
+        """
+        Generates the keys of range(lo, hi, inclusive) in
+        non-decreasing order.
+        """
+        (lo_inclusive, hi_inclusive) = inclusive
+        queue = []
+        node = self.root
+        while True:
+            index = 0 if lo is None else node.count_below(lo, not lo_inclusive)
+
+            if node.is_leaf():
+                break
+
+            if index < node.num_keys():
+                queue.append((node, index))
+            node = node.children[index]
+
+        while True:
+            keys = node.keys
+            stop = len(keys) if hi is None else node.count_below(hi, hi_inclusive)
+            yield from keys[index:stop]
+            if stop < len(keys):
+                return
+
+            if not queue:
+                return
+
+            node, index = queue.pop()
+            key = node.keys[index]
+            if hi is not None and (key > hi if hi_inclusive else key >= hi):
+                return
+            yield key
+
+            index += 1
+            if index < node.num_keys():
+                queue.append((node, index))
+
+            node = node.children[index]
+            while not node.is_leaf():
+                queue.append((node, 0))
+                node = node.children[0]
+            index = 0
+
+
+    def generate_range_backward(self, lo, hi, inclusive):
+        """
+        Generates the keys of range(lo, hi, inclusive) in
+        non-increasing order.
+        """
+        (lo_inclusive, hi_inclusive) = inclusive
+        queue = []
+        node = self.root
+        while True:
+            index = node.num_keys() if hi is None else node.count_below(hi, hi_inclusive)
+            index -= 1
+
+            if node.is_leaf():
+                break
+
+            if index >= 0:
+                queue.append((node, index))
+            node = node.children[index+1]
+
+        while True:
+            keys = node.keys
+            start = 0 if lo is None else node.count_below(lo, not lo_inclusive)
+            yield from reversed(keys[start:index+1])
+            if start > 0:
+                return
+
+            if not queue:
+                return
+
+            node, index = queue.pop()
+            key = node.keys[index]
+            if lo is not None and (key < lo if lo_inclusive else key <= lo):
+                return
+            yield key
+
+            if index > 0:
+                queue.append((node, index-1))
+
+            node = node.children[index]
+            while not node.is_leaf():
+                queue.append((node, node.num_keys() - 1))
+                node = node.children[-1]
+            index = node.num_keys() - 1
+
+
+    def cursor(self):
+        """
+        Returns a cursor over the b-tree. See Cursor.
+        """
+        return Cursor(self)
+
+
+    def breadth_first_search(self):
+        """
+        Generates the nodes of the b-tree in breath-first order.
+        """
+        queue = [self.root]
+        while queue:
+            node = queue.pop()
+            yield node
+            queue.extend(node.children)
+    
+
+    def depth_first_search(self):
+        """
+        Generates the nodes of the b-tree in depth-first order.
+        """
+        queue = [self.root]
+        ordered = []
+        while queue:
+            node = queue.pop()
+            ordered.append(node)
+            queue.extend(node.children)
+        
+        while ordered:
+            yield ordered.pop()
+
+
+    def dump(self, fileobj):
+        """
+        Writes the b-tree into the binary file object fileobj, in the
+        format read by load.
+
+        A header holding the degree, the height and the typecode of the
+        b-tree is followed by its nodes in level order. Every node is
+        written as a block of keys, followed by a block of values in
+        maps, and every block starts with its length in bytes. Keys are
+        written as raw machine values if the b-tree has a typecode and
+        pickled otherwise. The number of children of a node is implied
+        by its number of keys. Nodes are written one at a time, so the
+        encoding is never held in memory as a whole.
+        """
+        height = 0
+        node = self.root
+        while not node.is_leaf():
+            height += 1
+            node = node.children[0]
+
+        mapping = self.root.values is not None
+        typecode = (self.typecode or "").encode()
+        fileobj.write(self.DUMP_HEADER.pack(self.DUMP_MAGIC, self.min_num_keys + 1, height,
+                                            typecode, byteorder[0].encode(), mapping))
+        for level in self.generate_levels():
+            for node in level:
+                self.write_block(fileobj, self.encode_keys(node.keys))
+                if mapping:
+                    self.write_block(fileobj, dumps(list(node.values), HIGHEST_PROTOCOL))
+
+
+    @classmethod
+    def load(cls, fileobj):
+        """
+        Returns the b-tree written into the binary file object fileobj
+        by dump. Nodes are read one at a time and keys stored with a
+        typecode are copied straight from the file into key arrays.
+        Raises ValueError if fileobj does not hold a b-tree of cls's
+        kind, or if it ends too early.
+        """
+        header = cls.read_bytes(fileobj, cls.DUMP_HEADER.size)
+        (magic, degree, height, typecode, order, mapping) = cls.DUMP_HEADER.unpack(header)
+        if magic != cls.DUMP_MAGIC:
+            raise ValueError("not a b-tree dump")
+
+        tree = cls(degree, typecode.rstrip(b"\0").decode() or None)
+        if mapping != (tree.root.values is not None):
+            raise ValueError("the dump does not hold a b-tree of this kind")
+
+        swap = order.decode() != byteorder[0]
+        tree.root = tree.read_node(fileobj, mapping, swap)
+        level = [tree.root]
+        for _ in range(height):
+            children = []
+            for node in level:
+                for _ in range(node.num_keys() + 1):
+                    node.children.append(tree.read_node(fileobj, mapping, swap))
+                children.extend(node.children)
+            level = children
+
+        for node in tree.depth_first_search():
+            node.compute_size()
+        return tree
+
+
+    def read_node(self, fileobj, mapping, swap):
+        """
+        Reads a node written by dump from fileobj and returns it,
+        without children. Keys are byte swapped if swap is set.
+        """
+        keys = self.decode_keys(self.read_block(fileobj), swap)
+        values = loads(self.read_block(fileobj)) if mapping else None
+        node = self.root.new_node(keys, [], values)
+        node.owner = self.owner
+        return node
+
+
+    def encode_keys(self, keys):
+        """
+        Returns the bytes dump writes for the given key container.
+        """
+        if self.typecode:
+            return keys.tobytes()
+        return dumps(list(keys), HIGHEST_PROTOCOL)
+
+
+    def decode_keys(self, data, swap):
+        """
+        Returns a key container holding the keys encoded in data by
+        encode_keys, byte swapping them if swap is set.
+        """
+        if not self.typecode:
+            return self.new_keys(loads(data))
+
+        keys = array(self.typecode)
+        keys.frombytes(data)
+        if swap:
+            keys.byteswap()
+        return keys
+
+
+    @classmethod
+    def write_block(cls, fileobj, data):
+        """
+        Writes data into fileobj, prefixed by its length.
+        """
+        fileobj.write(cls.DUMP_BLOCK.pack(len(data)))
+        fileobj.write(data)
+
+
+    @classmethod
+    def read_block(cls, fileobj):
+        """
+        Reads a block written by write_block from fileobj and
+        returns its data.
+        """
+        (length,) = cls.DUMP_BLOCK.unpack(cls.read_bytes(fileobj, cls.DUMP_BLOCK.size))
+        return cls.read_bytes(fileobj, length)
+
+
+    @staticmethod
+    def read_bytes(fileobj, size):
+        """
+        Reads exactly size bytes from fileobj and returns them.
+        Raises ValueError if fileobj ends before.
+        """
+        data = fileobj.read(size)
+        while len(data) < size:
+            chunk = fileobj.read(size - len(data))
+            if not chunk:
+                raise ValueError("the b-tree dump ends too early")
+            data += chunk
+        return data
+
+
+    def __len__(self):
+        """
+        Returns the number of keys in the b-tree, which
+        the root keeps as its sub-tree size.
+        """
+        return self.root.size
+
+
+    def __str__(self):
+        """
+        Returns a string representing the b-tree.
+        """
+        levels = tuple(self.generate_levels())
+        positions = self.compute_representation_positions()
+        levels_to_strings = self.represent_tree_levels(levels, positions)
+        branches = self.represent_tree_branches(levels, positions)
+
+        return "".join("".join((level, "\n\n", branch))
+                        for (level, branch) in zip(levels_to_strings, branches))
+
+
+    def generate_levels(self):
+        """
+        Generates the levels of the tree. Here, a level is a list containing 
+        the nodes of the corresponding level in the tree.
+        """
+        level = (self.root,)
+        while level:
+            yield level
+            level = tuple(child for node in level for child in node.children)
+
+
+    def compute_representation_positions(self):
+        """
+        Consider a node in the tree and define the label of a node
+        be the string representation of its list of keys. This
+        method computes the start position of the label of every
+        node in the tree and returns a dictionary mapping each node
+        to that position.
+        """
+        positions = dict()
+        offset = 3
+        for node in self.depth_first_search():
+
+            if node.is_leaf():
+                positions[node] = offset
+                offset += len(node.label()) + 2
+
+            else:
+                first_child_mid = positions[node.children[ 0]] + len(node.children[ 0].label())//2
+                last_child_mid  = positions[node.children[-1]] + len(node.children[-1].label())//2
+                positions[node] = (first_child_mid + last_child_mid)//2 - len(node.label())//2
+
+        return positions
+
+
+    def represent_tree_levels(self, levels, positions):
+        """
+        Generates the string representation of every level in the tree.
+        """
+        prev_node_end = 0 
+        level_string = []
+        for level in levels:
+            prev_node_end = 0 
+            level_string = []
+            for node in level: 
+                node_to_str = node.label()
+                space_between_nodes = positions[node] - prev_node_end 
+                level_string.extend((" "*space_between_nodes, node_to_str))
+                prev_node_end = positions[node] + len(node_to_str)
+
+            yield "".join(level_string)
+
+
+    def represent_tree_branches(self, levels, positions):
+        """
+        Generates the string representation of the branches of every
+        level in the tree.
+        """
+        for level in levels[:-1]:
+            branch = []
+            prev_child_mid = 0 
+            for node in level:
+                curr_child_mid = positions[node.children[0]] + len(node.children[0].label())//2
+                space_between_children = curr_child_mid - prev_child_mid 
+                branch.extend((" "*space_between_children, "|"))
+                prev_child_mid = curr_child_mid + 1
+                for child in node.children[1:]:
+                    curr_child_mid = positions[child] + len(child.label())//2
+                    space_between_children = curr_child_mid - prev_child_mid 
+                    branch.extend(("-"*space_between_children, "|"))
+                    prev_child_mid = curr_child_mid + 1
+            
+            branch = "".join(branch)
             branch = "".join((branch, "\n", branch.replace("-", " "), "\n\n"))
             yield branch
 
@@ -576,3 +2124,435 @@ class B_Tree:
         """
         return str(self)
 
+
+
+class B_Tree_Map(B_Tree):
+    """
+    B-Tree mapping keys to values. Every value is stored next
+    to its key, in the same node, so a lookup costs a single
+    descent. Keys are unique.
+    """
+
+    def __init__(self, degree, typecode=None, redistribute=False):
+        """
+        Returns an empty b-tree map with the given degree.
+        See B_Tree.
+        """
+        super().__init__(degree, typecode, redistribute)
+        self.root = Node(self.new_keys(), [], [])
+
+
+    @classmethod
+    def from_sorted(cls, items, degree, fill_factor=1.0, typecode=None):
+        """
+        Returns a b-tree map with the given degree containing the
+        (key, value) pairs generated by items, whose keys must be
+        in increasing order. Raises ValueError if a key is repeated.
+        See B_Tree.load_sorted.
+        """
+        tree = cls(degree, typecode)
+        tree.load_sorted(items, fill_factor)
+        return tree
+
+
+    def __getitem__(self, key):
+        """
+        Returns the value attached to key. Raises KeyError
+        if key is not in the map.
+        """
+        location = self.search(key)
+        if location is None:
+            raise KeyError(key)
+        (node, index) = location
+        return node.values[index]
+
+
+    def __setitem__(self, key, value):
+        """
+        Attaches value to key, inserting key if it is not
+        in the map.
+        """
+        self.insert(key, value)
+
+
+    def insert(self, key, value=None):
+        """
+        Attaches value to key, inserting key if it is not
+        in the map. Unlike in a b-tree, keys are never
+        inserted twice.
+        """
+        location = self.search_for_update(key)
+        if location is None:
+            super().insert(key, value)
+        else:
+            (node, index) = location
+            node.values[index] = value
+
+
+    def insert_many(self, items):
+        """
+        Attaches every value to its key for every (key, value)
+        pair in items, inserting the keys that are not in the
+        map. A key given more than once ends up with its last
+        value. See B_Tree.insert_many.
+        """
+        self.insert_sorted(sorted(items, key=itemgetter(0)))
+
+
+    def delete_many(self, keys):
+        """
+        Deletes every key in keys, together with its value,
+        from the map. Keys are unique, so a key given more
+        than once is deleted once. See B_Tree.delete_many.
+        """
+        super().delete_many(key for (key, _) in groupby(sorted(keys)))
+
+
+    def __delitem__(self, key):
+        """
+        Deletes key and its value. Raises KeyError if key
+        is not in the map.
+        """
+        self.pop(key)
+
+
+    def __contains__(self, key):
+        """
+        Checks whether key is in the map.
+        """
+        return self.search(key) is not None
+
+
+    def get(self, key, default=None):
+        """
+        Returns the value attached to key if key is in the
+        map and default otherwise.
+        """
+        location = self.search(key)
+        if location is None:
+            return default
+        (node, index) = location
+        return node.values[index]
+
+
+    def pop(self, key, *default):
+        """
+        Deletes key and returns its value. If key is not in
+        the map, then default is returned if provided and
+        KeyError is raised otherwise.
+        """
+        location = self.search(key)
+        if location is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+
+        (node, index) = location
+        value = node.values[index]
+        self.delete(key)
+        return value
+
+
+    def generate_items(self):
+        """
+        Generates the (key, value) pairs of the map in
+        increasing key order.
+        """
+        return self.items()
+
+
+    def items(self):
+        """
+        Generates the (key, value) pairs of the map in
+        increasing key order.
+        """
+        queue = []
+        node = self.root
+        index = 0
+        while node:
+
+            if node.is_leaf():
+                yield from zip(node.keys, node.values)
+
+                if not queue:
+                    node = None
+
+                else:
+                    node, index = queue.pop()
+                    yield (node.keys[index], node.values[index])
+                    index = index + 1
+
+            else:
+                if index < node.num_keys():
+                    queue.append((node, index))
+
+                node = node.children[index]
+                index = 0
+
+
+
+class Cursor:
+    """
+    Position within a b-tree, moving over its keys in order.
+
+    A cursor keeps the path leading to its key: for every node on
+    the way, the index of the child it descended into and, for the
+    last node, the index of the key itself. Updates may restructure
+    the nodes on that path, so the cursor remembers the version of
+    the b-tree it was positioned at and, once the b-tree changed,
+    finds its place again by seeking its key before moving. Since
+    keys may be repeated, the cursor also counts the occurrences of
+    its key that precede it or, if it last moved backward onto its
+    key, those that follow it, so that moving only compares keys.
+
+    Once the cursor moves past either end of the b-tree, key is None
+    until the next seek.
+    """
+
+    def __init__(self, tree):
+        """
+        Returns a cursor over the given b-tree, positioned nowhere.
+        """
+        self.tree = tree
+        self.path = []
+        self.key = None
+        self.offset = 0
+        self.from_last = False
+        self.version = tree.version
+
+
+    def seek(self, key=None):
+        """
+        Moves the cursor to the first key not smaller than key, or
+        to the smallest key if key is None, and returns it. Returns
+        None if there is no such key.
+        """
+        self.locate(key)
+        (self.offset, self.from_last) = (0, False)
+        return self.settle()
+
+
+    def next(self):
+        """
+        Moves the cursor to the following key and returns it.
+        Returns None if there is no following key.
+        """
+        if self.key is None:
+            return None
+        if self.version != self.tree.version and not self.reseek():
+            return self.key
+
+        previous = self.key
+        self.step_forward()
+        self.settle()
+        if self.key == previous:
+            self.offset += -1 if self.from_last else 1
+        else:
+            (self.offset, self.from_last) = (0, False)
+        return self.key
+
+
+    def prev(self):
+        """
+        Moves the cursor to the preceding key and returns it.
+        Returns None if there is no preceding key. A cursor whose
+        key has since been deleted moves to the key preceding it,
+        which is the largest key if none followed it.
+        """
+        if self.key is None:
+            return None
+        if self.version != self.tree.version:
+            self.reseek()
+            if self.key is None:
+                self.locate_last()
+                (self.offset, self.from_last) = (0, True)
+                return self.settle()
+
+        previous = self.key
+        self.step_backward()
+        self.settle()
+        if self.key is None:
+            (self.offset, self.from_last) = (0, False)
+        elif self.key == previous:
+            self.offset += 1 if self.from_last else -1
+        else:
+            (self.offset, self.from_last) = (0, True)
+        return self.key
+
+
+    def next_n(self, count):
+        """
+        Moves the cursor count keys forward and returns a list of the
+        keys it went through, which is shorter than count only if the
+        cursor ran past the largest key. Keys are copied from each
+        leaf in a single slice.
+        """
+        keys = []
+        if self.key is None:
+            return keys
+
+        previous = self.key
+        if self.version != self.tree.version and not self.reseek():
+            if self.key is None:
+                return keys
+            keys.append(self.key)
+            previous = None
+
+        while len(keys) < count:
+            (node, index) = self.path[-1]
+            if node.is_leaf() and index + 1 < node.num_keys():
+                chunk = node.keys[index + 1 : index + 1 + count - len(keys)]
+                self.path[-1] = (node, index + len(chunk))
+                keys.extend(chunk)
+                continue
+
+            self.step_forward()
+            if not self.path:
+                break
+            (node, index) = self.path[-1]
+            keys.append(node.keys[index])
+
+        self.settle()
+        run = 0
+        while run < len(keys) and keys[-1 - run] == self.key:
+            run += 1
+        if run == len(keys) and previous == self.key:
+            self.offset += -run if self.from_last else run
+        else:
+            (self.offset, self.from_last) = (max(run - 1, 0), False)
+        return keys
+
+
+    def reseek(self):
+        """
+        Finds the place of the cursor again after the b-tree changed:
+        moves it to the same occurrence of its key, if it is still in
+        the b-tree, or else to the key following it. Returns whether
+        the cursor is back on its key. An occurrence counted from the
+        last one is counted from the first one again, which takes the
+        only descent made to count occurrences.
+        """
+        (key, offset) = (self.key, self.offset)
+        if self.from_last:
+            offset = max(self.tree.count_range(key, key, (True, True)) - 1 - offset, 0)
+        self.locate(key)
+        self.settle()
+
+        skipped = 0
+        while skipped < offset and self.key == key:
+            self.step_forward()
+            self.settle()
+            skipped += 1
+
+        found = self.key == key
+        (self.offset, self.from_last) = (skipped if found else 0, False)
+        return found
+
+
+    def settle(self):
+        """
+        Reads the key the path leads to, records the version of the
+        b-tree the path is valid for and returns the key.
+        """
+        self.version = self.tree.version
+        if self.path:
+            (node, index) = self.path[-1]
+            self.key = node.keys[index]
+        else:
+            self.key = None
+        return self.key
+
+
+    def locate(self, key):
+        """
+        Sets the path to the first key not smaller than key, or to
+        the smallest key if key is None.
+        """
+        self.path = []
+        node = self.tree.root
+        while True:
+            index = 0 if key is None else node.search(key)
+            if node.is_leaf():
+                break
+            self.path.append((node, index))
+            node = node.children[index]
+
+        if index < node.num_keys():
+            self.path.append((node, index))
+        else:
+            self.climb_forward()
+
+
+    def locate_last(self):
+        """
+        Sets the path to the last occurrence of the largest key.
+        """
+        self.path = []
+        node = self.tree.root
+        while not node.is_leaf():
+            self.path.append((node, node.num_keys()))
+            node = node.children[-1]
+        if node.num_keys():
+            self.path.append((node, node.num_keys() - 1))
+
+
+    def step_forward(self):
+        """
+        Sets the path to the key following the current one.
+        """
+        (node, index) = self.path[-1]
+        if node.is_leaf():
+            if index + 1 < node.num_keys():
+                self.path[-1] = (node, index + 1)
+            else:
+                self.path.pop()
+                self.climb_forward()
+            return
+
+        self.path[-1] = (node, index + 1)
+        node = node.children[index + 1]
+        while not node.is_leaf():
+            self.path.append((node, 0))
+            node = node.children[0]
+        self.path.append((node, 0))
+
+
+    def step_backward(self):
+        """
+        Sets the path to the key preceding the current one.
+        """
+        (node, index) = self.path[-1]
+        if node.is_leaf():
+            if index > 0:
+                self.path[-1] = (node, index - 1)
+            else:
+                self.path.pop()
+                self.climb_backward()
+            return
+
+        node = node.children[index]
+        while not node.is_leaf():
+            self.path.append((node, node.num_keys()))
+            node = node.children[-1]
+        self.path.append((node, node.num_keys() - 1))
+
+
+    def climb_forward(self):
+        """
+        Leaves every node on the path whose last child was just
+        exhausted, stopping at the key following that child.
+        """
+        while self.path and self.path[-1][1] == self.path[-1][0].num_keys():
+            self.path.pop()
+
+
+    def climb_backward(self):
+        """
+        Leaves every node on the path whose first child was just
+        exhausted, stopping at the key preceding that child.
+        """
+        while self.path and self.path[-1][1] == 0:
+            self.path.pop()
+        if self.path:
+            (node, index) = self.path[-1]
+            self.path[-1] = (node, index - 1)
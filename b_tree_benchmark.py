@@ -0,0 +1,450 @@
+from b_tree import *
+from io import BytesIO
+from pickle import dumps as pickle_dumps, loads as pickle_loads
+from b_plus_tree import B_Plus_Tree
+from b_tree_buffered import Buffered_B_Tree
+from b_tree_concurrent import Concurrent_B_Tree
+from random import choices, sample, shuffle
+from sys import getsizeof
+from threading import Lock, Thread
+from time import perf_counter
+from timeit import timeit
+
+try:
+    from b_tree_numpy import Numpy_B_Tree
+except ImportError:
+    Numpy_B_Tree = None
+
+
+class Legacy_Node:
+    """
+    Node layout used before nodes had slots: a per-instance
+    dictionary holding keys, children and a rendering position.
+    """
+
+    def __init__(self, keys, children):
+        self.keys = keys
+        self.children = children
+        self.str_pos = None
+
+
+class Scanning_Node(Node):
+    """
+    Node looking keys up as nodes did before lookups went through
+    bisect: a binary search written in Python for search and a
+    linear scan for locate_successor.
+    """
+
+    __slots__ = ()
+
+    def new_node(self, keys, children, values=None):
+        return Scanning_Node(keys, children, values)
+
+
+    def search(self, key):
+        left = 0
+        right = self.num_keys()
+        while right > left:
+            mid = (left + right)//2
+            if self.keys[mid] >= key:
+                right = mid
+            else:
+                left = mid + 1
+        return left
+
+
+    def locate_successor(self, key):
+        index = 0
+        while index < self.num_keys() and self.keys[index] <= key:
+            index += 1
+        return index
+
+
+    def count_below(self, key, inclusive):
+        return self.locate_successor(key) if inclusive else self.search(key)
+
+
+def memory_footprint(tree):
+    """
+    Returns the number of bytes taken by the nodes of tree, their
+    key, value and children containers and the boxed keys, if any.
+    """
+    total = 0
+    for node in tree.breadth_first_search():
+        total += getsizeof(node) + getsizeof(node.keys) + getsizeof(node.children)
+        if node.values is not None:
+            total += getsizeof(node.values)
+        if isinstance(node.keys, list):
+            total += sum(getsizeof(key) for key in node.keys)
+        elif hasattr(node.keys, "data"):
+            total += getsizeof(node.keys.data)
+    return total
+
+
+def legacy_memory_footprint(tree):
+    """
+    Returns the number of bytes tree would take if its nodes were
+    Legacy_Node instances holding their keys in lists.
+    """
+    total = 0
+    for node in tree.breadth_first_search():
+        keys = list(node.keys)
+        legacy = Legacy_Node(keys, node.children)
+        total += getsizeof(legacy) + getsizeof(legacy.__dict__)
+        total += getsizeof(keys) + getsizeof(node.children)
+        total += sum(getsizeof(key) for key in keys)
+    return total
+
+
+def benchmark_memory(num_keys=100000, degrees=(2, 8, 32, 128)):
+    """
+    Prints the bytes per key taken by b-trees holding num_keys random
+    integers, for every degree, with legacy nodes, slotted nodes and
+    slotted nodes storing their keys in array('q').
+    """
+    keys = sample(range(1 << 40), num_keys)
+    print("Memory (bytes per key), {} keys".format(num_keys))
+    print("{:>8} {:>10} {:>10} {:>10}".format("degree", "legacy", "slots", "array(q)"))
+    for degree in degrees:
+        tree = B_Tree(degree)
+        tree.insert_many(keys)
+        typed = B_Tree(degree, "q")
+        typed.insert_many(keys)
+
+        print("{:>8} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            degree,
+            legacy_memory_footprint(tree)/num_keys,
+            memory_footprint(tree)/num_keys,
+            memory_footprint(typed)/num_keys))
+
+
+def benchmark_scans(num_keys=100000, degrees=(2, 8, 32, 128), repeat=5):
+    """
+    Prints the nanoseconds per key taken to iterate over b-trees and
+    b+-trees holding num_keys random integers, both fully and over a
+    range holding a tenth of the keys, for every degree.
+    """
+    keys = sample(range(1 << 40), num_keys)
+    (lo, hi) = sorted(keys)[num_keys//2 : num_keys//2 + num_keys//10 + 1 : num_keys//10]
+    print("Scans (ns per key), {} keys".format(num_keys))
+    print("{:>8} {:>10} {:>10} {:>10} {:>10}".format("degree", "inorder", "inorder+", "range", "range+"))
+    for degree in degrees:
+        times = []
+        for tree in (B_Tree.from_sorted(sorted(keys), degree), B_Plus_Tree.from_sorted(sorted(keys), degree)):
+            times.append(timeit(lambda: sum(1 for key in tree.inorder()), number=repeat)/repeat/num_keys)
+            times.append(timeit(lambda: sum(1 for key in tree.range(lo, hi)), number=repeat)/repeat/(num_keys//10))
+
+        print("{:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            degree, 1e9*times[0], 1e9*times[2], 1e9*times[1], 1e9*times[3]))
+
+
+def benchmark_lookups(num_keys=100000, degrees=(2, 8, 32, 128, 256, 1024), num_queries=20000):
+    """
+    Prints the microseconds per search and per successor query taken
+    by b-trees holding num_keys random integers, for every degree,
+    with nodes scanning their keys and with nodes using bisect.
+    """
+    keys = sample(range(1 << 40), num_keys)
+    queries = sample(range(1 << 40), num_queries)
+    print("Lookups (us per query), {} keys".format(num_keys))
+    print("{:>8} {:>10} {:>10} {:>10} {:>10}".format(
+        "degree", "search", "search+", "successor", "successor+"))
+    for degree in degrees:
+        times = []
+        scanning = B_Tree(degree)
+        scanning.root = Scanning_Node(scanning.new_keys(), [])
+        for tree in (scanning, B_Tree(degree)):
+            tree.insert_many(keys)
+            times.append(timeit(lambda: [tree.search(key) for key in queries], number=1)/num_queries)
+            times.append(timeit(lambda: [tree.successor(key) for key in queries], number=1)/num_queries)
+
+        print("{:>8} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}".format(
+            degree, 1e6*times[0], 1e6*times[2], 1e6*times[1], 1e6*times[3]))
+
+
+def benchmark_numpy(num_keys=100000, degrees=(8, 32, 128, 512), num_probes=20000):
+    """
+    Prints the bytes per key taken by b-trees holding num_keys random
+    integers, and the microseconds per key taken by search_many, for
+    every degree, with boxed keys and with keys in NumPy arrays.
+    Skipped if NumPy is not installed.
+    """
+    if Numpy_B_Tree is None:
+        print("NumPy not installed, skipping numpy benchmark\n")
+        return
+
+    keys = sample(range(1 << 40), num_keys)
+    probes = keys[:num_probes//2] + sample(range(1 << 40), num_probes//2)
+    print("NumPy keys, {} keys, {} probes".format(num_keys, num_probes))
+    print("{:>8} {:>10} {:>10} {:>12} {:>12}".format(
+        "degree", "bytes", "bytes+", "search_many", "search_many+"))
+    for degree in degrees:
+        row = []
+        for tree in (B_Tree(degree), Numpy_B_Tree(degree)):
+            tree.insert_many(keys)
+            row.append(memory_footprint(tree)/num_keys)
+            row.append(1e6*timeit(lambda: tree.search_many(probes), number=1)/num_probes)
+
+        print("{:>8} {:>10.1f} {:>10.1f} {:>12.2f} {:>12.2f}".format(
+            degree, row[0], row[2], row[1], row[3]))
+
+
+def benchmark_dump(num_keys=1000000, degree=64):
+    """
+    Prints the seconds taken to serialize and deserialize b-trees
+    holding num_keys random integers, boxed and with typecode 'q',
+    with pickle and with dump and load, and the bytes written.
+    """
+    keys = sorted(sample(range(1 << 40), num_keys))
+    print("Serialization, {} keys, degree {}".format(num_keys, degree))
+    print("{:>8} {:>10} {:>10} {:>10} {:>10} {:>12} {:>12}".format(
+        "keys", "pickle", "unpickle", "dump", "load", "pickle size", "dump size"))
+    for typecode in (None, "q"):
+        tree = B_Tree.from_sorted(keys, degree, typecode=typecode)
+        fileobj = BytesIO()
+        times = [timeit(lambda: pickle_dumps(tree), number=1)]
+        pickled = pickle_dumps(tree)
+        times.append(timeit(lambda: pickle_loads(pickled), number=1))
+        times.append(timeit(lambda: tree.dump(fileobj), number=1))
+        times.append(timeit(lambda: B_Tree.load(BytesIO(fileobj.getvalue())), number=1))
+
+        print("{:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>12} {:>12}".format(
+            typecode or "boxed", *times, len(pickled), len(fileobj.getvalue())))
+
+
+def benchmark_range_deletion(num_keys=200000, degree=32, widths=(100, 10000, 100000)):
+    """
+    Prints the seconds taken to delete windows of consecutive keys,
+    of the given widths, from a b-tree holding num_keys integers,
+    key by key with delete_many and at once with delete_range.
+    """
+    print("Range deletion, {} keys, degree {}".format(num_keys, degree))
+    print("{:>8} {:>12} {:>12}".format("width", "delete_many", "delete_range"))
+    for width in widths:
+        times = []
+        for delete in (lambda tree: tree.delete_many(range(width, 2*width)),
+                       lambda tree: tree.delete_range(width, 2*width)):
+            tree = B_Tree.from_sorted(range(num_keys), degree)
+            times.append(timeit(lambda: delete(tree), number=1))
+
+        print("{:>8} {:>12.4f} {:>12.4f}".format(width, *times))
+
+
+def benchmark_buffered(num_keys=200000, degrees=(2, 8, 32), num_searches=20000):
+    """
+    Prints the random insertions per second of a b-tree, a b+-tree
+    and a buffered b-tree of every degree, the seconds then taken to
+    flush the buffered b-tree, and the searches per second of each
+    b-tree while the buffered one still holds its pending messages.
+    """
+    print("Buffered insertions, {} random keys".format(num_keys))
+    print("{:>6} {:>15} {:>10} {:>10} {:>8}".format("degree", "kind", "inserts/s", "searches/s", "flush"))
+    keys = sample(range(1 << 40), num_keys)
+    probes = sample(keys, num_searches)
+    for degree in degrees:
+        for tree_class in (B_Tree, B_Plus_Tree, Buffered_B_Tree):
+            tree = tree_class(degree)
+            elapsed = timeit(lambda: [tree.insert(key) for key in keys], number=1)
+            searches = timeit(lambda: [tree.search(key) for key in probes], number=1)
+            flush = timeit(tree.flush, number=1) if tree_class is Buffered_B_Tree else 0
+            print("{:>6} {:>15} {:>10.0f} {:>10.0f} {:>8.4f}".format(
+                  degree, tree_class.__name__, num_keys/elapsed, num_searches/searches, flush))
+
+
+def fill_factor(tree):
+    """
+    Returns the average number of keys per node of tree
+    over the maximum number of keys a node may hold.
+    """
+    nodes = list(tree.breadth_first_search())
+    return sum(node.num_keys() for node in nodes)/(len(nodes)*tree.max_num_keys)
+
+
+def benchmark_redistribution(num_keys=200000, degrees=(2, 8, 32)):
+    """
+    Prints the fill factor, height and insertions per second of
+    b-trees of every degree filled by inserting num_keys sequential
+    or random keys one at a time, with and without redistribution.
+    """
+    print("Redistribution, {} keys".format(num_keys))
+    print("{:>10} {:>6} {:>12} {:>6} {:>6} {:>10}".format(
+          "keys", "degree", "redistribute", "fill", "height", "inserts/s"))
+    for distribution in ("sequential", "random"):
+        keys = generate_ranks(num_keys, distribution)
+        for degree in degrees:
+            for redistribute in (False, True):
+                tree = B_Tree(degree, redistribute=redistribute)
+                elapsed = timeit(lambda: [tree.insert(key) for key in keys], number=1)
+                print("{:>10} {:>6} {:>12} {:>6.2f} {:>6} {:>10.0f}".format(
+                      distribution, degree, str(redistribute), fill_factor(tree),
+                      tree.height(), num_keys/elapsed))
+
+
+def benchmark_appends(num_keys=200000, degrees=(2, 8, 32)):
+    """
+    Prints the insertions per second, fill factor and height of
+    b-trees of every degree filled with num_keys increasing keys,
+    appended to the rightmost leaf or, with appends disabled, each
+    inserted with a descent, and with num_keys random keys.
+    """
+    print("Appends, {} keys".format(num_keys))
+    print("{:>10} {:>6} {:>8} {:>6} {:>6} {:>10}".format(
+          "keys", "degree", "appends", "fill", "height", "inserts/s"))
+    for distribution in ("sequential", "random"):
+        keys = generate_ranks(num_keys, distribution)
+        for degree in degrees:
+            for appends in (True, False) if distribution == "sequential" else (True,):
+                tree = B_Tree(degree)
+                if not appends:
+                    tree.append = lambda key, value=None: False
+                elapsed = timeit(lambda: [tree.insert(key) for key in keys], number=1)
+                print("{:>10} {:>6} {:>8} {:>6.2f} {:>6} {:>10.0f}".format(
+                      distribution, degree, str(appends), fill_factor(tree),
+                      tree.height(), num_keys/elapsed))
+
+
+KEY_TYPES = {
+    "int": lambda rank: rank,
+    "str": lambda rank: "key-{:012d}".format(rank),
+    "tuple": lambda rank: (rank % 1000, rank),
+}
+
+
+def generate_ranks(num_keys, distribution, zipf_exponent=1.1):
+    """
+    Returns num_keys integer ranks drawn from the given distribution:
+    "sequential" (0, 1, 2, ...), "random" (distinct, shuffled) or
+    "zipfian" (a few ranks repeated often, most rarely).
+    """
+    if distribution == "sequential":
+        return list(range(num_keys))
+    if distribution == "random":
+        return sample(range(1 << 40), num_keys)
+
+    universe = sample(range(1 << 40), num_keys)
+    weights = [1/(rank + 1)**zipf_exponent for rank in range(num_keys)]
+    return choices(universe, weights, k=num_keys)
+
+
+def generate_workloads(keys, num_ranges=100):
+    """
+    Returns a dictionary mapping the name of every benchmarked
+    workload to its operations, in the format of run_workload.
+    Every workload but insert runs on a b-tree holding keys.
+    """
+    queries = keys[:]
+    shuffle(queries)
+    ordered = sorted(set(keys))
+    step = max(len(ordered)//num_ranges, 1)
+    ranges = [("range", ordered[index], ordered[min(index + step, len(ordered) - 1)])
+              for index in range(0, len(ordered), step)]
+    return {
+        "insert": [("insert", key) for key in keys],
+        "delete": [("delete", key) for key in queries],
+        "search": [("search", key) for key in queries],
+        "successor": [("successor", key) for key in queries],
+        "predecessor": [("predecessor", key) for key in queries],
+        "inorder": [("inorder",)],
+        "range": ranges,
+    }
+
+
+def benchmark_workloads(num_keys=20000, degrees=(2, 8, 32, 128, 512),
+                        key_types=("int", "str", "tuple"),
+                        distributions=("sequential", "random", "zipfian")):
+    """
+    Prints the microseconds per key taken by every workload of
+    generate_workloads, for every key type, key distribution and
+    degree, followed by the degree B_Tree.tuned picks for the
+    insertion of keys followed by a tenth of every workload.
+    """
+    for key_type in key_types:
+        for distribution in distributions:
+            keys = list(map(KEY_TYPES[key_type], generate_ranks(num_keys, distribution)))
+            workloads = generate_workloads(keys)
+            print("Workloads (us per key), {} {} {} keys".format(num_keys, distribution, key_type))
+            print("{:>8}".format("degree") + "".join("{:>12}".format(name) for name in workloads))
+            for degree in degrees:
+                times = []
+                for (name, workload) in workloads.items():
+                    tree = B_Tree(degree)
+                    if name != "insert":
+                        tree.insert_many(keys)
+                    start = perf_counter()
+                    tree.run_workload(workload)
+                    times.append((perf_counter() - start)/num_keys)
+
+                print("{:>8}".format(degree) + "".join("{:>12.2f}".format(1e6*time) for time in times))
+
+            sample_workload = workloads["insert"] + [operation for workload in workloads.values()
+                                                     for operation in workload[:num_keys//10]]
+            tree = B_Tree.tuned(sample_workload, degrees)
+            print("tuned degree: {}\n".format(tree.min_num_keys + 1))
+
+
+def read_throughput(search, keys, num_readers, num_writes, write):
+    """
+    Runs num_readers threads searching for keys next to a thread
+    performing num_writes writes, and returns the number of searches
+    per second completed by the readers.
+    """
+    def read():
+        for key in keys:
+            search(key)
+
+    readers = [Thread(target=read) for _ in range(num_readers)]
+    writer = Thread(target=lambda: [write(index) for index in range(num_writes)])
+    start = perf_counter()
+    for thread in readers + [writer]:
+        thread.start()
+    for thread in readers + [writer]:
+        thread.join()
+    return num_readers*len(keys)/(perf_counter() - start)
+
+
+def benchmark_concurrency(num_keys=100000, degree=32, num_searches=20000, readers=(1, 2, 4, 8)):
+    """
+    Prints the searches per second completed by growing numbers of
+    reader threads, while a writer keeps inserting keys, both on a
+    b-tree behind a global lock and on a concurrent b-tree.
+    """
+    keys = sample(range(1 << 40), num_keys)
+    searched = keys[:num_searches]
+    print("Concurrent reads (searches per second), {} keys, one writer".format(num_keys))
+    print("{:>8} {:>12} {:>12}".format("readers", "global lock", "latches"))
+    for num_readers in readers:
+        tree = B_Tree(degree)
+        tree.insert_many(keys)
+        lock = Lock()
+
+        def search(key):
+            with lock:
+                return tree.search(key)
+
+        def write(index):
+            with lock:
+                tree.insert(-index)
+
+        locked = read_throughput(search, searched, num_readers, num_searches, write)
+
+        concurrent = Concurrent_B_Tree(degree)
+        for key in sorted(keys):
+            concurrent.insert(key)
+        latched = read_throughput(concurrent.search, searched, num_readers, num_searches,
+                                  lambda index: concurrent.insert(-index))
+
+        print("{:>8} {:>12.0f} {:>12.0f}".format(num_readers, locked, latched))
+
+
+if __name__ == "__main__":
+    benchmark_memory()
+    benchmark_scans()
+    benchmark_lookups()
+    benchmark_numpy()
+    benchmark_dump()
+    benchmark_range_deletion()
+    benchmark_buffered()
+    benchmark_redistribution()
+    benchmark_appends()
+    benchmark_workloads()
+    benchmark_concurrency()
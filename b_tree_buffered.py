@@ -0,0 +1,476 @@
+from b_plus_tree import *
+from functools import wraps
+from itertools import islice
+
+
+class Buffered_Node(B_Plus_Node):
+    """
+    B+-Tree node carrying a buffer of pending messages.
+
+    The buffer maps keys to True, for a pending insertion, or to
+    False, for a pending deletion. Messages in a node are newer than
+    every message below it, so a node's buffer only keeps the newest
+    message for each key. Leaves never buffer messages.
+
+    Routing keys divide keys strictly: every key of the i-th child is
+    smaller than the i-th key, and every key of the (i+1)-th child is
+    at least the i-th key, so each key, and each of its messages, has
+    a single path. Structural operations move buffered messages along
+    with the keys they route.
+    """
+
+    __slots__ = ("buffer",)
+
+    def __init__(self, keys, children, values=None):
+        super().__init__(keys, children, values)
+        self.buffer = {}
+
+
+    def new_node(self, keys, children, values=None):
+        """
+        Returns a new buffered node containing the given keys,
+        children and values.
+        """
+        return Buffered_Node(keys, children, values)
+
+
+    def route(self, key):
+        """
+        Returns the index of the child that key belongs to.
+        """
+        return self.locate_successor(key)
+
+
+    def apply(self, messages):
+        """
+        Applies the given messages to the keys of self, a leaf.
+        """
+        keys = self.keys
+        for (key, insert) in messages.items():
+            index = self.search(key)
+            present = index < len(keys) and keys[index] == key
+            if insert and not present:
+                keys.insert(index, key)
+            elif present and not insert:
+                del keys[index]
+        self.size = len(keys)
+
+
+    def split_child(self, index):
+        """
+        Splits self's index-th child as B_Plus_Node.split_child does,
+        dividing the buffer of the child between both halves.
+        """
+        buffer = self.children[index].buffer
+        super().split_child(index)
+        (left, right) = self.children[index : index+2]
+        for (key, insert) in buffer.items():
+            (left if key < self.keys[index] else right).buffer[key] = insert
+
+
+    def merge_children(self, index):
+        """
+        Merges self's index-th child with its right sibling as
+        B_Plus_Node.merge_children does, joining their buffers, and
+        returns the merged node. Unlike there, self is kept even if
+        left without keys: it still has to be merged with a sibling
+        by its parent, or dropped by the b-tree if it is the root,
+        so that every leaf stays at the same depth.
+        """
+        (left, right) = self.children[index : index+2]
+        if left.is_leaf():
+            left.keys.extend(right.keys)
+            left.link(left.prev, right.next)
+        else:
+            left.keys.append(self.keys[index])
+            left.keys.extend(right.keys)
+            left.children.extend(right.children)
+            left.buffer.update(right.buffer)
+        left.size += right.size
+
+        del self.keys[index]
+        del self.children[index+1]
+        right.discard()
+        return left
+
+
+    def transfer_key_clockwise(self, index):
+        """
+        Moves a key or child from self's index-th child to the next
+        one as B_Plus_Node.transfer_key_clockwise does, moving the
+        messages routed to it as well.
+        """
+        super().transfer_key_clockwise(index)
+        self.move_messages(index)
+
+
+    def transfer_key_counter_clockwise(self, index):
+        """
+        Moves a key or child from self's (index+1)-th child to the
+        previous one as B_Plus_Node.transfer_key_counter_clockwise
+        does, moving the messages routed to it as well.
+        """
+        super().transfer_key_counter_clockwise(index)
+        self.move_messages(index)
+
+
+    def move_messages(self, index):
+        """
+        Moves the messages buffered in self's index-th child and its
+        right sibling to the one the index-th key of self routes them
+        to now.
+        """
+        (left, right) = self.children[index : index+2]
+        separator = self.keys[index]
+        for (source, target, moved) in ((left, right, lambda key: key >= separator),
+                                        (right, left, lambda key: key < separator)):
+            for key in [key for key in source.buffer if moved(key)]:
+                target.buffer[key] = source.buffer.pop(key)
+
+
+
+def flushing(method):
+    """
+    Wraps a method of a buffered b-tree so that every pending
+    message reaches the leaves before it runs.
+    """
+    @wraps(method)
+    def call(self, *args, **kwargs):
+        self.flush()
+        return method(self, *args, **kwargs)
+    return call
+
+
+
+class Buffered_B_Tree(B_Plus_Tree):
+    """
+    Write-optimized b+-tree (a B^epsilon-tree) of unique keys.
+
+    Insertions and deletions are appended, as messages, to the buffer
+    of the root and cost O(1) until the buffer holds more than
+    buffer_size messages. The buffer is then flushed: its messages are
+    handed down in a single batch to the children they are routed to,
+    whose own buffers are flushed in turn once full, and messages
+    reaching a leaf are applied to it. Nodes overfilled or underfilled
+    by a flush are split or merged by their parent afterwards. Every
+    message thus moves down one level per flush of a whole batch
+    instead of descending the tree on its own.
+
+    Keys are unique, as in a set: inserting a key already present,
+    or deleting a missing one, does nothing, which lets a buffer keep
+    only the newest message for each key. Search, predecessor,
+    successor, range and inorder read pending messages along the way,
+    so point reads check a buffer at every level. Order statistics,
+    cursors and every other query flush the whole tree first.
+    """
+
+    def __init__(self, degree, typecode=None, buffer_size=None):
+        """
+        Returns an empty buffered b-tree with the given degree, whose
+        nodes buffer up to buffer_size messages, 16*(2*degree - 1) if
+        none is given.
+        Note: Assumes degree > 1.
+        """
+        super().__init__(degree, typecode)
+        self.root = Buffered_Node(self.new_keys(), [])
+        self.buffer_size = buffer_size or 16*self.max_num_keys
+        self.pending = False
+
+
+    def new_tree(self):
+        """
+        Returns an empty buffered b-tree with the settings of the
+        b-tree, its buffer size included. See B_Tree.new_tree.
+        """
+        tree = super().new_tree()
+        tree.buffer_size = self.buffer_size
+        return tree
+
+
+    def insert(self, key):
+        """
+        Inserts key in the b-tree, unless it is already there.
+        """
+        self.send(key, True)
+
+
+    def delete(self, key):
+        """
+        Deletes key from the b-tree, if it is there.
+        """
+        self.send(key, False)
+
+
+    def insert_many(self, keys):
+        """
+        Inserts every key in keys in the b-tree.
+        """
+        for key in keys:
+            self.send(key, True)
+
+
+    def delete_many(self, keys):
+        """
+        Deletes every key in keys from the b-tree.
+        """
+        for key in keys:
+            self.send(key, False)
+
+
+    def send(self, key, insert):
+        """
+        Adds a message, inserting key if insert is set and deleting
+        it otherwise, to the buffer of the root, or applies it right
+        away if the root is a leaf. Flushes the root once its buffer
+        is full.
+        """
+        self.version += 1
+        root = self.root
+        if root.is_leaf():
+            root.apply({key: insert})
+        else:
+            root.buffer[key] = insert
+            self.pending = True
+            if len(root.buffer) <= self.buffer_size:
+                return
+            self.flush_node(root)
+        self.fix_root()
+
+
+    def flush(self):
+        """
+        Pushes every pending message down to the leaves.
+        """
+        if self.pending:
+            self.version += 1
+            self.flush_tree(self.root)
+            self.fix_root()
+            self.pending = False
+
+
+    def flush_tree(self, node):
+        """
+        Pushes every message pending in node's sub-tree down to the
+        leaves, leaving the children of node valid.
+        """
+        if node.is_leaf():
+            return
+        if node.buffer:
+            self.flush_node(node)
+        for child in node.children[:]:
+            self.flush_tree(child)
+        self.fix_children(node)
+        node.compute_size()
+
+
+    def flush_node(self, node):
+        """
+        Hands the messages buffered in node down to its children in a
+        single batch. Leaves apply them and internal children buffer
+        them, flushing their own buffers once full. The children of
+        node are then split or merged as needed.
+        """
+        batches = {}
+        for (key, insert) in node.buffer.items():
+            batches.setdefault(node.route(key), {})[key] = insert
+        node.buffer = {}
+
+        for (index, batch) in batches.items():
+            child = node.children[index]
+            if child.is_leaf():
+                child.apply(batch)
+            else:
+                child.buffer.update(batch)
+                if len(child.buffer) > self.buffer_size:
+                    self.flush_node(child)
+
+        self.fix_children(node)
+        node.compute_size()
+
+
+    def fix_children(self, node):
+        """
+        Splits the children of node holding more than 2*degree - 1
+        keys and merges those holding fewer than degree - 1 keys with
+        a sibling, splitting the merged node again if it overflows.
+        Merged internal nodes have their own children fixed, since
+        one of them may have been left alone and underfull.
+        """
+        index = 0
+        while index < node.num_children():
+            child = node.children[index]
+            if child.num_keys() > self.max_num_keys:
+                node.split_child(index)
+
+            elif child.num_keys() < self.min_num_keys and node.num_children() > 1:
+                index = max(index - 1, 0)
+                merged = node.merge_children(index)
+                if not merged.is_leaf():
+                    self.fix_children(merged)
+
+            else:
+                index += 1
+
+
+    def fix_root(self):
+        """
+        Grows the b-tree while its root overflows and shrinks it
+        while its root is an internal node without keys.
+        """
+        while self.root.num_keys() > self.max_num_keys:
+            self.root = self.root.new_node(self.new_keys(), [self.root])
+            self.fix_children(self.root)
+
+        while not self.root.is_leaf() and self.root.num_keys() == 0:
+            self.root = self.root.children[0]
+
+
+    def search(self, key):
+        """
+        Searches for key in the b-tree, reading the buffers along its
+        path without flushing them. Returns a location pair (leaf,
+        index) if key is stored in a leaf, (node, None) if it is
+        pending insertion in the buffer of node, and None if it is
+        not in the b-tree. The newest message for key, the one found
+        first on the way down, decides.
+        """
+        node = self.root
+        while not node.is_leaf():
+            insert = node.buffer.get(key)
+            if insert is not None:
+                return (node, None) if insert else None
+            node = node.children[node.route(key)]
+
+        index = node.search(key)
+        return (node, index) if node.contains_key_at(key, index) else None
+
+
+    def predecessor(self, key):
+        """
+        Returns the predecessor of key in the b-tree if
+        a predecessor exists and None otherwise.
+        """
+        return next(self.generate_range_backward(None, key, (True, False)), None)
+
+
+    def successor(self, key):
+        """
+        Returns the successor of key in the b-tree if
+        a successor exists and None otherwise.
+        """
+        return next(self.generate_range_forward(key, None, (False, True)), None)
+
+
+    def inorder(self):
+        """
+        Generates the keys of the b-tree in increasing order.
+        """
+        yield from self.generate_range_forward(None, None, (True, True))
+
+
+    def generate_range_forward(self, lo, hi, inclusive):
+        """
+        Generates the keys of range(lo, hi, inclusive) in
+        increasing order. See generate_pending_range.
+        """
+        return self.generate_pending_range(self.root, {}, lo, hi, inclusive, False)
+
+
+    def generate_range_backward(self, lo, hi, inclusive):
+        """
+        Generates the keys of range(lo, hi, inclusive) in
+        decreasing order. See generate_pending_range.
+        """
+        return self.generate_pending_range(self.root, {}, lo, hi, inclusive, True)
+
+
+    def generate_pending_range(self, node, pending, lo, hi, inclusive, reverse):
+        """
+        Generates the keys of range(lo, hi, inclusive) in node's sub-tree,
+        in increasing order or, if reverse is set, in decreasing order,
+        once the messages buffered on the way are applied, pending being
+        those of the ancestors of node.
+
+        The messages in range are handed down to the children whose
+        keys may fall in range, and applied to the keys of the leaves
+        reached, so the keys generated first only cost a descent.
+        """
+        (lo_inclusive, hi_inclusive) = inclusive
+        in_range = lambda key: (lo is None or lo < key or (lo_inclusive and key == lo)) and \
+                               (hi is None or key < hi or (hi_inclusive and key == hi))
+        messages = {key: insert for (key, insert) in node.buffer.items() if in_range(key)}
+        messages.update(pending)
+
+        if node.is_leaf():
+            keys = {key for key in node.keys if in_range(key) and messages.get(key, True)}
+            keys.update(key for (key, insert) in messages.items() if insert)
+            yield from sorted(keys, reverse=reverse)
+            return
+
+        batches = {}
+        for (key, insert) in messages.items():
+            batches.setdefault(node.route(key), {})[key] = insert
+
+        first = 0 if lo is None else node.route(lo)
+        last = node.num_keys() if hi is None else node.route(hi)
+        indices = range(last, first - 1, -1) if reverse else range(first, last + 1)
+        for index in indices:
+            yield from self.generate_pending_range(node.children[index], batches.get(index, {}),
+                                                   lo, hi, inclusive, reverse)
+
+
+    def pop_edge(self, count, side):
+        """
+        Removes up to count keys from the left edge of the b-tree, if
+        side is 0, or from its right edge, if side is -1, and returns
+        them in the order they were removed. The keys are read with
+        their pending messages applied and deleted through messages.
+        """
+        keys = list(islice(self.range(reverse=(side == -1)), count))
+        self.delete_many(keys)
+        return keys
+
+
+    def union(self, other):
+        """
+        Returns a new buffered b-tree holding the keys held by
+        either b-tree, each once. See B_Tree.merge.
+        """
+        return self.merge(other, lambda mine, theirs: (mine or theirs)[:1])
+
+
+    def cursor(self):
+        """
+        Returns a cursor over the b-tree. See Buffered_Cursor.
+        """
+        return Buffered_Cursor(self)
+
+
+    count_below = flushing(B_Plus_Tree.count_below)
+    select = flushing(B_Plus_Tree.select)
+    count_range = flushing(B_Plus_Tree.count_range)
+    min = flushing(B_Plus_Tree.min)
+    max = flushing(B_Plus_Tree.max)
+    pop_min = flushing(B_Plus_Tree.pop_min)
+    pop_max = flushing(B_Plus_Tree.pop_max)
+    breadth_first_search = flushing(B_Plus_Tree.breadth_first_search)
+    depth_first_search = flushing(B_Plus_Tree.depth_first_search)
+    dump = flushing(B_Plus_Tree.dump)
+    __len__ = flushing(B_Plus_Tree.__len__)
+    __str__ = flushing(B_Plus_Tree.__str__)
+
+
+
+class Buffered_Cursor(B_Plus_Cursor):
+    """
+    Cursor over a buffered b-tree, which flushes the b-tree
+    before locating a key, so that it walks up to date leaves.
+    """
+
+    def locate(self, key):
+        """
+        Flushes the b-tree and sets the path to the first key
+        not smaller than key, or to the smallest key if key is None.
+        """
+        self.tree.flush()
+        super().locate(key)
@@ -0,0 +1,199 @@
+from b_tree_buffered import *
+from b_plus_tree_tester import B_Plus_Tree_Tester
+from random import choice, randint, sample
+
+
+class B_Tree_Buffered_Tester(B_Plus_Tree_Tester):
+
+    tree_class = Buffered_B_Tree
+
+    def perform_tests(self):
+        key_range = 10*self.num_ops
+        universe = set(range(-key_range, key_range + 1))
+        keys = sample(sorted(universe), self.num_ops)
+        existent = set(keys)
+        nonexistent = sample(sorted(universe.difference(existent)), self.num_ops)
+        sorted_keys = sorted(existent)
+
+        if not self.test_pending_messages(keys, nonexistent):
+            return False
+
+        if not self.test_insert(keys):
+            return False
+
+        self.T.flush()
+
+        if not self.test_search(existent, nonexistent):
+            return False
+
+        if not self.test_predecessor(sorted_keys):
+            return False
+
+        if not self.test_successor(sorted_keys):
+            return False
+
+        if not self.test_range(sorted_keys):
+            return False
+
+        if not self.test_order_statistics(sorted_keys):
+            return False
+
+        if not self.test_cursor(keys, nonexistent):
+            return False
+
+        if not self.test_delete(keys, nonexistent):
+            return False
+
+        if not self.test_from_sorted(sorted_keys):
+            return False
+
+        if not self.test_batched_updates(keys, nonexistent):
+            return False
+
+        if not self.test_snapshot(keys, nonexistent):
+            return False
+
+        if not self.test_dump(keys):
+            return False
+
+        if not self.test_set_operations(keys, nonexistent):
+            return False
+
+        if not self.test_pops(keys):
+            return False
+
+        if not self.test_delete_range(keys):
+            return False
+
+
+    def test_pending_messages(self, keys, nonexistent):
+        print("Testing queries over pending messages...")
+        tree = self.T
+        self.T = self.tree_class(self.t, buffer_size=randint(1, 4*self.t))
+        valid_keys = set()
+        probes = keys + nonexistent
+
+        for (step, key) in enumerate(probes + sample(probes, len(probes))):
+            if randint(0, 2):
+                self.T.insert(key)
+                valid_keys.add(key)
+            else:
+                self.T.delete(key)
+                valid_keys.discard(key)
+
+            if step % 10:
+                continue
+
+            probe = choice(probes)
+            lower = [other for other in valid_keys if other < probe]
+            upper = [other for other in valid_keys if other > probe]
+            version = self.T.version
+            location = self.T.search(probe)
+            if self.T.version != version:
+                print("\tTree changed by a search")
+                self.T = tree
+                return False
+
+            if location is None:
+                found = False
+            elif location[1] is None:
+                found = location[0].buffer.get(probe) is True
+            else:
+                found = location[0].keys[location[1]] == probe
+            if found != (probe in valid_keys):
+                print("\tIncorrect search")
+                self.T = tree
+                return False
+
+            if self.T.predecessor(probe) != max(lower, default=None) \
+                    or self.T.successor(probe) != min(upper, default=None):
+                print("\tIncorrect predecessor or successor")
+                self.T = tree
+                return False
+
+            (lo, hi) = sorted((probe, choice(probes)))
+            valid_range = sorted(key for key in valid_keys if lo < key <= hi)
+            if list(self.T.range(lo, hi, (False, True))) != valid_range \
+                    or list(self.T.range(lo, hi, (False, True), reverse=True)) != valid_range[::-1]:
+                print("\tIncorrect range")
+                self.T = tree
+                return False
+
+            if list(self.T.inorder()) != sorted(valid_keys) or not self.check():
+                print("\tIncorrect keys")
+                self.T = tree
+                return False
+
+        if len(self.T) != len(valid_keys) or self.T.pending or not self.check() \
+                or any(node.buffer for node in self.T.depth_first_search()):
+            print("\tIncorrect flush")
+            self.T = tree
+            return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_set_operations(self, keys, nonexistent):
+        print("Testing set operations...")
+        tree = self.T
+        others = keys[::2] + nonexistent
+        left = self.tree_class.from_sorted(sorted(keys), self.t)
+        right = self.tree_class.from_sorted(sorted(others), self.t)
+        (mine, theirs) = (set(keys), set(others))
+        expected = [(left.union(right), mine | theirs),
+                    (left.intersection(right), mine & theirs),
+                    (left.difference(right), mine - theirs),
+                    (right.difference(left), theirs - mine)]
+
+        for (self.T, valid_keys) in expected:
+            if not self.check():
+                self.T = tree
+                return False
+
+            if list(self.T.inorder()) != sorted(valid_keys):
+                print("\tIncorrect keys after a set operation")
+                self.T = tree
+                return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def check(self):
+        is_valid = super().check()
+
+        if not self.valid_buffers(self.T.root, None, None):
+            print("A message is buffered outside the keys of its node")
+            is_valid = False
+
+        return is_valid
+
+
+    def valid_key_children_ordering(self, node):
+        return all(key > child.deep_max() for (key, child) in zip(node.keys, node.children)) \
+               and all(key <= child.deep_min() for (key, child) in zip(node.keys, node.children[1:]))
+
+
+    def valid_buffers(self, node, lo, hi):
+        if node.is_leaf():
+            return not node.buffer
+
+        bounds = [lo] + list(node.keys) + [hi]
+        return all((lo is None or key >= lo) and (hi is None or key < hi) for key in node.buffer) \
+               and all(self.valid_buffers(child, bounds[index], bounds[index+1])
+                       for (index, child) in enumerate(node.children))
+
+
+    def valid_leaf_chain(self):
+        leaves = list(self.T.generate_leaves())
+        chain = []
+        leaf = self.T.first_leaf()
+        while leaf:
+            chain.append(leaf)
+            leaf = leaf.next
+
+        return chain == leaves and leaves[0].prev is None \
+               and all(leaf.prev is previous for (previous, leaf) in zip(leaves, leaves[1:]))
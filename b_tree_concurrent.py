@@ -0,0 +1,595 @@
+from b_tree import *
+from threading import Condition
+
+
+class Latch:
+    """
+    Reader/writer latch: held either by any number of readers or by
+    a single writer. Readers wait while a writer is waiting, so that
+    a steady flow of readers cannot starve writers.
+    """
+
+    def __init__(self):
+        self.condition = Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+
+    def release_write(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+
+
+class Latched_Node(Node):
+    """
+    B-Tree node carrying a reader/writer latch.
+    """
+
+    __slots__ = ("latch",)
+
+    def __init__(self, keys, children, values=None):
+        super().__init__(keys, children, values)
+        self.latch = Latch()
+
+
+    def new_node(self, keys, children, values=None):
+        """
+        Returns a new latched node containing the given keys,
+        children and values.
+        """
+        return Latched_Node(keys, children, values)
+
+
+
+class Concurrent_B_Tree(B_Tree):
+    """
+    B-Tree that may be searched and updated from several threads.
+
+    Every node carries a reader/writer latch, and operations latch
+    nodes from the root down while crabbing: a child is latched
+    before its parent is released. Since insert splits full children
+    and delete grows minimal ones before descending into them, a
+    child is always safe by the time it is entered, so every
+    operation holds at most a node, its child and, while growing
+    the child, its siblings. A latch on the tree itself guards the
+    root pointer, which only changes when the root is split.
+
+    Searches, predecessor, successor and the order statistics run
+    under read latches. Traversals, ranges and cursors do not latch
+    nodes and must not run concurrently with updates, but they may
+    run on a snapshot instead.
+    """
+
+    def __init__(self, degree, typecode=None):
+        """
+        Returns an empty concurrent b-tree with the given degree.
+        Note: Assumes degree > 1.
+        """
+        super().__init__(degree, typecode)
+        self.root = Latched_Node(self.new_keys(), [])
+        self.latch = Latch()
+        self.quiescent = Condition()
+        self.num_updates = 0
+
+
+    def latch_root(self, write=False):
+        """
+        Latches the root for reading, or for writing if write is set,
+        and returns it.
+        """
+        self.latch.acquire_read()
+        root = self.root
+        if write:
+            root.latch.acquire_write()
+        else:
+            root.latch.acquire_read()
+        self.latch.release_read()
+        return root
+
+
+    def read_child(self, node, index):
+        """
+        Read-latches node's index-th child, releases node and
+        returns the child.
+        """
+        child = node.children[index]
+        child.latch.acquire_read()
+        node.latch.release_read()
+        return child
+
+
+    def search(self, key):
+        """
+        Searches for the given key in the b-tree. Returns
+        a location pair (node, index), if the given key is
+        found, and None otherwise.
+        """
+        node = self.latch_root()
+        index = node.search(key)
+        while not node.contains_key_at(key, index) and not node.is_leaf():
+            node = self.read_child(node, index)
+            index = node.search(key)
+
+        found = node.contains_key_at(key, index)
+        node.latch.release_read()
+        return (node, index) if found else None
+
+
+    def search_many(self, keys):
+        """
+        Searches for every key in keys. Returns a list holding, for
+        each key in the given order, the location pair that search
+        would return or None if the key is not found.
+        """
+        return [self.search(key) for key in keys]
+
+
+    def predecessor(self, key):
+        """
+        Returns the predecessor of key in the b-tree if
+        a predecessor exists and None otherwise.
+        """
+        node = self.latch_root()
+        predecessor = None
+        while True:
+            index = node.locate_predecessor(key)
+            if index >= 0:
+                predecessor = node.keys[index]
+            if node.is_leaf():
+                node.latch.release_read()
+                return predecessor
+            node = self.read_child(node, index+1)
+
+
+    def successor(self, key):
+        """
+        Returns the successor of key in the b-tree if
+        a successor exists and None otherwise.
+        """
+        node = self.latch_root()
+        successor = None
+        while True:
+            index = node.locate_successor(key)
+            if index < node.num_keys():
+                successor = node.keys[index]
+            if node.is_leaf():
+                node.latch.release_read()
+                return successor
+            node = self.read_child(node, index)
+
+
+    def count_below(self, key, inclusive):
+        """
+        Returns the number of keys in the b-tree that are smaller
+        than key or, if inclusive is set, not larger than key.
+        """
+        count = 0
+        node = self.latch_root()
+        while True:
+            index = node.count_below(key, inclusive)
+            count += index
+            if node.is_leaf():
+                node.latch.release_read()
+                return count
+
+            for child in node.children[:index]:
+                count += child.size
+            node = self.read_child(node, index)
+
+
+    def select(self, index):
+        """
+        Returns the index-th smallest key in the b-tree, counting
+        from 0. Negative indices count from the largest key, as
+        for lists. Raises IndexError if index is out of range.
+        """
+        node = self.latch_root()
+        if index < 0:
+            index += node.size
+        if not 0 <= index < node.size:
+            node.latch.release_read()
+            raise IndexError("b-tree index out of range")
+
+        while not node.is_leaf():
+            for (position, child) in enumerate(node.children):
+                if index < child.size:
+                    break
+
+                index -= child.size
+                if index == 0:
+                    key = node.keys[position]
+                    node.latch.release_read()
+                    return key
+                index -= 1
+
+            node = self.read_child(node, position)
+
+        key = node.keys[index]
+        node.latch.release_read()
+        return key
+
+
+    def min(self):
+        """
+        Returns the smallest key in the b-tree, or None if the
+        b-tree is empty. Edge leaves are not cached, since other
+        threads may be updating them.
+        """
+        try:
+            return self.select(0)
+        except IndexError:
+            return None
+
+
+    def max(self):
+        """
+        Returns the largest key in the b-tree, or None if the
+        b-tree is empty. See min.
+        """
+        try:
+            return self.select(-1)
+        except IndexError:
+            return None
+
+
+    def delete_range(self, lo=None, hi=None, inclusive=(True, False)):
+        """
+        Deletes the keys that range(lo, hi, inclusive) generates, one
+        at a time under latches, and returns how many were deleted.
+        Each key is found again by rank, so keys inserted into the
+        range meanwhile may be deleted as well.
+        """
+        (lo_inclusive, hi_inclusive) = inclusive
+        num_deleted = 0
+        while True:
+            index = 0 if lo is None else self.count_below(lo, not lo_inclusive)
+            try:
+                key = self.select(index)
+            except IndexError:
+                return num_deleted
+
+            if hi is not None and (hi < key or (key == hi and not hi_inclusive)):
+                return num_deleted
+            self.delete(key)
+            num_deleted += 1
+
+
+    def pop_edge(self, count, side):
+        """
+        Removes up to count keys from the left edge of the b-tree, if
+        side is 0, or from its right edge, if side is -1, as
+        B_Tree.pop_edge does, but one key at a time, so that every
+        pass knows the sizes to update on entering each node. See
+        pop_edge_key.
+        """
+        popped = []
+        while len(popped) < count:
+            item = self.pop_edge_key(side)
+            if item is None:
+                break
+            popped.append(item)
+        return popped
+
+
+    def pop_edge_key(self, side):
+        """
+        Removes the key at the given edge of the b-tree and returns
+        it, or its (key, value) pair in maps, or None if the b-tree
+        is empty. The spine is descended as delete descends a path,
+        crabbing write latches and growing minimal children first.
+        """
+        self.latch.acquire_write()
+        node = self.own_root()
+        node.latch.acquire_write()
+        if not node.size:
+            node.latch.release_write()
+            self.latch.release_write()
+            return None
+        self.version += 1
+        self.begin_update()
+
+        release = self.latch.release_write
+        while not node.is_leaf():
+            node.size -= 1
+            if release:
+                release()
+
+            index = 0 if side == 0 else node.num_keys()
+            child = node.own_child(index, self.owner)
+            child.latch.acquire_write()
+            latched = [child]
+            if child.num_keys() <= self.min_num_keys:
+                latched.append(node.own_child(1 if side == 0 else index-1, self.owner))
+                latched[1].latch.acquire_write()
+                child = node.grow_child(index, self.min_num_keys, self.owner)
+
+            for latched_node in latched:
+                if latched_node is not child:
+                    latched_node.latch.release_write()
+
+            release = node.latch.release_write if child is not node else None
+            node = child
+
+        item = node.keys[side]
+        if node.values is not None:
+            item = (item, node.values[side])
+            del node.values[side]
+        del node.keys[side]
+        node.size -= 1
+        node.latch.release_write()
+        if release:
+            release()
+        self.end_update()
+        return item
+
+
+    def insert(self, key, value=None):
+        """
+        Inserts key in the b-tree, attaching value to it
+        if the b-tree stores values.
+
+        Sizes are updated on entering each node, while its parent is
+        still latched, and leaves are updated before their parent is
+        released, so a node whose latch is free always counts every
+        update running below it. Splits and transfers rely on it to
+        compute the sizes of the nodes they build.
+        """
+        self.latch.acquire_write()
+        node = self.own_root()
+        node.latch.acquire_write()
+        if node.num_keys() == self.max_num_keys:
+            self.grow_root()
+            node.latch.release_write()
+            node = self.root
+            node.latch.acquire_write()
+        self.version += 1
+        self.begin_update()
+
+        release = self.latch.release_write
+        while not node.is_leaf():
+            node.size += 1
+            release()
+
+            index = node.search(key)
+            child = node.own_child(index, self.owner)
+            child.latch.acquire_write()
+            if child.num_keys() == self.max_num_keys:
+                node.split_child(index)
+                child.latch.release_write()
+
+                if node.keys[index] < key:
+                    index += 1
+                child = node.children[index]
+                child.latch.acquire_write()
+
+            release = node.latch.release_write
+            node = child
+
+        node.insert(key, value)
+        node.latch.release_write()
+        release()
+        self.end_update()
+
+
+    def delete(self, key):
+        """
+        Deletes key from the b-tree. Sizes are updated as in insert,
+        so a delete that does not find key must restore them, which
+        is expensive; absent keys are filtered out by a search first.
+        """
+        if self.search(key) is None:
+            return
+
+        self.latch.acquire_write()
+        node = self.own_root()
+        node.latch.acquire_write()
+        self.version += 1
+        self.begin_update()
+
+        release = self.latch.release_write
+        decremented = False
+        while not node.is_leaf():
+            node.size -= 1
+            decremented = True
+            if release:
+                release()
+
+            index = node.search(key)
+            if node.contains_key_at(key, index):
+                left = node.own_child(index, self.owner)
+                right = node.own_child(index+1, self.owner)
+                latched = [left, right]
+                for sibling in latched:
+                    sibling.latch.acquire_write()
+
+                if left.num_keys() > self.min_num_keys:
+                    key = self.replace_with_deep_predecessor(node, index)
+                    child = left
+
+                elif right.num_keys() > self.min_num_keys:
+                    key = self.replace_with_deep_successor(node, index)
+                    child = right
+
+                else:
+                    child = node.merge_children(index)
+
+            else:
+                child = node.own_child(index, self.owner)
+                child.latch.acquire_write()
+                latched = [child]
+                if child.num_keys() <= self.min_num_keys:
+                    if index > 0:
+                        latched.append(node.own_child(index-1, self.owner))
+                    if index < node.num_keys():
+                        latched.append(node.own_child(index+1, self.owner))
+                    for sibling in latched[1:]:
+                        sibling.latch.acquire_write()
+                    child = node.grow_child(index, self.min_num_keys, self.owner)
+
+            for latched_node in latched:
+                if latched_node is not child:
+                    latched_node.latch.release_write()
+
+            release = node.latch.release_write if child is not node else None
+            node = child
+
+        deleted = node.delete(key)
+        node.latch.release_write()
+        if release:
+            release()
+        self.end_update()
+        if not deleted and decremented:
+            self.restore_sizes(key)
+
+
+    def replace_with_deep_predecessor(self, node, index):
+        """
+        Replaces node's index-th key, together with its value, by the
+        key that precedes it in node's sub-tree and returns that key.
+        The index-th child must be write-latched already; its
+        descendants are read-latched on the way down.
+        """
+        leaf = self.latch_deep_leaf(node.children[index], -1)
+        node.keys[index] = leaf.keys[-1]
+        if node.values is not None:
+            node.values[index] = leaf.values[-1]
+        if leaf is not node.children[index]:
+            leaf.latch.release_read()
+        return node.keys[index]
+
+
+    def replace_with_deep_successor(self, node, index):
+        """
+        Replaces node's index-th key, together with its value, by the
+        key that succeeds it in node's sub-tree and returns that key.
+        See replace_with_deep_predecessor.
+        """
+        leaf = self.latch_deep_leaf(node.children[index+1], 0)
+        node.keys[index] = leaf.keys[0]
+        if node.values is not None:
+            node.values[index] = leaf.values[0]
+        if leaf is not node.children[index+1]:
+            leaf.latch.release_read()
+        return node.keys[index]
+
+
+    def latch_deep_leaf(self, node, side):
+        """
+        Read-latches the path from the write-latched node to its
+        leftmost leaf, if side is 0, or to its rightmost one, if side
+        is -1, and returns that leaf, leaving it latched.
+        """
+        top = node
+        while not node.is_leaf():
+            child = node.children[side]
+            child.latch.acquire_read()
+            if node is not top:
+                node.latch.release_read()
+            node = child
+        return node
+
+
+    def snapshot(self):
+        """
+        Returns a snapshot of the b-tree, as B_Tree.snapshot does.
+
+        Updates only copy nodes before latching them, so the nodes
+        a snapshot shares are never latched for writing, and it may
+        be read without latching anything. The snapshot is taken
+        once the updates running in the b-tree are over.
+        """
+        self.latch.acquire_write()
+        with self.quiescent:
+            while self.num_updates:
+                self.quiescent.wait()
+
+        snapshot = super().snapshot()
+        snapshot.latch = Latch()
+        snapshot.quiescent = Condition()
+        self.latch.release_write()
+        return snapshot
+
+
+    def begin_update(self):
+        """
+        Records that an update entered the b-tree.
+        """
+        with self.quiescent:
+            self.num_updates += 1
+
+
+    def end_update(self):
+        """
+        Records that an update left the b-tree.
+        """
+        with self.quiescent:
+            self.num_updates -= 1
+            if not self.num_updates:
+                self.quiescent.notify_all()
+
+
+    def restore_sizes(self, key):
+        """
+        Fixes the sizes left short by a delete that did not find key,
+        which happens only if another thread deleted key in between.
+
+        Splits recompute sizes from the children they move, so the
+        missing count may have moved up the path of key. Hence, once
+        the updates running in the b-tree are over, and while no other
+        update can start, the sizes along that path are recomputed.
+        """
+        self.latch.acquire_write()
+        with self.quiescent:
+            while self.num_updates:
+                self.quiescent.wait()
+
+        path = []
+        node = self.own_root()
+        while not node.is_leaf():
+            path.append(node)
+            node = node.own_child(node.search(key), self.owner)
+        for node in reversed(path):
+            node.compute_size()
+        self.latch.release_write()
+
+
+    def insert_many(self, keys):
+        """
+        Inserts every key in keys in the b-tree, one at a time.
+        """
+        for key in sorted(keys):
+            self.insert(key)
+
+
+    def delete_many(self, keys):
+        """
+        Deletes every key in keys from the b-tree, one at a time.
+        """
+        for key in sorted(keys):
+            self.delete(key)
@@ -0,0 +1,63 @@
+from b_tree_concurrent import *
+from b_tree_tester import B_Tree_Tester
+from random import randint, shuffle
+from threading import Thread
+
+
+class B_Tree_Concurrent_Tester(B_Tree_Tester):
+
+    tree_class = Concurrent_B_Tree
+
+    def perform_tests(self):
+        if super().perform_tests() is False:
+            return False
+
+        if not self.test_threads():
+            return False
+
+
+    def test_threads(self, num_threads=4):
+        print("Testing concurrent updates...")
+        self.T = Concurrent_B_Tree(self.t)
+        key_range = 10*self.num_ops
+        kept = [[randint(-key_range, key_range) for _ in range(self.num_ops)]
+                for _ in range(num_threads)]
+        dropped = [[randint(-key_range, key_range) for _ in range(self.num_ops)]
+                   for _ in range(num_threads)]
+        failures = []
+
+        def write(kept, dropped):
+            for key in kept + dropped:
+                self.T.insert(key)
+            shuffle(dropped)
+            for key in dropped:
+                self.T.delete(key)
+
+        def read(keys):
+            for key in keys:
+                predecessor = self.T.predecessor(key)
+                successor = self.T.successor(key)
+                if predecessor is not None and predecessor >= key \
+                        or successor is not None and successor <= key:
+                    failures.append(key)
+
+        threads = [Thread(target=write, args=arguments) for arguments in zip(kept, dropped)]
+        threads += [Thread(target=read, args=(keys,)) for keys in kept]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if failures:
+            print("\tIncorrect concurrent reads")
+            return False
+
+        if not self.check():
+            return False
+
+        if list(self.T.inorder()) != sorted(key for keys in kept for key in keys):
+            print("\tIncorrect keys after concurrent updates")
+            return False
+
+        print("\tCorrect\n")
+        return True
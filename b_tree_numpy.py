@@ -0,0 +1,307 @@
+from b_tree import *
+from numbers import Real
+from operator import index as as_integer
+import numpy as np
+
+
+def convert_key(dtype, key):
+    """
+    Returns key as a Python number that the given NumPy dtype holds
+    exactly. Raises TypeError if converting key to the dtype would
+    change its value, as 1.5 for an integer dtype, and OverflowError
+    if key is out of the range of the dtype.
+    """
+    if dtype.kind in "iu":
+        key = as_integer(key)
+        info = np.iinfo(dtype)
+        if not info.min <= key <= info.max:
+            raise OverflowError("key {} out of range for {}".format(key, dtype))
+        return key
+
+    if not isinstance(key, Real):
+        raise TypeError("must be real number, not {}".format(type(key).__name__))
+    value = float(key)
+    if float(np.finfo(dtype).max) < abs(value) < float("inf"):
+        raise OverflowError("key {} out of range for {}".format(key, dtype))
+    if float(dtype.type(value)) != key and key == key:
+        raise TypeError("key {} cannot be held exactly by {}".format(key, dtype))
+    return value
+
+
+class Key_Array:
+    """
+    Sequence of numeric keys kept unboxed in a NumPy array.
+
+    Key arrays support the part of the list interface b-tree nodes
+    use, so the tree algorithms run on them unchanged, while lookups
+    go through np.searchsorted. The underlying array keeps spare room
+    at its end and doubles when full, so insertions shift keys within
+    it instead of reallocating it, and slices are array copies.
+    """
+
+    __slots__ = ("data", "length")
+
+    def __init__(self, dtype, keys=()):
+        """
+        Returns a key array of the given NumPy dtype holding keys.
+        See convert_key.
+        """
+        dtype = np.dtype(dtype)
+        if isinstance(keys, Key_Array):
+            keys = keys.view()
+        elif not isinstance(keys, np.ndarray):
+            keys = [convert_key(dtype, key) for key in keys]
+        self.data = np.array(keys, dtype)
+        self.length = len(self.data)
+
+
+    def view(self):
+        """
+        Returns a NumPy view of the keys in self.
+        """
+        return self.data[:self.length]
+
+
+    def searchsorted(self, key, side="left"):
+        """
+        Returns the index at which key would be inserted in self
+        to keep it sorted: before any equal key if side is "left",
+        after them if side is "right".
+        """
+        return int(np.searchsorted(self.view(), key, side))
+
+
+    def reserve(self, length):
+        """
+        Makes room in self's array for at least length keys.
+        """
+        if length > len(self.data):
+            data = np.empty(max(length, 2*len(self.data), 4), self.data.dtype)
+            data[:self.length] = self.view()
+            self.data = data
+
+
+    def insert(self, index, key):
+        """
+        Inserts key before the index-th key of self.
+        See convert_key.
+        """
+        key = convert_key(self.data.dtype, key)
+        index = min(index + self.length if index < 0 else index, self.length)
+        self.reserve(self.length + 1)
+        self.data[index+1 : self.length+1] = self.data[index : self.length]
+        self.data[index] = key
+        self.length += 1
+
+
+    def append(self, key):
+        """
+        Appends key to self. See convert_key.
+        """
+        key = convert_key(self.data.dtype, key)
+        self.reserve(self.length + 1)
+        self.data[self.length] = key
+        self.length += 1
+
+
+    def extend(self, keys):
+        """
+        Appends every key in keys to self. See convert_key.
+        """
+        if not isinstance(keys, Key_Array):
+            keys = Key_Array(self.data.dtype, keys)
+        keys = keys.view()
+        self.reserve(self.length + len(keys))
+        self.data[self.length : self.length + len(keys)] = keys
+        self.length += len(keys)
+
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            keep = np.ones(self.length, bool)
+            keep[index] = False
+            kept = self.view()[keep]
+            self.data[:len(kept)] = kept
+            self.length = len(kept)
+            return
+
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("key array index out of range")
+        self.data[index : self.length-1] = self.data[index+1 : self.length]
+        self.length -= 1
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Key_Array(self.data.dtype, self.view()[index])
+        return self.view()[index].item()
+
+
+    def __setitem__(self, index, key):
+        if isinstance(index, slice):
+            key = key.view() if isinstance(key, Key_Array) else Key_Array(self.data.dtype, key).view()
+        else:
+            key = convert_key(self.data.dtype, key)
+        self.view()[index] = key
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __iter__(self):
+        return iter(self.view().tolist())
+
+
+    def __reversed__(self):
+        return iter(self.view()[::-1].tolist())
+
+
+    def __repr__(self):
+        return repr(self.view().tolist())
+
+
+
+class Numpy_Node(Node):
+    """
+    B-Tree node holding its keys in a Key_Array.
+    """
+
+    __slots__ = ()
+
+    def new_node(self, keys, children, values=None):
+        """
+        Returns a new numpy node containing the given keys,
+        children and values.
+        """
+        return Numpy_Node(keys, children, values)
+
+
+    def search(self, key):
+        """
+        Returns the index of the key preceding key in self.
+        If all keys in self are smaller than key, then the
+        returned index equals the number of keys in self.
+        """
+        return self.keys.searchsorted(key, "left")
+
+
+    def locate_successor(self, key):
+        """
+        Returns the index of the key potentially succeeding key in
+        self, or the number of keys in self if there is none.
+        """
+        return self.keys.searchsorted(key, "right")
+
+
+    def count_below(self, key, inclusive):
+        """
+        Returns the number of keys in self that are smaller
+        than key or, if inclusive is set, not larger than key.
+        """
+        return self.keys.searchsorted(key, "right" if inclusive else "left")
+
+
+
+class Numpy_B_Tree(B_Tree):
+    """
+    B-Tree of numeric keys stored unboxed in NumPy arrays.
+
+    The typecode is a NumPy dtype, 'q' (int64) by default or 'd'
+    (float64), and every node keeps its keys in a Key_Array of that
+    dtype, so a key takes 8 bytes instead of a pointer to a boxed
+    number, and in-node lookups run np.searchsorted instead of
+    comparing Python objects. Requires NumPy.
+    """
+
+    def __init__(self, degree, typecode=None):
+        """
+        Returns an empty numpy b-tree with the given degree, whose
+        keys have the dtype given by typecode, 'q' if none is given.
+        Note: Assumes degree > 1.
+        """
+        typecode = typecode or "q"
+        self.dtype = np.dtype(typecode)
+        super().__init__(degree, typecode)
+        self.root = Numpy_Node(self.new_keys(), [])
+
+
+    def new_keys(self, keys=()):
+        """
+        Returns a new key array holding the given keys.
+        """
+        return Key_Array(self.dtype, keys)
+
+
+    def insert(self, key, value=None):
+        """
+        Inserts key in the b-tree once it is known to fit the dtype,
+        so that a key rejected by convert_key leaves the b-tree as it
+        was. See B_Tree.insert.
+        """
+        super().insert(convert_key(self.dtype, key), value)
+
+
+    def insert_many(self, keys):
+        """
+        Inserts every key in keys in the b-tree once they are all known
+        to fit the dtype. See B_Tree.insert_many.
+        """
+        super().insert_many([convert_key(self.dtype, key) for key in keys])
+
+
+    def search_many(self, keys):
+        """
+        Searches for every key in keys. Returns a list holding, for
+        each key in the given order, the location pair (node, index)
+        that search would return or None if the key is not found.
+
+        The keys are sorted once and descend the tree as a batch, as
+        in B_Tree.search_many, but each visited node locates its whole
+        slice of the batch with a single np.searchsorted call.
+        """
+        keys = list(keys)
+        probes = np.asarray(keys)
+        if probes.dtype.kind not in "iuf":
+            return super().search_many(keys)
+
+        locations = [None]*len(keys)
+        queue = [(self.root, np.argsort(probes, kind="stable"))]
+        while queue:
+            (node, batch) = queue.pop()
+            node_keys = node.keys.view()
+            indices = np.searchsorted(node_keys, probes[batch])
+
+            found = indices < len(node_keys)
+            found[found] = node_keys[indices[found]] == probes[batch[found]]
+            for (position, index) in zip(batch[found].tolist(), indices[found].tolist()):
+                locations[position] = (node, index)
+
+            if node.is_leaf():
+                continue
+
+            (batch, indices) = (batch[~found], indices[~found])
+            starts = np.flatnonzero(np.diff(indices)) + 1
+            for (start, end) in zip([0] + starts.tolist(), starts.tolist() + [len(batch)]):
+                if start < end:
+                    queue.append((node.children[int(indices[start])], batch[start:end]))
+
+        return locations
+
+
+    def encode_keys(self, keys):
+        """
+        Returns the raw bytes of the given key array.
+        """
+        return keys.view().tobytes()
+
+
+    def decode_keys(self, data, swap):
+        """
+        Returns a key array holding the keys encoded in data by
+        encode_keys, byte swapping them if swap is set.
+        """
+        keys = np.frombuffer(data, self.dtype)
+        return Key_Array(self.dtype, keys.byteswap() if swap else keys)
@@ -0,0 +1,81 @@
+from b_tree_numpy import *
+from b_tree_tester import B_Tree_Tester
+from random import uniform
+
+
+class B_Tree_Numpy_Tester(B_Tree_Tester):
+
+    tree_class = Numpy_B_Tree
+
+    def perform_tests(self):
+        if super().perform_tests() is False:
+            return False
+
+        if not self.test_float_keys():
+            return False
+
+        if not self.test_key_conversion():
+            return False
+
+
+    def test_float_keys(self):
+        print("Testing float keys...")
+        self.T = Numpy_B_Tree(self.t, "d")
+        keys = [uniform(-1, 1) for _ in range(self.num_ops)]
+        self.T.insert_many(keys)
+
+        if not self.check():
+            return False
+
+        if any(node.keys.view().dtype != np.float64 for node in self.T.breadth_first_search()):
+            print("\tKeys not stored as float64")
+            return False
+
+        if self.T.search_many(keys[::2]) != [self.T.search(key) for key in keys[::2]]:
+            print("\tIncorrect locations")
+            return False
+
+        for key in keys[::2]:
+            self.T.delete(key)
+
+        if not self.check():
+            return False
+
+        if list(self.T.inorder()) != sorted(keys[1::2]):
+            print("\tIncorrect keys")
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_key_conversion(self):
+        print("Testing key conversion...")
+        self.T = Numpy_B_Tree(self.t, "q")
+        self.T.insert_many(range(self.num_ops))
+        rejected = [(1.5, TypeError), ("1", TypeError), (1 << 64, OverflowError), (-(1 << 64), OverflowError)]
+        for (key, error) in rejected:
+            for update in (self.T.insert, lambda key: self.T.insert_many([key])):
+                try:
+                    update(key)
+                except error:
+                    continue
+                print("\tKey {!r} not rejected".format(key))
+                return False
+
+            try:
+                self.T.root.keys[0] = key
+            except error:
+                continue
+            print("\tKey {!r} not rejected".format(key))
+            return False
+
+        if not self.check():
+            return False
+
+        if list(self.T.inorder()) != list(range(self.num_ops)):
+            print("\tIncorrect keys")
+            return False
+
+        print("\tCorrect\n")
+        return True
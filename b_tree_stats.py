@@ -0,0 +1,302 @@
+from b_tree import *
+from functools import wraps
+from threading import local
+from time import perf_counter
+
+
+running = local()
+
+
+class Stats:
+    """
+    Counters and latency histograms of an instrumented b-tree.
+
+    The counters add up, over every operation, the nodes visited
+    (counted as the key lookups made within nodes), the children
+    split and merged, the keys transferred between siblings in each
+    direction and the levels the tree gained or lost. Each operation
+    also keeps its own share of the counters, the number of calls
+    and a histogram of their latencies, whose buckets hold the calls
+    that took less than a power of two microseconds and at least the
+    previous one.
+    """
+
+    COUNTERS = ("visits", "splits", "merges", "transfers_clockwise",
+                "transfers_counter_clockwise", "height_increases", "height_decreases")
+
+    def __init__(self):
+        self.reset()
+
+
+    def reset(self):
+        """
+        Sets every counter back to zero and forgets every operation.
+        """
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.operations = {}
+
+
+    def record(self, name, counters, elapsed):
+        """
+        Records a call to the named operation, which changed the
+        counters by the given amounts and took elapsed seconds.
+        """
+        operation = self.operations.get(name)
+        if operation is None:
+            operation = self.operations[name] = dict.fromkeys(("calls",) + self.COUNTERS, 0)
+            operation["latency_us"] = {}
+
+        operation["calls"] += 1
+        for (counter, count) in counters.items():
+            operation[counter] += count
+
+        histogram = operation["latency_us"]
+        bound = 1 << int(elapsed*1e6).bit_length()
+        histogram[bound] = histogram.get(bound, 0) + 1
+
+
+    def as_dict(self):
+        """
+        Returns the counters and the operations as a dictionary,
+        with the latency buckets sorted by their upper bounds.
+        """
+        operations = {}
+        for (name, operation) in self.operations.items():
+            operations[name] = dict(operation, latency_us=dict(sorted(operation["latency_us"].items())))
+        return {"totals": dict(self.counters), "operations": operations}
+
+
+
+def count(counter, amount=1):
+    """
+    Increments the given counter of the b-tree whose measured
+    operation is running in the current thread, if any.
+    """
+    stats = getattr(running, "stats", None)
+    if stats is not None:
+        stats.counters[counter] += amount
+
+
+def measured(method, name=None):
+    """
+    Wraps a method of an instrumented b-tree so that its calls
+    are recorded in the stats of the tree, under the given name
+    or that of the method. Calls made from within another measured
+    method count as part of it.
+    """
+    @wraps(method)
+    def call(self, *args, **kwargs):
+        if getattr(running, "stats", None) is not None:
+            return method(self, *args, **kwargs)
+
+        stats = running.stats = self.stats
+        before = dict(stats.counters)
+        height = self.height()
+        start = perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+
+        finally:
+            elapsed = perf_counter() - start
+            running.stats = None
+            change = self.height() - height
+            stats.counters["height_increases" if change > 0 else "height_decreases"] += abs(change)
+            changes = {counter: stats.counters[counter] - before[counter] for counter in before}
+            stats.record(name or method.__name__, changes, elapsed)
+    return call
+
+
+
+class Instrumented_Node(Node):
+    """
+    B-Tree node counting the lookups and structural operations
+    made on it. See Stats.
+    """
+
+    __slots__ = ()
+
+    def new_node(self, keys, children, values=None):
+        """
+        Returns a new instrumented node containing the given
+        keys, children and values.
+        """
+        return Instrumented_Node(keys, children, values)
+
+
+    def search(self, key):
+        count("visits")
+        return super().search(key)
+
+
+    def locate_predecessor(self, key):
+        count("visits")
+        return super().locate_predecessor(key)
+
+
+    def locate_successor(self, key):
+        count("visits")
+        return super().locate_successor(key)
+
+
+    def count_below(self, key, inclusive):
+        count("visits")
+        return super().count_below(key, inclusive)
+
+
+    def locate_rank(self, index):
+        """
+        Returns (position, index) such that the index-th
+        smallest key in self's sub-tree, counting from 0,
+        is the index-th smallest key in the sub-tree of
+        self's position-th child or, if index is None,
+        self's position-th key. Counts a visit, as select
+        walks down by sub-tree sizes without any lookup.
+        """
+        count("visits")
+        if self.is_leaf():
+            return (index, None)
+
+        for (position, child) in enumerate(self.children):
+            if index < child.size:
+                return (position, index)
+
+            index -= child.size
+            if index == 0:
+                return (position, None)
+            index -= 1
+
+
+    def split_child(self, index):
+        count("splits")
+        super().split_child(index)
+
+
+    def merge_children(self, index):
+        count("merges")
+        return super().merge_children(index)
+
+
+    def transfer_key_clockwise(self, index):
+        count("transfers_clockwise")
+        super().transfer_key_clockwise(index)
+
+
+    def transfer_key_counter_clockwise(self, index):
+        count("transfers_counter_clockwise")
+        super().transfer_key_counter_clockwise(index)
+
+
+
+class Instrumented_B_Tree(B_Tree):
+    """
+    B-Tree recording what its operations do in a Stats object,
+    self.stats, which can be exported with stats.as_dict().
+
+    Instrumentation lives entirely in this class and its nodes, so
+    a plain B_Tree pays nothing for it: disabling instrumentation
+    means using B_Tree instead. Traversals, ranges and cursors are
+    not measured, since their cost depends on how far they are
+    consumed.
+    """
+
+    search = measured(B_Tree.search)
+    search_many = measured(B_Tree.search_many)
+    contains_many = measured(B_Tree.contains_many)
+    predecessor = measured(B_Tree.predecessor)
+    successor = measured(B_Tree.successor)
+    rank = measured(B_Tree.rank)
+    count_range = measured(B_Tree.count_range)
+    insert = measured(B_Tree.insert)
+    delete = measured(B_Tree.delete)
+    insert_many = measured(B_Tree.insert_many)
+    delete_many = measured(B_Tree.delete_many)
+    pop_min = measured(B_Tree.pop_min)
+    pop_max = measured(B_Tree.pop_max)
+    pop_min_n = measured(B_Tree.pop_min_n)
+    pop_max_n = measured(B_Tree.pop_max_n)
+    min = measured(B_Tree.min)
+    max = measured(B_Tree.max)
+    delete_range = measured(B_Tree.delete_range)
+    load_sorted = measured(B_Tree.load_sorted)
+    union = measured(B_Tree.union)
+    intersection = measured(B_Tree.intersection)
+    difference = measured(B_Tree.difference)
+    split = measured(B_Tree.split)
+
+    def __init__(self, degree, typecode=None):
+        """
+        Returns an empty instrumented b-tree with the given degree.
+        Note: Assumes degree > 1.
+        """
+        super().__init__(degree, typecode)
+        self.root = Instrumented_Node(self.new_keys(), [])
+        self.stats = Stats()
+
+
+    @measured
+    def select(self, index):
+        """
+        Returns the index-th smallest key as B_Tree.select does,
+        walking down through Instrumented_Node.locate_rank so that
+        every node on the way counts as visited.
+        """
+        if index < 0:
+            index += self.root.size
+        if not 0 <= index < self.root.size:
+            raise IndexError("b-tree index out of range")
+
+        node = self.root
+        while True:
+            (position, index) = node.locate_rank(index)
+            if index is None:
+                return node.keys[position]
+            node = node.children[position]
+
+
+    @classmethod
+    def join(cls, left, pivot, right, value=None):
+        """
+        Joins the b-trees as B_Tree.join does, recording the join
+        in the stats of left.
+        """
+        return left.join_onto(pivot, right, value)
+
+
+    def join_onto(self, pivot, right, value=None):
+        """
+        Returns B_Tree.join(self, pivot, right, value).
+        """
+        return super().join(self, pivot, right, value)
+
+    join_onto = measured(join_onto, "join")
+
+
+    def pop_edge_pass(self, num_keys, side):
+        """
+        Counts a visit for every node along the spine of the edge
+        that a pass descends without any lookup. See
+        B_Tree.pop_edge_pass.
+        """
+        count("visits", self.height() + 1)
+        return super().pop_edge_pass(num_keys, side)
+
+
+    def append(self, key, value=None):
+        """
+        Counts a visit for every node along the right spine
+        that an append updates. See B_Tree.append.
+        """
+        if not super().append(key, value):
+            return False
+        count("visits", len(self.spine[1]))
+        return True
+
+
+    def snapshot(self):
+        """
+        Returns a snapshot of the b-tree, as B_Tree.snapshot does,
+        recording its operations in stats of its own.
+        """
+        snapshot = super().snapshot()
+        snapshot.stats = Stats()
+        return snapshot
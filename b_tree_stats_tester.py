@@ -0,0 +1,92 @@
+from b_tree_stats import *
+from b_tree_tester import B_Tree_Tester
+from random import shuffle
+
+
+class B_Tree_Stats_Tester(B_Tree_Tester):
+
+    tree_class = Instrumented_B_Tree
+
+    def perform_tests(self):
+        if super().perform_tests() is False:
+            return False
+
+        if not self.test_stats():
+            return False
+
+
+    def test_stats(self):
+        print("Testing instrumentation...")
+        self.T = Instrumented_B_Tree(self.t)
+        keys = list(range(self.num_ops))
+        for key in keys:
+            self.T.insert(key)
+
+        totals = self.T.stats.as_dict()["totals"]
+        if totals["splits"] == 0 or totals["height_increases"] != self.get_tree_depth():
+            print("\tIncorrect split or height counters")
+            return False
+
+        shuffle(keys)
+        for key in keys:
+            self.T.search(key)
+            self.T.delete(key)
+
+        stats = self.T.stats.as_dict()
+        totals = stats["totals"]
+        if totals["merges"] == 0 or totals["height_decreases"] != totals["height_increases"]:
+            print("\tIncorrect merge or height counters")
+            return False
+
+        operations = stats["operations"]
+        if set(operations) != {"insert", "search", "delete"}:
+            print("\tIncorrect operations recorded")
+            return False
+
+        for (name, operation) in operations.items():
+            if operation["calls"] != self.num_ops or sum(operation["latency_us"].values()) != self.num_ops:
+                print("\tIncorrect number of calls recorded")
+                return False
+
+            if operation["visits"] < self.num_ops:
+                print("\tIncorrect number of visits recorded")
+                return False
+
+        if sum(operation["splits"] for operation in operations.values()) != totals["splits"]:
+            print("\tCounters not attributed to their operations")
+            return False
+
+        self.T.stats.reset()
+        if any(self.T.stats.as_dict()["totals"].values()):
+            print("\tCounters not reset")
+            return False
+
+        for key in keys:
+            self.T.insert(key)
+        for index in range(self.num_ops):
+            self.T.select(index)
+        for _ in range(self.num_ops//2):
+            self.T.pop_min()
+            self.T.pop_max()
+
+        operations = self.T.stats.as_dict()["operations"]
+        if any(operations[name]["visits"] < self.num_ops//2 for name in ("select", "pop_min", "pop_max")):
+            print("\tIncorrect number of visits recorded")
+            return False
+
+        self.T = Instrumented_B_Tree.from_sorted(sorted(keys), self.t)
+        self.T.pop_min_n(2)
+        self.T.pop_max_n(2)
+        self.T.min()
+        self.T.max()
+        self.T.union(self.T)
+        (lower, upper) = self.T.split(self.num_ops//2)
+        Instrumented_B_Tree.join(lower, self.num_ops//2, upper)
+
+        operations = set(self.T.stats.as_dict()["operations"]) | set(lower.stats.as_dict()["operations"])
+        if operations != {"load_sorted", "pop_min_n", "pop_max_n", "min", "max", "union", "split", "join"}:
+            print("\tPublic operations not recorded under their names")
+            return False
+
+        print("\tCorrect\n")
+        return True
@@ -0,0 +1,1329 @@
+from b_tree import *
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from inspect import isgenerator
+from mmap import mmap
+from operator import itemgetter
+from os import fsync, path as os_path
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from struct import Struct
+from threading import Condition, Event, RLock, Thread
+from time import monotonic
+from zlib import crc32
+
+
+class Paged_Node(Node):
+    """
+    B-Tree node backed by a page of a node store.
+
+    A paged node starts unloaded, knowing only its page and the
+    size of its sub-tree. Its keys, children and values are decoded
+    from the store the first time any of them is accessed, so the
+    tree algorithms run on paged nodes exactly as on plain ones.
+    Every access goes through the store's buffer pool, which may
+    later unload the node again.
+    """
+
+    __slots__ = ("store", "page", "_keys", "_children", "_values", "_size")
+
+    def __init__(self, store, page, size):
+        """
+        Generates an unloaded node standing for the given page
+        of store, whose sub-tree holds size keys.
+        """
+        self.store = store
+        self.page = page
+        self._keys = None
+        self._children = None
+        self._values = None
+        self._size = size
+        self.owner = None
+
+
+    def is_loaded(self):
+        """
+        Checks whether self's page has been decoded.
+        """
+        return self._keys is not None
+
+
+    def new_node(self, keys, children, values=None):
+        """
+        Returns a new paged node of self's store, containing the given
+        keys, children and values. It gets a page when written back.
+        """
+        node = Paged_Node(self.store, None, len(keys) + sum(child.size for child in children))
+        node._keys = keys
+        node._children = children
+        node._values = values
+        self.store.pool.admit(node, dirty=True)
+        return node
+
+
+    def release(self):
+        """
+        Unpins self, which may then be written back and unloaded
+        before the mutation ends.
+        """
+        self.store.pool.release(self)
+
+
+    def discard(self):
+        """
+        Releases self's page, as self is no longer part of the tree.
+        """
+        super().discard()
+        self.store.discard(self)
+
+
+    def unload(self):
+        """
+        Drops self's decoded contents.
+        """
+        self._keys = None
+        self._children = None
+        self._values = None
+
+
+    @property
+    def keys(self):
+        self.store.pool.access(self)
+        return self._keys
+
+
+    @keys.setter
+    def keys(self, keys):
+        self.store.pool.access(self)
+        self._keys = keys
+
+
+    @property
+    def children(self):
+        self.store.pool.access(self)
+        return self._children
+
+
+    @children.setter
+    def children(self, children):
+        self.store.pool.access(self)
+        self._children = children
+
+
+    @property
+    def values(self):
+        self.store.pool.access(self)
+        return self._values
+
+
+    @values.setter
+    def values(self, values):
+        self.store.pool.access(self)
+        self._values = values
+
+
+    @property
+    def size(self):
+        return self._size
+
+
+    @size.setter
+    def size(self, size):
+        self._size = size
+
+
+
+class Buffer_Pool:
+    """
+    Bounded pool of the paged nodes of a store that are currently
+    decoded, evicted in least recently used order.
+
+    While a mutation is in progress, every node it accesses is pinned,
+    so that it cannot be unloaded under the algorithm, and marked dirty.
+    Nodes the mutation is done with may be released earlier.
+    Evicting a dirty node writes it back to the store first. Only nodes
+    whose children are all unloaded can be evicted, so that no decoded
+    child is ever cut off from a pinned or dirty parent.
+    """
+
+    def __init__(self, store, capacity):
+        """
+        Returns an empty pool for store holding at most capacity
+        unpinned decoded nodes.
+        """
+        self.store = store
+        self.capacity = capacity
+        self.resident = OrderedDict()
+        self.pinned = set()
+        self.dirty = set()
+        self.depth = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.write_backs = 0
+
+
+    def access(self, node):
+        """
+        Makes sure that node is decoded and marks it as the most
+        recently used node. Within a mutation, node is also pinned
+        and marked dirty.
+        """
+        if node._keys is None:
+            self.misses += 1
+            self.evict(self.capacity - 1)
+            self.store.load(node)
+            self.resident[node] = None
+        else:
+            self.hits += 1
+            try:
+                self.resident.move_to_end(node)
+            except KeyError:
+                self.resident[node] = None
+
+        if self.depth and node not in self.pinned:
+            self.pinned.add(node)
+            self.dirty.add(node)
+
+
+    def admit(self, node, dirty=False):
+        """
+        Adds a node that was decoded outside of the pool, such as a
+        newly created one, which is dirty and makes room for itself.
+        """
+        self.resident[node] = None
+        if dirty:
+            self.dirty.add(node)
+            if self.depth:
+                self.pinned.add(node)
+            self.evict()
+
+
+    def release(self, node):
+        """
+        Unpins node before the mutation ends. It stays dirty, and is
+        pinned again if the mutation accesses it later on.
+        """
+        self.pinned.discard(node)
+
+
+    @contextmanager
+    def mutation(self):
+        """
+        Pins and marks dirty every node accessed within the context.
+        Nodes are unpinned when the outermost mutation ends.
+        """
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self.pinned.clear()
+                self.evict()
+
+
+    def is_evictable(self, node):
+        """
+        Checks whether node can be unloaded.
+        """
+        return node not in self.pinned and all(
+            isinstance(child, Paged_Node) and not child.is_loaded()
+            for child in node._children)
+
+
+    def evict(self, limit=None):
+        """
+        Unloads least recently used nodes, writing back the dirty
+        ones, until the pool holds at most limit nodes, its capacity
+        by default, or no node can be unloaded.
+        """
+        limit = self.capacity if limit is None else limit
+        while len(self.resident) > limit:
+            for node in self.resident:
+                if self.is_evictable(node):
+                    break
+            else:
+                return
+
+            del self.resident[node]
+            if node in self.dirty:
+                self.dirty.discard(node)
+                self.store.write(node)
+                self.write_backs += 1
+
+            node.unload()
+            self.evictions += 1
+
+
+    def forget(self, node):
+        """
+        Drops node from the pool.
+        """
+        self.resident.pop(node, None)
+        self.pinned.discard(node)
+        self.dirty.discard(node)
+
+
+    def committed(self):
+        """
+        Forgets about the modifications made since the last commit.
+        """
+        self.dirty.clear()
+        self.evict()
+
+
+    def stats(self):
+        """
+        Returns the counters of the pool as a dictionary.
+        """
+        return {
+            "capacity": self.capacity,
+            "resident": len(self.resident),
+            "dirty": len(self.dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "write_backs": self.write_backs,
+        }
+
+
+
+class Page_Store:
+    """
+    Node store keeping a b-tree in a single file of fixed-size pages,
+    accessed through mmap.
+
+    Page 0 holds two header slots, written alternately and protected
+    by a checksum. Every other page holds one node: the length of its
+    encoding followed by the encoding itself. Flushing never writes
+    over a page referenced by the last committed header: modified
+    nodes are written to free pages and become visible atomically
+    when the new header is written, so the file always holds the
+    tree as of some complete flush.
+
+    The free pages are listed in a chain of pages, each holding the
+    page of the next one, or 0, followed by as many page numbers as
+    fit. Every commit writes the chain to pages that were already
+    free before it, and gives back to the file the free pages at its
+    end, so the file only grows with the tree it holds.
+
+    Decoded nodes are kept in a Buffer_Pool holding up to capacity
+    nodes. The header also records lsn, the sequence number of the
+    last logged operation included in the committed tree, so that a
+    Write_Ahead_Log can be replayed from there.
+    """
+
+    MAGIC = b"BTREEPG2"
+    HEADER_OFFSETS = (0, 256)
+    HEADER = Struct("<8sQIIcBQQQQQQ")
+    CHECKSUM = Struct("<I")
+    LENGTH = Struct("<I")
+    LINK = Struct("<Q")
+
+    def __init__(self, filename, degree=None, page_size=4096, typecode=None, mapping=False,
+                 capacity=1024):
+        """
+        Opens the node store kept in filename. If the file does not
+        exist, then a store holding an empty b-tree with the given
+        degree, page size, key typecode and mapping mode is created;
+        otherwise those settings are read from the file.
+        """
+        self.filename = filename
+        self.released = []
+        self.blob = []
+        self.pool = Buffer_Pool(self, capacity)
+
+        if os_path.exists(filename):
+            self.file = open(filename, "r+b")
+            self.map = mmap(self.file.fileno(), 0)
+            self.read_header()
+
+        else:
+            if degree is None:
+                raise ValueError("a degree is required to create a node store")
+            if page_size < 2*self.HEADER_OFFSETS[1]:
+                raise ValueError("pages must hold at least {} bytes".format(2*self.HEADER_OFFSETS[1]))
+
+            self.file = open(filename, "w+b")
+            self.page_size = page_size
+            self.degree = degree
+            self.typecode = typecode
+            self.mapping = mapping
+            self.sequence = 0
+            self.lsn = 0
+            self.num_pages = 1
+            self.free = []
+            self.file.truncate(page_size)
+            self.map = mmap(self.file.fileno(), 0)
+
+            keys = array(typecode) if typecode else []
+            self.root_page = self.write_node(self.encode(keys, [], [] if mapping else None))
+            self.root_size = 0
+            self.write_header()
+
+
+    def read_header(self):
+        """
+        Reads the most recent valid header slot.
+        """
+        header = None
+        for offset in self.HEADER_OFFSETS:
+            fields = self.HEADER.unpack_from(self.map, offset)
+            (checksum,) = self.CHECKSUM.unpack_from(self.map, offset + self.HEADER.size)
+            data = self.map[offset : offset + self.HEADER.size]
+            if fields[0] == self.MAGIC and crc32(data) == checksum:
+                if header is None or fields[1] > header[1]:
+                    header = fields
+
+        if header is None:
+            raise ValueError("{} is not a valid node store".format(self.filename))
+
+        (_, self.sequence, self.page_size, self.degree, typecode, mapping,
+         self.num_pages, self.root_page, self.root_size, free_page, free_len, self.lsn) = header
+
+        self.typecode = typecode.decode() if typecode != b"\0" else None
+        self.mapping = bool(mapping)
+        self.free = []
+        self.blob = []
+        page = free_page
+        while page:
+            offset = page*self.page_size
+            (next_page,) = self.LINK.unpack_from(self.map, offset)
+            start = offset + self.LINK.size
+            count = min(self.num_links(), free_len - len(self.free))
+            free = array("q")
+            free.frombytes(self.map[start : start + 8*count])
+            self.free.extend(free)
+            self.blob.append(page)
+            page = next_page
+        self.free.sort(reverse=True)
+
+
+    def num_links(self):
+        """
+        Returns the number of free pages listed in each page
+        of the chain of free pages.
+        """
+        return (self.page_size - self.LINK.size)//8
+
+
+    def write_header(self):
+        """
+        Commits the current root into the next header slot.
+
+        The free pages at the end of the file are dropped first. The
+        pages that become free with this commit, namely the remaining
+        free pages, the released ones and those holding the previous
+        free list, are then listed in a chain of pages taken from the
+        free ones, which the last committed header does not reference,
+        or from the end of the file if there are not enough of them.
+        The file is truncated once the commit drops enough pages.
+        """
+        free = sorted(self.free, reverse=True)
+        num_dropped = 0
+        while num_dropped < len(free) and free[num_dropped] == self.num_pages - 1 - num_dropped:
+            num_dropped += 1
+        self.num_pages -= num_dropped
+        self.free = free[num_dropped:]
+
+        num_freed = len(self.released) + len(self.blob)
+        blob = []
+        while len(blob)*self.num_links() < len(self.free) + num_freed:
+            blob.append(self.allocate())
+        free = self.free + self.released + self.blob
+        for (position, page) in enumerate(blob):
+            offset = page*self.page_size
+            self.LINK.pack_into(self.map, offset, blob[position+1] if position + 1 < len(blob) else 0)
+            links = array("q", free[position*self.num_links() : (position+1)*self.num_links()])
+            start = offset + self.LINK.size
+            self.map[start : start + 8*len(links)] = links.tobytes()
+        self.map.flush()
+
+        self.sequence += 1
+        typecode = self.typecode.encode() if self.typecode else b"\0"
+        data = self.HEADER.pack(self.MAGIC, self.sequence, self.page_size, self.degree,
+                                typecode, self.mapping, self.num_pages, self.root_page,
+                                self.root_size, blob[0] if blob else 0, len(free), self.lsn)
+
+        offset = self.HEADER_OFFSETS[self.sequence % 2]
+        self.map[offset : offset + len(data)] = data
+        self.CHECKSUM.pack_into(self.map, offset + len(data), crc32(data))
+        self.map.flush()
+
+        self.free = sorted(free, reverse=True)
+        self.released = []
+        self.blob = blob
+        if len(self.map) > 2*self.num_pages*self.page_size:
+            self.map.close()
+            self.file.truncate(self.num_pages*self.page_size)
+            self.map = mmap(self.file.fileno(), 0)
+
+
+    def reserve(self, num_pages):
+        """
+        Grows the file, if needed, so that it holds num_pages pages.
+        """
+        capacity = len(self.map)//self.page_size
+        if num_pages <= capacity:
+            return
+
+        self.map.close()
+        self.file.truncate(max(num_pages, 2*capacity)*self.page_size)
+        self.map = mmap(self.file.fileno(), 0)
+
+
+    def allocate(self):
+        """
+        Returns a page that is not referenced by the last committed
+        header, the lowest free page if there is any, so that the
+        free pages gather at the end of the file.
+        """
+        if self.free:
+            return self.free.pop()
+
+        self.reserve(self.num_pages + 1)
+        self.num_pages += 1
+        return self.num_pages - 1
+
+
+    def read_node(self, page):
+        """
+        Returns the encoding stored in page.
+        """
+        offset = page*self.page_size
+        (length,) = self.LENGTH.unpack_from(self.map, offset)
+        start = offset + self.LENGTH.size
+        return self.map[start : start + length]
+
+
+    def write_node(self, data):
+        """
+        Stores the given encoding in a new page and returns it.
+        """
+        if self.LENGTH.size + len(data) > self.page_size:
+            raise ValueError("node does not fit in a {}-byte page".format(self.page_size))
+
+        page = self.allocate()
+        offset = page*self.page_size
+        self.LENGTH.pack_into(self.map, offset, len(data))
+        start = offset + self.LENGTH.size
+        self.map[start : start + len(data)] = data
+        return page
+
+
+    def encode(self, keys, children, values):
+        """
+        Returns the encoding of a node with the given contents.
+        Children are referred to by page and sub-tree size, so
+        they must be paged already.
+        """
+        child_pages = array("q", (child.page for child in children))
+        child_sizes = array("q", (child.size for child in children))
+        keys = keys if self.typecode else list(keys)
+        return dumps((keys, values, child_pages, child_sizes), HIGHEST_PROTOCOL)
+
+
+    def load(self, node):
+        """
+        Decodes the page of the given paged node into it.
+        """
+        (keys, values, child_pages, child_sizes) = loads(self.read_node(node.page))
+        node._keys = keys
+        node._values = values
+        node._children = [Paged_Node(self, page, size)
+                          for (page, size) in zip(child_pages, child_sizes)]
+
+
+    def write(self, node):
+        """
+        Writes the given paged node to a fresh page, releasing the
+        page it was previously stored in.
+        """
+        page = self.write_node(self.encode(node._keys, node._children, node._values))
+        if node.page is not None:
+            self.released.append(node.page)
+        node.page = page
+
+
+    def discard(self, node):
+        """
+        Releases the page of a paged node that was removed from the
+        tree and drops it from the buffer pool.
+        """
+        if node.page is not None:
+            self.released.append(node.page)
+            node.page = None
+        self.pool.forget(node)
+
+
+    def root_node(self):
+        """
+        Returns an unloaded paged node standing for the committed root.
+        """
+        return Paged_Node(self, self.root_page, self.root_size)
+
+
+    def write_back(self, node):
+        """
+        Writes every dirty node in node's sub-tree to a fresh page and
+        returns the paged node that stands for node afterwards. Nodes
+        created since the last commit are plain nodes and are replaced
+        by paged ones. Only dirty nodes are visited: the ancestors of a
+        dirty node were accessed by the same mutation, so they are dirty
+        as well, unless they were evicted, which required writing back
+        their children first.
+        """
+        if isinstance(node, Paged_Node):
+            if node not in self.pool.dirty:
+                return node
+
+        children = node._children if isinstance(node, Paged_Node) else node.children
+        for (index, child) in enumerate(children):
+            paged = self.write_back(child)
+            if paged is not child:
+                children[index] = paged
+
+        if isinstance(node, Paged_Node):
+            self.write(node)
+            return node
+
+        paged = Paged_Node(self, None, node.size)
+        paged._keys = node.keys
+        paged._children = node.children
+        paged._values = node.values
+        self.write(paged)
+        self.pool.admit(paged)
+        return paged
+
+
+    def flush(self, root):
+        """
+        Writes the changes made to the tree rooted at root and commits
+        them. Released pages become free once the commit succeeds.
+        Returns the paged root.
+        """
+        root = self.write_back(root)
+        self.root_page = root.page
+        self.root_size = root.size
+        self.write_header()
+        self.pool.committed()
+        return root
+
+
+    def close(self):
+        """
+        Closes the underlying file without flushing.
+        """
+        self.map.close()
+        self.file.close()
+
+
+
+class Write_Ahead_Log:
+    """
+    Append-only log of the operations applied to a b-tree since its
+    last checkpoint.
+
+    Every record holds the length of the pickled operation, a checksum,
+    a log sequence number (lsn) and the operation itself. A record torn
+    by a crash while appending fails its checksum and is cut off when
+    the log is recovered.
+
+    The durability mode decides when appended records reach the disk:
+    "none" leaves them to the operating system, "fsync" syncs every
+    record before the operation returns and "group" makes writers share
+    fsyncs. In "group" mode every writer waits until a sync covers its
+    record: the first one to wait leads and syncs every record appended
+    so far, while records appended in the meantime wait for the next
+    sync. When other writers are waiting as well, the leader lingers up
+    to group_interval seconds for group_size records to be pending.
+    """
+
+    DURABILITY_MODES = ("none", "group", "fsync")
+    RECORD = Struct("<IIQ")
+
+    def __init__(self, filename, durability="group", group_size=64, group_interval=0.01):
+        """
+        Opens the log kept in filename, creating it if needed.
+        """
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError("durability must be one of {}".format(self.DURABILITY_MODES))
+
+        self.filename = filename
+        self.durability = durability
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.file = open(filename, "a+b")
+        self.lock = RLock()
+        self.synced = Condition(self.lock)
+        self.lsn = 0
+        self.synced_lsn = 0
+        self.syncing = False
+        self.waiting = 0
+        self.size = self.file.seek(0, 2)
+
+
+    def recover(self, lsn):
+        """
+        Generates the operations logged after the given lsn, in order,
+        and cuts off a torn record at the end of the log, if any.
+        """
+        self.file.seek(0)
+        end = 0
+        while True:
+            header = self.file.read(self.RECORD.size)
+            if len(header) < self.RECORD.size:
+                break
+            (length, checksum, record_lsn) = self.RECORD.unpack(header)
+            data = self.file.read(length)
+            if len(data) < length or self.checksum(record_lsn, data) != checksum:
+                break
+
+            end = self.file.tell()
+            self.lsn = record_lsn
+            if record_lsn > lsn:
+                yield loads(data)
+
+        self.lsn = max(self.lsn, lsn)
+        self.synced_lsn = self.lsn
+        if end < self.size:
+            self.file.truncate(end)
+            self.size = end
+
+
+    @property
+    def pending(self):
+        """
+        Returns the number of appended records not synced yet.
+        """
+        return self.lsn - self.synced_lsn
+
+
+    def append(self, operation):
+        """
+        Appends operation to the log and returns its lsn. Returns once
+        the record is as durable as the durability mode requires.
+        """
+        lsn = self.write(operation)
+        self.commit(lsn)
+        return lsn
+
+
+    def write(self, operation):
+        """
+        Appends operation to the log and returns its lsn, without
+        waiting for the record to reach the disk. See commit.
+        """
+        data = dumps(operation, HIGHEST_PROTOCOL)
+        with self.lock:
+            self.lsn += 1
+            checksum = self.checksum(self.lsn, data)
+            self.file.write(self.RECORD.pack(len(data), checksum, self.lsn) + data)
+            self.size += self.RECORD.size + len(data)
+            self.synced.notify_all()
+            return self.lsn
+
+
+    def commit(self, lsn):
+        """
+        Returns once the record with the given lsn is as durable as
+        the durability mode requires.
+        """
+        if self.durability == "fsync":
+            self.sync_through(lsn, 0)
+        elif self.durability == "group":
+            self.sync_through(lsn, self.group_interval)
+
+
+    def checksum(self, lsn, data):
+        """
+        Returns the checksum of a record with the given lsn and data.
+        """
+        return crc32(data, crc32(lsn.to_bytes(8, "little")))
+
+
+    def sync(self):
+        """
+        Forces every appended record to disk.
+        """
+        with self.lock:
+            lsn = self.lsn
+        self.sync_through(lsn, 0)
+
+
+    def sync_through(self, lsn, linger):
+        """
+        Returns once every record up to the given lsn is on disk. Waits
+        for the sync in progress, if any, and leads the next one unless
+        it covers lsn. A leader waits up to linger seconds for group_size
+        records to be pending, as long as other writers wait as well.
+        """
+        with self.synced:
+            self.waiting += 1
+            deadline = monotonic() + linger
+            try:
+                while self.synced_lsn < lsn:
+                    if self.syncing:
+                        self.synced.wait()
+                    elif (self.waiting > 1 and self.pending < self.group_size and
+                            monotonic() < deadline):
+                        self.synced.wait(deadline - monotonic())
+                    else:
+                        break
+                else:
+                    return
+            finally:
+                self.waiting -= 1
+            self.syncing = True
+            target = self.lsn
+            self.file.flush()
+
+        try:
+            fsync(self.file.fileno())
+        finally:
+            with self.synced:
+                self.syncing = False
+                self.synced_lsn = max(self.synced_lsn, target)
+                self.synced.notify_all()
+
+
+    def truncate(self):
+        """
+        Drops every record. The lsn keeps counting from where it was.
+        """
+        with self.lock:
+            self.file.truncate(0)
+            self.file.flush()
+            fsync(self.file.fileno())
+            self.size = 0
+            self.synced_lsn = self.lsn
+            self.synced.notify_all()
+
+
+    def close(self):
+        """
+        Syncs and closes the log.
+        """
+        self.sync()
+        self.file.close()
+
+
+
+def mutating(method):
+    """
+    Wraps a method of a paged b-tree so that the nodes it accesses
+    are pinned in the buffer pool and marked dirty while it runs.
+    """
+    @wraps(method)
+    def mutation(self, *args, **kwargs):
+        with self.store.pool.mutation():
+            return method(self, *args, **kwargs)
+    return mutation
+
+
+def synchronized(method):
+    """
+    Wraps a method of a durable b-tree so that it runs under the lock
+    of the tree, which background checkpoints take as well. Generators
+    returned by the method hold the lock only while producing each item.
+    """
+    @wraps(method)
+    def call(self, *args, **kwargs):
+        with self.lock:
+            result = method(self, *args, **kwargs)
+        if isgenerator(result):
+            return generate_synchronized(self.lock, result)
+        return result
+    return call
+
+
+def generate_synchronized(lock, generator):
+    """
+    Generates the items of generator, producing each under lock.
+    """
+    while True:
+        with lock:
+            item = next(generator, lock)
+        if item is lock:
+            return
+        yield item
+
+
+
+class Paged_B_Tree(B_Tree):
+    """
+    B-Tree whose nodes live in a node store, such as a Page_Store,
+    and are loaded on demand. Opening an existing store costs O(1):
+    only the root page is known until the tree is traversed.
+    Changes reach the store when the tree is flushed.
+    """
+
+    memory_class = B_Tree
+
+    insert = mutating(B_Tree.insert)
+    delete = mutating(B_Tree.delete)
+    pop_edge_pass = mutating(B_Tree.pop_edge_pass)
+    load_sorted = mutating(B_Tree.load_sorted)
+
+    def insert_many(self, keys):
+        """
+        Inserts every key in keys in the b-tree, one at a time, so that
+        each insertion only pins the nodes along its own path.
+        """
+        for key in sorted(keys):
+            self.insert(key)
+
+
+    def delete_many(self, keys):
+        """
+        Deletes every key in keys from the b-tree, one at a time, so
+        that each deletion only pins the nodes along its own path.
+        """
+        for key in sorted(keys):
+            self.delete(key)
+
+
+    def delete_range(self, lo=None, hi=None, inclusive=(True, False)):
+        """
+        Deletes the keys that range(lo, hi, inclusive) generates, one
+        at a time, and returns how many were deleted. Dropping whole
+        sub-trees would leave their pages allocated in the store.
+        """
+        keys = list(self.range(lo, hi, inclusive))
+        self.delete_many(keys)
+        return len(keys)
+
+
+    def __init__(self, store):
+        """
+        Returns the b-tree kept in the given node store.
+        """
+        super().__init__(store.degree, store.typecode)
+        self.store = store
+        self.root = store.root_node()
+
+
+    @mutating
+    def clear(self):
+        """
+        Removes every key from the b-tree and releases the pages of
+        its nodes. Leaves are released without being read.
+        """
+        stack = [(self.root, self.height())]
+        super().clear()
+        while stack:
+            (node, height) = stack.pop()
+            if height:
+                stack.extend((child, height - 1) for child in node.children)
+            node.discard()
+
+
+    def snapshot(self):
+        """
+        Returns an in-memory b-tree holding the keys the b-tree holds
+        now. Pages cannot be shared, as B_Tree.snapshot shares nodes,
+        since the store releases the pages of the nodes the b-tree
+        drops, even if a snapshot still reached them. The snapshot
+        is bulk-loaded from the items of the b-tree instead, in O(n)
+        time. See new_tree.
+        """
+        tree = self.new_tree()
+        tree.load_sorted(self.generate_items())
+        return tree
+
+
+    def new_tree(self):
+        """
+        Returns an empty in-memory b-tree of the kind the b-tree pages,
+        memory_class, with its degree and typecode. Snapshots, merges,
+        joins and splits return such b-trees, since a paged one would
+        need a store of its own; load_sorted writes their items into
+        an empty paged b-tree.
+        """
+        tree = self.memory_class(self.min_num_keys + 1, self.typecode)
+        tree.redistribute = self.redistribute
+        return tree
+
+
+    def append(self, key, value=None):
+        """
+        Never appends without a descent, returning False: sub-tree
+        sizes are written into the pages of the parents, which only
+        a descent accesses and thus marks dirty.
+        """
+        return False
+
+
+    def edge_leaf(self, side):
+        """
+        Returns the leftmost or rightmost leaf, as B_Tree.edge_leaf
+        does, but only caches it until the next update: loading a
+        parent again creates new nodes standing for its children, so
+        updates may reach a leaf through a node other than the cached
+        one.
+        """
+        if self.edge_leaves[side][0] != self.version:
+            self.forget_edge_leaves()
+        return super().edge_leaf(side)
+
+
+    @classmethod
+    def join(cls, left, pivot, right, value=None):
+        """
+        Returns an in-memory b-tree holding the keys of left, pivot,
+        attached to value in maps, and the keys of right, as B_Tree.join
+        does, and leaves left and right empty. The nodes of left and
+        right live in the pages of different stores, so both are copied
+        into in-memory b-trees, in O(n) time, which are then joined.
+        """
+        (left_copy, right_copy) = (left.snapshot(), right.snapshot())
+        tree = left.memory_class.join(left_copy, pivot, right_copy, value)
+        left.clear()
+        right.clear()
+        return tree
+
+
+    def split(self, key, inclusive=False):
+        """
+        Splits the b-tree into a pair of in-memory b-trees as
+        B_Tree.split does, and leaves it empty. The b-tree is
+        copied first, in O(n) time, and the copy is split, as
+        each half would need a store of its own otherwise.
+        """
+        trees = self.snapshot().split(key, inclusive)
+        self.clear()
+        return trees
+
+
+    @classmethod
+    def from_sorted(cls, keys, degree, fill_factor=1.0, typecode=None):
+        """
+        Rejected: paged b-trees are opened over a node store, whose
+        degree and typecode they take. Open one over an empty store
+        and fill it with load_sorted instead.
+        """
+        raise TypeError("paged b-trees are opened over a node store, fill one with load_sorted")
+
+
+    @classmethod
+    def load(cls, fileobj):
+        """
+        Rejected: paged b-trees are opened over a node store. Load
+        the dump into an in-memory b-tree and fill an empty paged
+        b-tree with its items through load_sorted instead.
+        """
+        raise TypeError("paged b-trees are opened over a node store, fill one with load_sorted")
+
+
+    @classmethod
+    def tuned(cls, sample_workload, degrees=B_Tree.TUNING_DEGREES, typecode=None, repeat=3):
+        """
+        Rejected: the degree of a paged b-tree is the one of its store,
+        set when the store is created. Tune the in-memory kind of the
+        b-tree, such as B_Tree, and create the store with its degree.
+        """
+        raise TypeError("paged b-trees take the degree of their store")
+
+
+    @classmethod
+    def time_workload(cls, workload, degree, typecode=None, repeat=3):
+        """
+        Rejected, as tuned is.
+        """
+        raise TypeError("paged b-trees take the degree of their store")
+
+
+    def flush(self):
+        """
+        Writes every change made to the b-tree into its store. Nodes
+        created since the last flush are replaced by paged ones, so the
+        version is bumped and the edge leaves are forgotten for cached
+        edge leaves and spines to be found again.
+        """
+        self.version += 1
+        self.root = self.store.flush(self.root)
+        self.forget_edge_leaves()
+
+
+    def close(self):
+        """
+        Flushes the b-tree and closes its store.
+        """
+        self.flush()
+        self.store.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+
+class Paged_B_Tree_Map(Paged_B_Tree, B_Tree_Map):
+    """
+    B-Tree map whose nodes live in a node store. See Paged_B_Tree.
+    """
+
+    memory_class = B_Tree_Map
+
+    insert = mutating(B_Tree_Map.insert)
+    __setitem__ = mutating(B_Tree_Map.__setitem__)
+    pop = mutating(B_Tree_Map.pop)
+
+    def insert_many(self, items):
+        """
+        Attaches every value to its key for every (key, value) pair
+        in items, one pair at a time, so that each insertion only pins
+        the nodes along its own path. See B_Tree_Map.insert_many.
+        """
+        for (key, value) in sorted(items, key=itemgetter(0)):
+            self.insert(key, value)
+
+
+
+class Durable_B_Tree(Paged_B_Tree):
+    """
+    Paged b-tree that records every mutation in a Write_Ahead_Log, so
+    that acknowledged operations survive a crash without flushing the
+    tree after each of them.
+
+    Opening the tree replays the operations logged after the last
+    checkpoint, which is the tree committed in the store. A background
+    thread checkpoints the tree, flushing it and emptying the log, once
+    the log grows past checkpoint_size bytes or checkpoint_interval
+    seconds have gone by. Operations run under a lock shared with the
+    background thread, and wait for their log record to be synced after
+    releasing it, so that concurrent writers share fsyncs.
+    """
+
+    def __init__(self, store, log, checkpoint_interval=60.0, checkpoint_size=1 << 24):
+        """
+        Returns the b-tree kept in the given node store and write-ahead
+        log, recovering the operations logged since the last checkpoint.
+        """
+        super().__init__(store)
+        self.log = log
+        self.lock = RLock()
+        self.depth = 0
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_size = checkpoint_size
+        self.checkpointed_at = monotonic()
+        self.replay()
+
+        self.stopping = Event()
+        self.worker = Thread(target=self.run_background, daemon=True)
+        self.worker.start()
+
+
+    def replay(self):
+        """
+        Applies the operations logged after the last checkpoint.
+        """
+        with self.logged():
+            for (name, *args) in self.log.recover(self.store.lsn):
+                getattr(self, name)(*args)
+
+
+    @contextmanager
+    def logged(self, *operation):
+        """
+        Runs the enclosed mutation under the lock and then appends
+        operation to the log, unless the mutation is part of a logged
+        one or of a replay. Returns once the record is as durable as
+        the durability mode of the log requires.
+        """
+        lsn = None
+        with self.lock:
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+            if operation and not self.depth:
+                lsn = self.log.write(operation)
+        if lsn is not None:
+            self.log.commit(lsn)
+
+
+    def insert(self, key, value=None):
+        with self.logged("insert", key, value):
+            return super().insert(key, value)
+
+
+    def delete(self, key):
+        with self.logged("delete", key):
+            return super().delete(key)
+
+
+    def insert_many(self, keys):
+        keys = list(keys)
+        with self.logged("insert_many", keys):
+            return super().insert_many(keys)
+
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        with self.logged("delete_many", keys):
+            return super().delete_many(keys)
+
+
+    def pop_edge(self, count, side):
+        with self.logged("pop_edge", count, side):
+            return super().pop_edge(count, side)
+
+
+    def delete_range(self, lo=None, hi=None, inclusive=(True, False)):
+        with self.logged("delete_range", lo, hi, inclusive):
+            return super().delete_range(lo, hi, inclusive)
+
+
+    def clear(self):
+        with self.logged("clear"):
+            super().clear()
+
+
+    def load_sorted(self, items, fill_factor=1.0):
+        items = list(items)
+        with self.logged("load_sorted", items, fill_factor):
+            super().load_sorted(items, fill_factor)
+
+
+    search = synchronized(Paged_B_Tree.search)
+    search_many = synchronized(Paged_B_Tree.search_many)
+    contains_many = synchronized(Paged_B_Tree.contains_many)
+    predecessor = synchronized(Paged_B_Tree.predecessor)
+    successor = synchronized(Paged_B_Tree.successor)
+    rank = synchronized(Paged_B_Tree.rank)
+    select = synchronized(Paged_B_Tree.select)
+    count_range = synchronized(Paged_B_Tree.count_range)
+    min = synchronized(Paged_B_Tree.min)
+    max = synchronized(Paged_B_Tree.max)
+    inorder = synchronized(Paged_B_Tree.inorder)
+    range = synchronized(Paged_B_Tree.range)
+    breadth_first_search = synchronized(Paged_B_Tree.breadth_first_search)
+    depth_first_search = synchronized(Paged_B_Tree.depth_first_search)
+    generate_items = synchronized(Paged_B_Tree.generate_items)
+    dump = synchronized(Paged_B_Tree.dump)
+    __len__ = synchronized(Paged_B_Tree.__len__)
+    __str__ = synchronized(Paged_B_Tree.__str__)
+    snapshot = synchronized(Paged_B_Tree.snapshot)
+    merge = synchronized(Paged_B_Tree.merge)
+    split = synchronized(Paged_B_Tree.split)
+
+    def cursor(self):
+        """
+        Returns a cursor over the b-tree. See Durable_Cursor.
+        """
+        return Durable_Cursor(self)
+
+
+    def sync(self):
+        """
+        Returns once every operation applied so far is on disk.
+        """
+        self.log.sync()
+
+
+    def flush(self):
+        """
+        Writes every change made to the b-tree into its store, recording
+        the lsn of the last logged operation it includes.
+        """
+        with self.lock:
+            self.store.lsn = self.log.lsn
+            super().flush()
+
+
+    def checkpoint(self):
+        """
+        Flushes the b-tree and empties the log, whose operations are
+        all included in the flushed tree.
+        """
+        with self.lock:
+            self.flush()
+            self.log.truncate()
+            self.checkpointed_at = monotonic()
+
+
+    def checkpoint_due(self):
+        """
+        Checks whether the log has grown enough or has been around for
+        long enough to be checkpointed.
+        """
+        if self.log.size == 0:
+            return False
+        return (self.log.size >= self.checkpoint_size or
+                monotonic() - self.checkpointed_at >= self.checkpoint_interval)
+
+
+    def run_background(self):
+        """
+        Checkpoints the tree when due, until the tree is closed.
+        """
+        while not self.stopping.wait(self.log.group_interval):
+            if self.checkpoint_due():
+                self.checkpoint()
+
+
+    def close(self):
+        """
+        Stops the background thread, checkpoints the b-tree and closes
+        its log and store.
+        """
+        self.stopping.set()
+        self.worker.join()
+        self.checkpoint()
+        self.log.close()
+        self.store.close()
+
+
+
+class Durable_B_Tree_Map(Durable_B_Tree, Paged_B_Tree_Map):
+    """
+    B-Tree map whose mutations are recorded in a write-ahead log.
+    See Durable_B_Tree.
+    """
+
+    def __setitem__(self, key, value):
+        with self.logged("__setitem__", key, value):
+            super().__setitem__(key, value)
+
+
+    def pop(self, key, *default):
+        with self.logged("delete", key):
+            return super().pop(key, *default)
+
+
+    __getitem__ = synchronized(Paged_B_Tree_Map.__getitem__)
+    __contains__ = synchronized(Paged_B_Tree_Map.__contains__)
+    get = synchronized(Paged_B_Tree_Map.get)
+    items = synchronized(Paged_B_Tree_Map.items)
+    generate_items = synchronized(Paged_B_Tree_Map.generate_items)
+
+
+
+class Durable_Cursor(Cursor):
+    """
+    Cursor over a durable b-tree, which moves under the lock of the
+    b-tree, so that it never reads nodes while a mutation or a
+    background checkpoint is changing them.
+    """
+
+    def __init__(self, tree):
+        """
+        Returns a cursor over the given durable b-tree, positioned
+        nowhere.
+        """
+        super().__init__(tree)
+        self.lock = tree.lock
+
+
+    seek = synchronized(Cursor.seek)
+    next = synchronized(Cursor.next)
+    prev = synchronized(Cursor.prev)
+    next_n = synchronized(Cursor.next_n)
@@ -0,0 +1,349 @@
+from b_tree_storage import *
+from b_tree_tester import B_Tree_Tester
+from io import BytesIO
+from itertools import repeat
+from os.path import join
+from random import randint, shuffle
+from tempfile import mkdtemp
+from threading import Thread
+
+class B_Tree_Storage_Tester(B_Tree_Tester):
+
+
+    def __init__(self, t, num_ops):
+        self.t = t
+        self.num_ops = num_ops
+        self.filename = join(mkdtemp(), "b_tree.db")
+        self.T = Paged_B_Tree(Page_Store(self.filename, t))
+        self.perform_tests()
+
+
+    def perform_tests(self):
+        key_range = 10*self.num_ops
+        keys = [randint(-key_range, key_range) for _ in range(self.num_ops)]
+
+        if not self.test_persistence(keys):
+            return False
+
+        if not self.test_free_pages(keys):
+            return False
+
+        if not self.test_buffer_pool(keys):
+            return False
+
+        if not self.test_recovery(keys):
+            return False
+
+        if not self.test_clear(keys):
+            return False
+
+        if not self.test_synchronized_reads():
+            return False
+
+        if not self.test_combining(keys):
+            return False
+
+
+    def test_persistence(self, keys):
+        print("Testing persistence...")
+        valid_keys = []
+        for key in keys:
+            self.T.insert(key)
+            valid_keys.append(key)
+
+        self.reopen()
+        if not self.check_contents(valid_keys):
+            return False
+
+        shuffle(keys)
+        for key in keys[::2]:
+            self.T.delete(key)
+            valid_keys.remove(key)
+
+        self.T.flush()
+        self.reopen()
+        if not self.check_contents(valid_keys):
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_free_pages(self, keys):
+        print("Testing free pages...")
+        valid_keys = list(self.T.inorder())
+        self.T.flush()
+        num_pages = self.T.store.num_pages
+        for _ in range(200):
+            self.T.flush()
+            if self.T.store.num_pages != num_pages:
+                print("\tStore grown by flushes without changes")
+                return False
+
+        for cycle in range(4):
+            for key in keys:
+                self.T.insert(key)
+            self.T.flush()
+            for key in keys:
+                self.T.delete(key)
+            self.T.flush()
+            if cycle == 0:
+                num_pages = self.T.store.num_pages
+            elif self.T.store.num_pages > num_pages + num_pages//10:
+                print("\tStore grown by repeating the same updates")
+                return False
+
+        self.reopen()
+        if not self.check_contents(valid_keys):
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_buffer_pool(self, keys):
+        print("Testing buffer pool...")
+        capacity = 4
+        self.T.close()
+        self.T = Paged_B_Tree(Page_Store(self.filename, capacity=capacity))
+        valid_keys = list(self.T.inorder())
+
+        for key in keys:
+            self.T.insert(key)
+            valid_keys.append(key)
+
+            if len(self.T.store.pool.resident) > capacity:
+                print("\tBuffer pool over capacity")
+                return False
+
+        stats = self.T.store.pool.stats()
+        if stats["misses"] == 0 or stats["evictions"] == 0:
+            print("\tNo evictions recorded")
+            return False
+
+        pool = self.T.store.pool
+        access = pool.access
+        peak = [0]
+        def tracked_access(node):
+            access(node)
+            peak[0] = max(peak[0], len(pool.resident))
+        pool.access = tracked_access
+
+        shuffle(keys)
+        self.T.delete_many(keys[::2])
+        self.T.insert_many(keys[::2])
+        (lo, hi) = sorted(keys[:2])
+        for key in list(self.T.range(lo, hi)):
+            valid_keys.remove(key)
+        self.T.delete_range(lo, hi)
+        for key in self.T.pop_min_n(len(keys)//4):
+            valid_keys.remove(key)
+        if peak[0] > capacity + 3*(self.T.height() + 1):
+            print("\tBuffer pool over capacity during batched updates")
+            return False
+
+        self.T.flush()
+        self.reopen()
+        if not self.check_contents(valid_keys):
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_recovery(self, keys):
+        print("Testing recovery...")
+        self.T.close()
+        log_filename = self.filename + ".log"
+        valid_keys = list(Paged_B_Tree(Page_Store(self.filename)).inorder())
+
+        for durability in Write_Ahead_Log.DURABILITY_MODES:
+            self.T = Durable_B_Tree(Page_Store(self.filename),
+                                    Write_Ahead_Log(log_filename, durability),
+                                    checkpoint_size=512)
+            shuffle(keys)
+            for key in keys[::2]:
+                self.T.insert(key)
+                valid_keys.append(key)
+            for key in keys[::8]:
+                self.T.delete(key)
+                valid_keys.remove(key)
+            for key in self.T.pop_min_n(3) + [self.T.pop_max()]:
+                valid_keys.remove(key)
+            (lo, hi) = sorted(keys[:2])
+            for key in list(self.T.range(lo, hi)):
+                valid_keys.remove(key)
+            self.T.delete_range(lo, hi)
+            if durability != "none" and self.T.log.pending:
+                print("\tAcknowledged operations not synced")
+                return False
+            self.T.sync()
+
+            self.crash()
+            self.T = Durable_B_Tree(Page_Store(self.filename), Write_Ahead_Log(log_filename))
+            if not self.check_contents(valid_keys):
+                return False
+            self.T.close()
+
+        self.T = Paged_B_Tree(Page_Store(self.filename))
+        if not self.check_contents(valid_keys):
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_clear(self, keys):
+        print("Testing clear...")
+        self.T.close()
+        log_filename = self.filename + ".log"
+        self.T = Durable_B_Tree(Page_Store(self.filename), Write_Ahead_Log(log_filename))
+        self.T.clear()
+        self.T.load_sorted(zip(sorted(keys), repeat(None)))
+        self.T.checkpoint()
+        num_pages = self.T.store.num_pages
+
+        for _ in range(3):
+            self.T.clear()
+            self.T.load_sorted(zip(sorted(keys), repeat(None)))
+            self.T.checkpoint()
+        if self.T.store.num_pages > 2*num_pages + 3:
+            print("\tPages of cleared nodes not released")
+            return False
+
+        self.T.clear()
+        self.T.insert(keys[0])
+        self.T.sync()
+        self.crash()
+        self.T = Durable_B_Tree(Page_Store(self.filename), Write_Ahead_Log(log_filename))
+        if not self.check_contents(keys[:1]):
+            return False
+
+        self.T.clear()
+        self.T.load_sorted(zip(sorted(keys), repeat(None)))
+        self.T.sync()
+        self.crash()
+        self.T = Durable_B_Tree(Page_Store(self.filename), Write_Ahead_Log(log_filename))
+        if not self.check_contents(keys):
+            return False
+        self.T.close()
+
+        self.T = Paged_B_Tree(Page_Store(self.filename))
+        print("\tCorrect\n")
+        return True
+
+
+    def test_synchronized_reads(self):
+        print("Testing synchronized reads...")
+        self.T.close()
+        log_filename = self.filename + ".log"
+        self.T = Durable_B_Tree(Page_Store(self.filename), Write_Ahead_Log(log_filename))
+        valid_keys = list(self.T.inorder())
+        cursor = self.T.cursor()
+        cursor.seek()
+
+        reads = (len,
+                 lambda tree: tree.dump(BytesIO()),
+                 lambda tree: next(tree.generate_items()),
+                 lambda tree: cursor.next())
+        for read in reads:
+            with self.T.lock:
+                reader = Thread(target=read, args=(self.T,))
+                reader.start()
+                reader.join(0.05)
+                blocked = reader.is_alive()
+            reader.join()
+            if not blocked:
+                print("\tRead run without the lock of the tree")
+                return False
+
+        self.T.close()
+        self.T = Paged_B_Tree(Page_Store(self.filename))
+        if not self.check_contents(valid_keys):
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_combining(self, keys):
+        print("Testing snapshots, set operations, joins and splits...")
+        directory = mkdtemp()
+        valid_keys = sorted(set(keys))
+        pivot = valid_keys[len(valid_keys)//2]
+        left = Paged_B_Tree(Page_Store(join(directory, "left.db"), self.t))
+        right = Paged_B_Tree(Page_Store(join(directory, "right.db"), self.t))
+        left.load_sorted(zip((key for key in valid_keys if key < pivot), repeat(None)))
+        right.load_sorted(zip((key for key in valid_keys if key > pivot), repeat(None)))
+
+        snapshot = left.snapshot()
+        left.delete(valid_keys[0])
+        if type(snapshot) is not B_Tree or list(snapshot.inorder()) != valid_keys[:len(valid_keys)//2]:
+            print("\tSnapshot changed by later updates")
+            return False
+
+        union = left.union(right)
+        if type(union) is not B_Tree or list(union.inorder()) != [key for key in valid_keys[1:] if key != pivot]:
+            print("\tIncorrect keys after a set operation")
+            return False
+
+        left.insert(valid_keys[0])
+        joined = Paged_B_Tree.join(left, pivot, right)
+        if list(joined.inorder()) != valid_keys or left.root.size or right.root.size:
+            print("\tIncorrect keys after a join")
+            return False
+
+        left.load_sorted(zip(valid_keys, repeat(None)))
+        (lower, upper) = left.split(pivot, inclusive=True)
+        if list(lower.inorder())[-1:] != [pivot] or len(lower) + len(upper) != len(valid_keys) or left.root.size:
+            print("\tIncorrect keys after a split")
+            return False
+
+        items = [(key, str(key)) for key in valid_keys]
+        paged_map = Paged_B_Tree_Map(Page_Store(join(directory, "map.db"), self.t, mapping=True))
+        paged_map.load_sorted(items)
+        if type(paged_map.snapshot()) is not B_Tree_Map or list(paged_map.snapshot().items()) != items:
+            print("\tIncorrect items in a paged map snapshot")
+            return False
+
+        for (method, args) in ((Paged_B_Tree.from_sorted, (valid_keys, self.t)),
+                               (Paged_B_Tree.load, (None,)),
+                               (Paged_B_Tree.tuned, ([("insert", 0)],))):
+            try:
+                method(*args)
+                print("\tPaged b-tree created without a store")
+                return False
+            except TypeError:
+                pass
+
+        for tree in (left, right, paged_map):
+            tree.close()
+
+        print("\tCorrect\n")
+        return True
+
+
+    def crash(self):
+        """
+        Abandons a durable b-tree without checkpointing it.
+        """
+        self.T.stopping.set()
+        self.T.worker.join()
+        self.T.log.file.close()
+        self.T.store.close()
+
+
+    def reopen(self):
+        self.T.close()
+        self.T = Paged_B_Tree(Page_Store(self.filename))
+
+
+    def check_contents(self, valid_keys):
+        if not self.check():
+            return False
+
+        if list(self.T.inorder()) != sorted(valid_keys):
+            print("\tIncorrect keys after reopening")
+            return False
+
+        return True
@@ -1,11 +1,15 @@
 from b_tree import *
+from io import BytesIO
+from collections import Counter
 from random import randint, shuffle, sample
 
 class B_Tree_Tester:
 
+    tree_class = B_Tree
 
     def __init__(self, t, num_ops):
-        self.T = B_Tree(t)
+        self.t = t
+        self.T = self.tree_class(t)
         self.num_ops = num_ops
 #       self.random_tree()
 #       print(self.T)
@@ -17,7 +21,7 @@ class B_Tree_Tester:
         universe = set(range(-key_range, key_range + 1))
         keys = [randint(-key_range, key_range + 1) for _ in range(self.num_ops)]
         existent = set(keys)
-        nonexistent = list(sample(universe.difference(existent), self.num_ops))
+        nonexistent = sample(sorted(universe.difference(existent)), self.num_ops)
         sorted_keys = sorted(existent)
 
         if not self.test_insert(keys):
@@ -26,15 +30,63 @@ class B_Tree_Tester:
         if not self.test_search(existent, nonexistent):
             return False
 
+        if not self.test_search_many(existent, nonexistent):
+            return False
+
         if not self.test_predecessor(sorted_keys):
             return False
 
         if not self.test_successor(sorted_keys):
             return False
 
+        if not self.test_range(sorted(keys)):
+            return False
+
+        if not self.test_order_statistics(sorted(keys)):
+            return False
+
+        if not self.test_cursor(keys, nonexistent):
+            return False
+
         if not self.test_delete(keys, nonexistent):
             return False
 
+        if not self.test_from_sorted(sorted(keys)):
+            return False
+
+        if not self.test_map(keys, nonexistent):
+            return False
+
+        if not self.test_batched_updates(keys, nonexistent):
+            return False
+
+        if not self.test_snapshot(keys, nonexistent):
+            return False
+
+        if not self.test_tuned(keys, nonexistent):
+            return False
+
+        if not self.test_redistribution(keys, nonexistent):
+            return False
+
+        if not self.test_appends(keys):
+            return False
+
+        if not self.test_dump(keys):
+            return False
+
+        if not self.test_set_operations(keys, nonexistent):
+            return False
+
+        if not self.test_join_split(keys):
+            return False
+
+        if not self.test_pops(keys):
+            return False
+
+        if not self.test_delete_range(keys):
+            return False
+
 
     def test_search(self, existent, nonexistent):
         print("Testing existent searches...")
@@ -71,6 +123,24 @@ class B_Tree_Tester:
         return True
 
 
+    def test_search_many(self, existent, nonexistent):
+        print("Testing batched searches...")
+        probes = list(existent) + nonexistent
+        shuffle(probes)
+
+        locations = self.T.search_many(probes)
+        if locations != [self.T.search(key) for key in probes]:
+            print("\tIncorrect locations")
+            return False
+
+        if self.T.contains_many(probes) != [key in existent for key in probes]:
+            print("\tIncorrect membership")
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
     def test_predecessor(self, sorted_keys):
         print("Testing predecessor...")
         valid_predecessor = self.compute_predecessor(sorted_keys)
@@ -150,6 +220,107 @@ class B_Tree_Tester:
         return successor
 
 
+    def test_range(self, sorted_keys):
+        print("Testing range...")
+        bounds = [None, sorted_keys[0], sorted_keys[len(sorted_keys)//2],
+                  sorted_keys[-1], sorted_keys[len(sorted_keys)//3] + 1]
+        for lo in bounds:
+            for hi in bounds:
+                for inclusive in ((True, False), (False, True)):
+                    valid_range = [key for key in sorted_keys
+                                   if (lo is None or (key >= lo if inclusive[0] else key > lo))
+                                   and (hi is None or (key <= hi if inclusive[1] else key < hi))]
+
+                    if list(self.T.range(lo, hi, inclusive)) != valid_range:
+                        print("\tIncorrect range")
+                        return False
+
+                    if list(self.T.range(lo, hi, inclusive, reverse=True)) != valid_range[::-1]:
+                        print("\tIncorrect reversed range")
+                        return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_order_statistics(self, sorted_keys):
+        print("Testing order statistics...")
+        for (index, key) in enumerate(sorted_keys):
+            if self.T.select(index) != key:
+                print("\tIncorrect selection")
+                return False
+
+            if self.T.rank(key) != sorted_keys.index(key):
+                print("\tIncorrect rank")
+                return False
+
+        bounds = (sorted_keys[0], sorted_keys[len(sorted_keys)//2], sorted_keys[-1] + 1)
+        for lo in bounds:
+            for hi in bounds:
+                if self.T.count_range(lo, hi) != len(list(self.T.range(lo, hi))):
+                    print("\tIncorrect range count")
+                    return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_cursor(self, keys, nonexistent):
+        print("Testing cursor...")
+        valid_keys = sorted(keys)
+        cursor = self.T.cursor()
+        if [cursor.seek()] + cursor.next_n(len(keys)) != valid_keys:
+            print("\tIncorrect keys generated")
+            return False
+
+        if cursor.key is not None:
+            print("\tCursor not exhausted")
+            return False
+
+        generated = [cursor.seek()]
+        for key in nonexistent:
+            self.T.insert(key)
+            self.T.delete(key)
+            generated.append(cursor.next())
+
+        generated.extend(cursor.next_n(len(keys)))
+        if generated[:len(keys)] != valid_keys:
+            print("\tIncorrect keys generated while updating")
+            return False
+
+        cursor.seek(valid_keys[-1])
+        cursor.next_n(keys.count(valid_keys[-1]) - 1)
+        generated = [cursor.key]
+        for key in nonexistent:
+            self.T.insert(key)
+            self.T.delete(key)
+            generated.append(cursor.prev())
+
+        while cursor.key is not None:
+            generated.append(cursor.prev())
+        if generated[:len(keys)] != valid_keys[::-1]:
+            print("\tIncorrect keys generated backwards while updating")
+            return False
+
+        largest = valid_keys[-1]
+        occurrences = keys.count(largest)
+        cursor.seek(largest)
+        for _ in range(occurrences):
+            self.T.delete(largest)
+        generated = cursor.prev()
+        for _ in range(occurrences):
+            self.T.insert(largest)
+        if generated != (valid_keys[-1 - occurrences] if occurrences < len(keys) else None):
+            print("\tIncorrect key generated backwards after deleting the largest key")
+            return False
+
+        if not self.check():
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
     def test_insert(self, keys):
         print("Testing Insertion...")
         for key in keys:
@@ -210,6 +381,526 @@ class B_Tree_Tester:
         return True
 
 
+    def test_from_sorted(self, sorted_keys):
+        print("Testing bulk loading...")
+        tree = self.T
+        for fill_factor in (0.5, 0.75, 1.0):
+            for num_keys in (0, 1, len(sorted_keys)//3, len(sorted_keys)):
+                keys = sorted_keys[:num_keys]
+                self.T = self.tree_class.from_sorted(iter(keys), self.t, fill_factor)
+
+                if not self.check():
+                    self.T = tree
+                    return False
+
+                if list(self.T.inorder()) != keys:
+                    print("\tIncorrect keys loaded")
+                    self.T = tree
+                    return False
+
+        if self.tree_class is B_Tree:
+            try:
+                B_Tree_Map.from_sorted([(1, "a"), (1, "b")], self.t)
+                print("\tRepeated map key loaded")
+                self.T = tree
+                return False
+            except ValueError:
+                pass
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_map(self, keys, nonexistent):
+        print("Testing map...")
+        tree = self.T
+        self.T = B_Tree_Map(self.t)
+        valid_map = dict()
+        for (value, key) in enumerate(keys):
+            self.T[key] = value
+            valid_map[key] = value
+
+        if not self.check():
+            self.T = tree
+            return False
+
+        for key in nonexistent:
+            if key in self.T or self.T.get(key) != None:
+                print("\tNon-existent key found")
+                self.T = tree
+                return False
+
+        for key in keys[::3]:
+            self.T.insert(key, -2)
+            valid_map[key] = -2
+
+        if len(self.T) != len(valid_map):
+            print("\tExisting key inserted twice")
+            self.T = tree
+            return False
+
+        snapshot = self.T.snapshot()
+        snapshot_items = list(snapshot.items())
+        for key in keys[1::2]:
+            self.T[key] = -1
+            valid_map[key] = -1
+
+        for key in keys[::2]:
+            if self.T.pop(key, None) != valid_map.pop(key, None):
+                print("\tIncorrect value popped")
+                self.T = tree
+                return False
+
+        if not self.check():
+            self.T = tree
+            return False
+
+        if list(self.T.items()) != sorted(valid_map.items()):
+            print("\tIncorrect items")
+            self.T = tree
+            return False
+
+        if list(snapshot.items()) != snapshot_items:
+            print("\tSnapshot changed by later updates")
+            self.T = tree
+            return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_batched_updates(self, keys, nonexistent):
+        print("Testing batched updates...")
+        tree = self.T
+        self.T = self.tree_class(self.t)
+        valid_keys = sorted(keys)
+
+        self.T.insert_many(keys)
+        if not self.check():
+            self.T = tree
+            return False
+
+        if list(self.T.inorder()) != valid_keys:
+            print("\tIncorrect keys inserted")
+            self.T = tree
+            return False
+
+        self.T.delete_many(keys[::2] + nonexistent)
+        for key in keys[::2]:
+            valid_keys.remove(key)
+
+        if not self.check():
+            self.T = tree
+            return False
+
+        if list(self.T.inorder()) != valid_keys:
+            print("\tIncorrect keys deleted")
+            self.T = tree
+            return False
+
+        if self.tree_class is B_Tree and not self.test_batched_map_updates(keys, nonexistent):
+            self.T = tree
+            return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_batched_map_updates(self, keys, nonexistent):
+        self.T = B_Tree_Map(self.t)
+        items = [(key, value) for (value, key) in enumerate(keys)]
+        updates = [(key, -1) for key in keys[::3] + nonexistent[::3]]
+        valid_map = dict(items + updates)
+        self.T.insert_many(items)
+        self.T.insert_many(updates)
+        if not self.check():
+            return False
+
+        if len(self.T) != len(valid_map) or list(self.T.items()) != sorted(valid_map.items()):
+            print("\tIncorrect items inserted")
+            return False
+
+        self.T.delete_many(keys[::2] + nonexistent)
+        for key in keys[::2] + nonexistent:
+            valid_map.pop(key, None)
+
+        if not self.check():
+            return False
+
+        if list(self.T.items()) != sorted(valid_map.items()):
+            print("\tIncorrect items deleted")
+            return False
+
+        return True
+
+
+    def test_snapshot(self, keys, nonexistent):
+        print("Testing snapshots...")
+        tree = self.T
+        self.T = self.tree_class(self.t)
+        valid_keys = []
+        snapshots = []
+        for (step, key) in enumerate(keys):
+            if step % 16 == 0:
+                snapshots.append((self.T.snapshot(), sorted(valid_keys)))
+                nodes = set(map(id, self.T.breadth_first_search()))
+
+            self.T.insert(key)
+            valid_keys.append(key)
+            if step % 3 == 0:
+                self.T.delete(valid_keys.pop(randint(0, len(valid_keys) - 1)))
+
+            if step % 16 == 0:
+                copied = nodes.symmetric_difference(map(id, self.T.breadth_first_search()))
+                if len(copied) > 8*(self.get_tree_depth() + 2):
+                    print("\tToo many nodes copied after a snapshot")
+                    self.T = tree
+                    return False
+
+        snapshots.append((self.T.snapshot(), sorted(valid_keys)))
+        self.T.delete_many(keys[::2] + nonexistent)
+        self.T.insert_many(nonexistent)
+        for (snapshot, snapshot_keys) in snapshots:
+            self.T = snapshot
+            if not self.check():
+                self.T = tree
+                return False
+
+            if list(self.T.inorder()) != snapshot_keys:
+                print("\tSnapshot changed by later updates")
+                self.T = tree
+                return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_tuned(self, keys, nonexistent):
+        print("Testing degree tuning...")
+        workload = [("insert", key) for key in keys]
+        workload += [("search", key) for key in nonexistent]
+        workload += [("range", key, key + 100) for key in keys[::8]]
+        workload += [("delete", key) for key in keys[::2]]
+        degrees = (2, 3, 16)
+        tree = self.tree_class.tuned(workload, degrees, repeat=1)
+
+        if type(tree) is not self.tree_class or tree.min_num_keys + 1 not in degrees:
+            print("\tIncorrect tuned b-tree")
+            return False
+
+        if tree.root.size != 0:
+            print("\tTuned b-tree is not empty")
+            return False
+
+        tree.run_workload(workload)
+        valid_keys = sorted(keys)
+        for key in keys[::2]:
+            valid_keys.remove(key)
+
+        if list(tree.inorder()) != valid_keys:
+            print("\tIncorrect keys after running the workload")
+            return False
+
+        print("\tCorrect\n")
+        return True
+
+
+    def test_redistribution(self, keys, nonexistent):
+        print("Testing redistribution...")
+        tree = self.T
+        self.T = self.tree_class(self.t)
+        self.T.redistribute = True
+        valid_keys = []
+        for (step, key) in enumerate(keys + sorted(nonexistent)):
+            if step == len(keys):
+                snapshot = (self.T.snapshot(), sorted(valid_keys))
+
+            if not self.insert(key):
+                self.T = tree
+                return False
+            valid_keys.append(key)
+
+        if list(self.T.inorder()) != sorted(valid_keys):
+            print("\tIncorrect keys inserted")
+            self.T = tree
+            return False
+
+        (self.T, snapshot_keys) = snapshot
+        if not self.check() or list(self.T.inorder()) != snapshot_keys:
+            print("\tSnapshot changed by later insertions")
+            self.T = tree
+            return False
+
+        self.T = self.tree_class(self.t)
+        self.T.redistribute = True
+        duplicates = sorted(keys[:8]*4) + [keys[0]]*(8*self.t) + [keys[1]]*(8*self.t)
+        for key in duplicates:
+            if not self.insert(key):
+                print("\tNode overfilled by a duplicate key")
+                self.T = tree
+                return False
+
+        if list(self.T.inorder()) != sorted(duplicates):
+            print("\tIncorrect duplicate keys inserted")
+            self.T = tree
+            return False
+
+        (self.T, snapshot_keys) = snapshot
+        union = self.T.union(self.T)
+        (lower, upper) = self.T.split(keys[0])
+        joined = self.tree_class.join(lower, keys[0], upper)
+        if not all(part.redistribute for part in (union, lower, upper, joined)):
+            print("\tRedistribution dropped by derived trees")
+            self.T = tree
+            return False
+
+        if self.tree_class is B_Tree:
+            self.T = B_Tree_Map(self.t, redistribute=True)
+            for key in keys:
+                self.T[key] = str(key)
+
+            if not self.check() or list(self.T.items()) != [(key, str(key)) for key in sorted(set(keys))]:
+                print("\tIncorrect values after redistribution")
+                self.T = tree
+                return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_appends(self, keys):
+        print("Testing appends...")
+        tree = self.T
+        self.T = self.tree_class(self.t)
+        valid_keys = sorted(keys + keys[::4])
+        for key in valid_keys:
+            if not self.insert(key):
+                self.T = tree
+                return False
+
+            if self.T.max() != key:
+                print("\tIncorrect maximum after an append")
+                self.T = tree
+                return False
+
+        if list(self.T.inorder()) != valid_keys:
+            print("\tIncorrect keys appended")
+            self.T = tree
+            return False
+
+        if self.tree_class is B_Tree:
+            for level in self.T.generate_levels():
+                if any(node.num_keys() < self.T.max_num_keys for node in level[:-2]):
+                    print("\tNodes left partially filled by appends")
+                    self.T = tree
+                    return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_dump(self, keys):
+        print("Testing dump and load...")
+        tree = self.T
+        trees = [self.tree_class(self.t), self.tree_class.from_sorted(sorted(keys), self.t)]
+        trees[1].delete_many(keys[::3])
+        if self.tree_class is B_Tree:
+            trees.append(B_Tree.from_sorted(sorted(keys), self.t, typecode="q"))
+            trees.append(B_Tree_Map.from_sorted(((key, str(key)) for key in sorted(set(keys))), self.t))
+
+        for dumped in trees:
+            fileobj = BytesIO()
+            dumped.dump(fileobj)
+            fileobj.seek(0)
+            self.T = type(dumped).load(fileobj)
+
+            if not self.check():
+                self.T = tree
+                return False
+
+            if list(self.T.inorder()) != list(dumped.inorder()) or self.T.typecode != dumped.typecode:
+                print("\tIncorrect keys loaded")
+                self.T = tree
+                return False
+
+            if isinstance(dumped, B_Tree_Map) and list(self.T.items()) != list(dumped.items()):
+                print("\tIncorrect values loaded")
+                self.T = tree
+                return False
+
+            fileobj.seek(0)
+            try:
+                B_Tree.load(BytesIO(fileobj.read()[:-1]))
+                print("\tTruncated dump loaded")
+                self.T = tree
+                return False
+            except ValueError:
+                pass
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_set_operations(self, keys, nonexistent):
+        print("Testing set operations...")
+        tree = self.T
+        others = keys[::2] + nonexistent
+        left = self.tree_class.from_sorted(sorted(keys), self.t)
+        right = self.tree_class.from_sorted(sorted(others), self.t)
+        (mine, theirs) = (Counter(keys), Counter(others))
+        expected = [(left.union(right), mine + theirs),
+                    (left.intersection(right), mine & theirs),
+                    (left.difference(right), mine - theirs),
+                    (right.difference(left), theirs - mine)]
+
+        for (self.T, counts) in expected:
+            if not self.check():
+                self.T = tree
+                return False
+
+            if list(self.T.inorder()) != sorted(counts.elements()):
+                print("\tIncorrect keys after a set operation")
+                self.T = tree
+                return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_join_split(self, keys):
+        print("Testing join and split...")
+        tree = self.T
+        valid_keys = sorted(keys)
+        self.T = self.tree_class.from_sorted(valid_keys, self.t)
+        for pivot in sample(keys, min(len(keys), 32)):
+            snapshot = self.T.snapshot()
+            (lower, upper) = self.T.split(pivot)
+
+            for (self.T, part) in ((lower, [key for key in valid_keys if key < pivot]),
+                                   (upper, [key for key in valid_keys if key >= pivot])):
+                if not self.check():
+                    self.T = tree
+                    return False
+
+                if list(self.T.inorder()) != part:
+                    print("\tIncorrect keys after a split")
+                    self.T = tree
+                    return False
+
+            self.T = self.tree_class.join(lower, pivot, upper)
+            valid_keys.insert(valid_keys.index(pivot), pivot)
+            if not self.check():
+                self.T = tree
+                return False
+
+            if list(self.T.inorder()) != valid_keys or lower.root.size or upper.root.size:
+                print("\tIncorrect keys after a join")
+                self.T = tree
+                return False
+
+            if len(list(snapshot.inorder())) != len(valid_keys) - 1:
+                print("\tSnapshot changed by a split")
+                self.T = tree
+                return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_pops(self, keys):
+        print("Testing pops...")
+        tree = self.T
+        valid_keys = sorted(keys)
+        self.T = self.tree_class.from_sorted(valid_keys, self.t)
+        self.T.delete_many(keys[::4])
+        for key in keys[::4]:
+            valid_keys.remove(key)
+
+        while valid_keys:
+            if len(self.T) != len(valid_keys) or (self.T.min(), self.T.max()) != (valid_keys[0], valid_keys[-1]):
+                print("\tIncorrect length, minimum or maximum")
+                self.T = tree
+                return False
+
+            count = randint(1, 2*self.t)
+            (popped, expected) = ([self.T.pop_min()], [valid_keys.pop(0)])
+            if valid_keys:
+                popped.append(self.T.pop_max())
+                expected.append(valid_keys.pop())
+
+            popped += self.T.pop_min_n(count)
+            expected += valid_keys[:count]
+            del valid_keys[:count]
+            popped += self.T.pop_max_n(count)
+            expected += valid_keys[::-1][:count]
+            del valid_keys[-count:]
+
+            if popped != expected or not self.check():
+                print("\tIncorrect keys popped")
+                self.T = tree
+                return False
+
+            if valid_keys:
+                key = valid_keys[len(valid_keys)//2]
+                self.T.delete(key)
+                self.T.insert(key)
+
+        try:
+            self.T.pop_min()
+            print("\tPopped from an empty b-tree")
+            self.T = tree
+            return False
+        except IndexError:
+            pass
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
+    def test_delete_range(self, keys):
+        print("Testing range deletion...")
+        tree = self.T
+        valid_keys = sorted(keys)
+        self.T = self.tree_class.from_sorted(valid_keys, self.t)
+        key_range = 10*self.num_ops
+        bounds = [(None, None)] + [(randint(-key_range, key_range), None) for _ in range(2)]
+        bounds += [(None, randint(-key_range, key_range)) for _ in range(2)]
+        bounds += [tuple(sorted(sample(keys, 2))) for _ in range(8)]
+        shuffle(bounds)
+
+        for (lo, hi) in bounds:
+            self.T.insert_many(sample(keys, len(keys)//2))
+            valid_keys = list(self.T.inorder())
+            inclusive = (randint(0, 1) == 1, randint(0, 1) == 1)
+            deleted = list(self.T.range(lo, hi, inclusive))
+            for key in deleted:
+                valid_keys.remove(key)
+
+            if self.T.delete_range(lo, hi, inclusive) != len(deleted) or not self.check():
+                print("\tIncorrect number of keys deleted")
+                self.T = tree
+                return False
+
+            if list(self.T.inorder()) != valid_keys or len(self.T) != len(valid_keys):
+                print("\tIncorrect keys after a range deletion")
+                self.T = tree
+                return False
+
+        self.T = tree
+        print("\tCorrect\n")
+        return True
+
+
     def search(self, k):
         out = self.T.search(k)
         return (out, self.check())
@@ -281,6 +972,10 @@ class B_Tree_Tester:
             print("Root keys are not sorted in ascending order")
             is_valid = False
 
+        if not self.valid_size(root):
+            print("Invalid root sub-tree size")
+            is_valid = False
+
         if root.children:
 
             if not self.valid_num_keys_num_children_relation(root):
@@ -320,6 +1015,10 @@ class B_Tree_Tester:
             print("Node keys are not sorted in ascending order")
             is_valid = False
 
+        if not self.valid_size(node):
+            print("Invalid sub-tree size")
+            is_valid = False
+
         if node.children:
 
             if not self.valid_num_keys_num_children_relation(node):
@@ -360,6 +1059,10 @@ class B_Tree_Tester:
         return all(node.keys[i-1] <= node.keys[i] for i in range(1, node.num_keys()))
 
 
+    def valid_size(self, node):
+        return node.size == node.num_keys() + sum(child.size for child in node.children)
+
+
     def valid_num_keys_num_children_relation(self, node):
         return node.num_keys() == node.num_children() - 1
 